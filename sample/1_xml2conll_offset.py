@@ -11,11 +11,15 @@
     4、利用GENIA tagger工具对标记过的语料进行分词和词性标注
     5、根据预处理语料的标记 <B^><^I> 获取BIO标签
 '''
-from xml.dom.minidom import parse
 import re
 import codecs
 import os
-from tqdm import tqdm
+from array import array
+from sample.utils.bioc_converter import B_tag, I_tag, readXML
+from sample.utils.genia_tagger import TaggingStage
+
+label2idx = {'O': 0, 'B-protein': 1, 'I-protein': 2, 'B-gene': 3, 'I-gene': 4}
+SKIP_PASSAGES = [5268]    # 按全局序号(从1开始)跳过的 passage
 
 # def entityReplace(splited_sen, splited_tagged, i, item, sen_length):
 #     '''
@@ -43,203 +47,6 @@ from tqdm import tqdm
 #         gap+=1
 
 
-def xx(entity):
-    if entity.startswith('NCBI gene:') or entity.startswith('Uniprot:') or \
-    entity.startswith('gene:') or entity.startswith('protein:'):
-        return True
-    else:
-        return False
-
-
-def readXML(files, BioC_PATH):
-    num_sentence = 0
-    num_file = 0
-    num_annotations_pro = 0
-    num_entitytype_pro = 0
-    num_annotations_gene = 0
-    num_entitytype_gene = 0
-    passages_list = []
-    raw_sentence_list = []
-    id_list_list = []
-    for file in files:  #遍历文件夹
-        if not os.path.isdir(file):  #判断是否是文件夹，不是文件夹才打开
-            f = BioC_PATH + "/" + file
-            DOMTree = parse(f) # 使用minidom解析器打开 XML 文档
-            collection = DOMTree.documentElement  # 得到了根元素
-
-            # 在集合中获取所有 document
-            documents = collection.getElementsByTagName("document")
-
-            for document in documents:
-                doc_id = document.getElementsByTagName("id")[0].childNodes[0].data
-                passages = document.getElementsByTagName("passage")
-                # print("*****passage*****")
-                for passage in passages:
-                    text = passage.getElementsByTagName('text')[0]
-                    sentence_byte = text.childNodes[0].data.encode("utf-8")  # byte
-                    sentence_str = sentence_byte.decode("utf-8")  # str
-                    raw_sentence_list.append(sentence_str)
-                    num_sentence += 1
-                    id_list = []
-                    offset_list = []
-                    length_list = []
-                    entity_list = []
-
-                    annotations = passage.getElementsByTagName('annotation')
-                    for annotation in annotations:
-                        info = annotation.getElementsByTagName("infon")[0]
-                        ID = info.childNodes[0].data
-                        location = annotation.getElementsByTagName("location")[0]
-                        offset = int(location.getAttribute("offset"))
-                        length = int(location.getAttribute("length"))
-                        txt = annotation.getElementsByTagName("text")[0]
-                        entity = txt.childNodes[0].data
-                        assert len(sentence_byte[offset:offset+length].decode('utf-8'))==len(entity) 
-                        id_list.append(ID)
-                        offset_list.append(offset)
-                        length_list.append(length)
-                        entity_list.append(entity)
-                    
-                    # 根据offset的大小对数组进行逆序排序
-                    offset_sorted = sorted(enumerate(offset_list), key=lambda x:x[1], reverse=True)
-                    offset_list = [x[1] for x in offset_sorted]  # 新数组
-                    offset_idx = [x[0] for x in offset_sorted]  # 数组下标
-                    length_list = [length_list[idx] for idx in offset_idx]
-                    id_list = [id_list[idx] for idx in offset_idx]
-                    entity_list = [entity_list[idx] for idx in offset_idx]
-
-                    # if num_sentence in [101, 5268, 8327, 4628]:
-                    if num_sentence in [5268]:
-                        continue    # golden 标签好像有错
-                        print(doc_id)
-                        print(offset_list)
-                        print(id_list)
-
-                    # 针对实体嵌套的情况
-                    # 即两个实体的start/end相同，而长度不同，保留长的哪个
-                    offset_temp = []
-                    offset_remove = []
-                    for i in range(len(offset_list)):
-                        offset1 = offset_list[i]
-                        length1 = length_list[i]
-                        for j in range(i+1, len(offset_list)):
-                            offset2 = offset_list[j]
-                            length2 = length_list[j]
-                            if offset1==offset2:  # 实体的start相同
-                                offset_temp.append([i, j])
-                            elif offset1+length1==offset2+length2:  # 实体的end相同
-                                offset_temp.append([i, j])
-                    while 1:
-                        if offset_temp:
-                            idx1 = offset_temp[0][0]
-                            idx2 = offset_temp[0][1]
-                            ID1 = id_list[idx1]
-                            ID2 = id_list[idx2]
-                            # 保留其中的蛋白质或基因实体，否则保留其中长度较长的实体
-                            if xx(ID1) and not xx(ID2):
-                                offset_remove.append(idx2)
-                            elif not xx(ID1) and xx(ID2):
-                                offset_remove.append(idx1)
-                            else:
-                                idx3 = idx2 if length_list[idx1]>length_list[idx2] else idx1
-                                offset_remove.append(idx3)
-                            offset_temp = offset_temp[1:]
-                        else:
-                            break
-
-                    # 丢弃 offset_remove 中的实体
-                    if offset_remove:
-                        # print('{}: {}'.format(doc_id, offset_list))
-                        offset_remove = sorted(offset_remove, reverse=True)
-                        for idxidx in offset_remove:
-                            offset_list.pop(idxidx)
-                            length_list.pop(idxidx)
-                            id_list.pop(idxidx)
-                            entity_list.pop(idxidx)
-                        # print('{}: {}'.format(doc_id, offset_list))
-                        # print(entity_list)
-
-                    # 用一对标签 <B^>entity<^I> 包裹筛选后的所有实体
-                    tmp = sentence_byte
-                    id_list_only = []   # 仅保留gene or protein的ID
-                    for i in range(len(offset_list)):
-                        offset = offset_list[i]
-                        length = length_list[i]
-                        ID = id_list[i]
-                        entity = entity_list[i]
-
-                        if isinstance(tmp, str):
-                            tmp = tmp.encode("utf-8")
-                            
-                        if ID.startswith('Uniprot:') or ID.startswith('protein:'):
-                            if ID.startswith('Uniprot:'):
-                                num_annotations_pro+=1
-                            elif ID.startswith('protein:'):
-                                num_entitytype_pro+=1
-                            id_list_only.append(ID.strip('\n').strip())
-                            # # This solution will strip out (ignore) the characters in
-                            # # question returning the string without them.
-                            left = tmp[:offset].decode("utf-8", errors='ignore')
-                            mid = tmp[offset:offset + length].decode("utf-8", errors='ignore')
-                            right = tmp[offset + length:].decode("utf-8", errors='ignore')
-                            tmp = left + ' ' + B_tag[0] + mid + I_tag[0] + ' ' + right
-                            tmp = tmp.replace('   ', ' ').replace('  ', ' ')
-                        elif ID.startswith('NCBI gene:') or ID.startswith('gene:'):
-                            if ID.startswith('NCBI gene:'):
-                                num_annotations_gene+=1
-                            elif ID.startswith('gene:'):
-                                num_entitytype_gene+=1
-                            id_list_only.append(ID.strip('\n').strip())
-                            # # This solution will strip out (ignore) the characters in
-                            # # question returning the string without them.
-                            left = tmp[:offset].decode("utf-8", errors='ignore')
-                            mid = tmp[offset:offset + length].decode("utf-8", errors='ignore')
-                            right = tmp[offset + length:].decode("utf-8", errors='ignore')
-                            tmp = left + ' ' + B_tag[1] + mid + I_tag[1] + ' ' + right
-                            tmp = tmp.replace('   ', ' ').replace('  ', ' ')
-                        else:
-                            # 暂时不考虑其他类别的实体
-                            continue
-                    if not id_list_only:
-                        id_list_only.append('') # 不包含实体也要占位
-
-                    if isinstance(tmp, bytes):
-                        tmp = tmp.decode("utf-8")
-
-                    tmp = ' '.join(tmp.split())  # 重构
-                    # 对标点符号进行切分，但保留 ^ 用作标记识别符
-                    for special in "!\"#$%'()*+,-./:;<=>?@[\\]_`{|}~":
-                        tmp = tmp.replace(special, ' '+special+' ')
-                    tmp = tmp.replace('°C', ' °C ')
-                    tmp = tmp.replace('   ', ' ').replace('  ', ' ')
-                    if '' in tmp.split():
-                        print('tmp中存在空字符error\n')
-
-                    passages_list.append(tmp)
-                    id_list_list.append(id_list_only)
-
-    with codecs.open(train_path + "/" + 'train.txt', 'w', encoding='utf-8') as f:
-        for sentence in passages_list:
-            f.write(sentence)
-            f.write('\n')
-    with codecs.open(train_path + "/" + 'train_goldenID.txt', 'w', encoding='utf-8') as f:
-        for sentence in id_list_list:
-            f.write('\t'.join(sentence))
-            f.write('\n')
-    with codecs.open(train_path + "/" + 'train_raw.txt', 'w', encoding='utf-8') as f:
-        for sentence in raw_sentence_list:
-            f.write(sentence)
-            f.write('\n')
-    passages_list = []
-    del passages_list
-
-    print('标注proID的实体的个数：{}'.format((num_annotations_pro)))
-    print('标注pro类型的实体的个数：{}'.format((num_entitytype_pro)))
-    print('标注geneID的实体的个数：{}'.format((num_annotations_gene)))
-    print('标注gene类型的实体的个数：{}'.format((num_entitytype_gene)))
-    print('passage 总数： {}'.format(num_sentence)) # 13697
-
-
 # 利用GENIA tagger工具对标记过的语料进行预处理（分词+POS+CHUNK+NER）
 # 得到 train.genia 文件
 
@@ -359,68 +166,79 @@ def judge(word, label_sen, flag):
 
 
 # 根据预处理语料的标记 <B-xxx-></-I-xxx> 获取BIO标签
-def getLabel(dataPath):
+def getLabel(dataPath, label_array=False):
+    '''
+    逐行读取 train.genia.txt，一遍扫描同时写出 train.out.txt 和 label.txt
+    内存占用只与最长的句子有关
+    label_array=True 时另存一份整数标签 label.npz (labels: int8, offsets: 每句的起始下标)
+    '''
     flag = 0    # 0:实体结束    1:实体内部  2:特殊实体[]
     label_sen = []
-    sent = []
+    bio_sen = []    # 当前句子中每个token的BIO标签首字母
     geniaPath = dataPath+ '/' + 'train.genia.txt'
     outputPath = dataPath+ '/' + 'train.out.txt'
+    if label_array:
+        label_ids = array('b')
+        offsets = array('q', [0])
 
-    with codecs.open(geniaPath, 'r', encoding='utf-8') as data:
+    with codecs.open(geniaPath, 'r', encoding='utf-8') as data, \
+            codecs.open(outputPath, 'w', encoding='utf-8') as f, \
+            open(dataPath + '/' +'label.txt', 'w') as ff:
         for line in data:
             if not line=='\n':
-                words = line.split('\t')[0]
-                word, flag = judge(words, label_sen, flag)
+                splited = line.split('\t')
+                word, flag = judge(splited[0], label_sen, flag)
                 if not word:
                     # 跳过单纯的标签 B^ 和 ^I
                     continue
-                sent.append(word + '\t' + '\t'.join(line.split('\t')[2:-1]) + '\t' + label_sen[-1] + '\n')
+                label = label_sen[-1]
+                f.write(word + '\t' + '\t'.join(splited[2:-1]) + '\t' + label + '\n')
+                bio_sen.append(label[0])
+                if label_array:
+                    label_ids.append(label2idx[label])
             else:
-                # label.append(label_sen)
                 flag = 0
                 label_sen = []
-                sent.append('\n')
-
-    with codecs.open(outputPath, 'w', encoding='utf-8') as f:
-        for line in sent:
-            f.write(line)
-
-    # 生成单独的BIO标签文件
-    label_sen = []
-    ff = open(dataPath + '/' +'label.txt', 'w')
-    with codecs.open(dataPath + '/' +'train.out.txt', encoding='utf-8') as f:
-        lines = f.readlines()
-    for line in tqdm(lines):
-        if line=='\n':
-            ff.write(''.join(label_sen))
-            ff.write('\n')
-            label_sen = []
-        else:
-            label = line.split('\t')[-1]
-            label_sen.append(label.strip('\n')[0])
-    ff.close()
+                f.write('\n')
+                # 生成单独的BIO标签文件
+                ff.write(''.join(bio_sen))
+                ff.write('\n')
+                bio_sen = []
+                if label_array:
+                    offsets.append(len(label_ids))
 
+    if label_array:
+        import numpy as np
+        np.savez(dataPath + '/' + 'label.npz',
+                 labels=np.frombuffer(label_ids, dtype=np.int8),
+                 offsets=np.frombuffer(offsets, dtype=np.int64))
 
 
 if __name__ == '__main__':
 
-    B_tag = ['B‐^', 'B‐^^']   # '‐' != '-'
-    I_tag = ['^‐I', '^^‐I']
-
     train_path = r'/Users/ningshixian/Desktop/BC6_Track1/BioIDtraining_2/train'
     BioC_PATH = r'/Users/ningshixian/Desktop/BC6_Track1/BioIDtraining_2/caption_bioc'
     files = os.listdir(BioC_PATH)  # 得到文件夹下的所有文件名称
     files.sort()
     
-    readXML(files, BioC_PATH)
+    readXML(files, BioC_PATH, train_path, 'train', SKIP_PASSAGES, processes=os.cpu_count(), incremental=True)
     print("完结撒花====")
 
     '''
+    等价于手动运行：
     % cd geniatagger-3.0.2
     % ./geniatagger  /Users/ningshixian/Desktop/'BC6_Track1'/BioIDtraining_2/train/train.txt \
     > /Users/ningshixian/Desktop/'BC6_Track1'/BioIDtraining_2/train/train.genia.txt
     '''
 
+    # 利用GENIA tagger工具对标记过的语料进行预处理，每个CPU核一个常驻的tagger进程
+    # 已标注过的句子直接从缓存中读取，只有新增或修改过的句子才会重新标注
+    # 没有安装geniatagger时，可用 STANDIN_COMMAND 代替
+    GENIA_PATH = r'/Users/ningshixian/Desktop/BC6_Track1/geniatagger-3.0.2'
+    stage = TaggingStage(['./geniatagger'], train_path + '/genia.cache', cwd=GENIA_PATH)
+    stage.tagFile(train_path + '/train.txt', train_path + '/train.genia.txt')
+    stage.close()
+
     # getLabel(train_path)
     # print("完结撒花====")
 
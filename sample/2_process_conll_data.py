@@ -6,10 +6,12 @@ from collections import OrderedDict
 import numpy as np
 np.random.seed(1337)
 from tqdm import tqdm
-import word2vec
-from keras.preprocessing.text import Tokenizer, text_to_word_sequence
-from sample.utils.helpers import wordNormalize, createCharDict
+from sample.utils.helpers import wordNormalize, createCharDict, getCasting, getCastingVocab
 from sample.utils.helpers import get_stop_dic
+from sample.utils.embedding import normalizeKeys, loadBinEmbeddings, loadTxtEmbeddings, EmbeddingStore
+from sample.utils.conll_reader import ConllVocab, readConll, gatherSentences
+from sample.utils.dataset import Dataset
+from sample.utils.vocabulary import Vocabulary
 # import nltk
 # nltk.download()
 from nltk.corpus import stopwords
@@ -23,34 +25,14 @@ embeddingFile = r'wikipedia-pubmed-and-PMC-w2v.bin'
 dict2idx = {'O': 0, 'B': 1, 'I': 2}  # 字典特征
 label2idx = {'O': 0, 'B-protein': 1, 'I-protein': 2, 'B-gene': 3, 'I-gene': 4}
 
-maxlen_s = 455  # 句子截断长度
+maxlen_s = 455  # 训练时的句子截断长度（数据集中保存完整的句子，预测时用滑动窗口）
 maxlen_w = 21  # 单词截断长度
 word_size = 200  # 词向量维度
-MAX_NB_WORDS = None  # 不设置最大词数
 word_len_list = [0]  # 用于统计单词长度
 sen_len_list = [0]  # 用于统计句子长度
 
 
 
-def readBinEmbedFile(embFile):
-    """
-    读取二进制格式保存的词向量文件，引入外部知识
-    """
-    print("\nProcessing Embedding File...")
-    embeddings = OrderedDict()
-    embeddings["PADDING_TOKEN"] = np.zeros(word_size)
-    embeddings["UNKNOWN_TOKEN"] = np.random.uniform(-0.1, 0.1, word_size)
-    embeddings["NUMBER"] = np.random.uniform(-0.25, 0.25, word_size)
-
-    model = word2vec.load(embFile)
-    print('加载词向量文件完成')
-    for i in tqdm(range(len(model.vectors))):
-        vector = model.vectors[i]
-        word = model.vocab[i].lower()   # convert all characters to lowercase
-        embeddings[word] = vector
-    return embeddings
-
-
 def readTxtEmbedFile(embFile):
     """
     读取预训练的词向量文件，引入外部知识
@@ -61,16 +43,10 @@ def readTxtEmbedFile(embFile):
     embeddings["UNKNOWN_TOKEN"] = np.random.uniform(-0.1, 0.1, word_size)
     embeddings["NUMBER"] = np.random.uniform(-0.1, 0.1, word_size)
 
-    with open(embFile) as f:
-        lines = f.readlines()
-    for i in tqdm(range(len(lines))):
-        line = lines[i]
-        if len(line.split())<=2:
-            continue
-        values = line.strip().split()
-        word = values[0].lower()
-        vector = np.asarray(values[1:], dtype=np.float32)
-        embeddings[word] = vector
+    # 按字节范围切分后多进程解析
+    index, matrix = loadTxtEmbeddings(embFile)
+    for word, i in index.items():
+        embeddings[word] = matrix[i]
     return embeddings
 
 
@@ -82,9 +58,10 @@ def readGensimFile(embFile):
     return word_vectors
 
 
-def produce_matrix(word_index, embedFile):
+def produce_matrix(word_vocab, embedFile):
     '''
-    生成词向量矩阵 embedding_matrix
+    生成词向量矩阵 embedding_matrix，共 word_vocab.num_ids 行
+    最后一行是未登录词（oov='unk'），与没有预训练词向量的词一样使用 UNKNOWN_TOKEN
     '''
 
     """获取停用词词典+标点符号"""
@@ -101,27 +78,34 @@ def produce_matrix(word_index, embedFile):
     miss_num=0
     num=0
     # embeddings_index = readGensimFile(embedFile)
-    embeddings_index = readBinEmbedFile(embedFile)
-    print('Found %s word vectors.' % len(embeddings_index))  # 4706287
-
-    num_words = len(word_index)+1
-    embedding_matrix = np.zeros((num_words, word_size))
+    word_index = word_vocab.word_index
+    # 只读取 word_index 中的词（及其去掉标点后的形式）的词向量
+    keys = {word: normalizeKeys(word) for word in word_index}
+    vocab = set(key for pair in keys.values() for key in pair)
+    if embedFile.endswith('.bin'):
+        index, vectors = loadBinEmbeddings(embedFile, vocab)
+    else:
+        index, vectors = loadTxtEmbeddings(embedFile, vocab)
+    print('Found %s word vectors.' % len(index))
+    unknown = np.random.uniform(-0.1, 0.1, word_size)    # UNKNOWN_TOKEN
+    np.random.uniform(-0.25, 0.25, word_size)   # NUMBER，保持随机数序列与原来读取 .bin 文件时一致
+
+    num_words = word_vocab.num_ids
+    embedding_matrix = np.zeros((num_words, word_size), dtype=np.float32)
+    if word_vocab.oov == 'unk':
+        embedding_matrix[word_vocab.oov_id] = unknown
     for word, i in word_index.items():
         if word in stop_word:
             word_id_filter.append(i)
 
-        if word.lower() in embeddings_index:
-            vec = embeddings_index.get(word.lower())
-        else:
-            for punc in string.punctuation:
-                word = word.replace(punc, '')
-            vec = embeddings_index.get(word.lower())
-        if vec is not None:
+        key, stripped = keys[word]
+        row = index[key] if key in index else index.get(stripped)
+        if row is not None:
             num=num+1
+            embedding_matrix[i] = vectors[row]
         else:
             miss_num=miss_num+1
-            vec = embeddings_index["UNKNOWN_TOKEN"] # 未登录词均统一表示
-        embedding_matrix[i] = vec
+            embedding_matrix[i] = unknown # 未登录词均统一表示
     print('missnum',miss_num)    # 8381
     print('num',num)    # 20431
     print('word_id_filter:{}'.format(word_id_filter))
@@ -142,182 +126,40 @@ def produce_matrix(word_index, embedFile):
     return embedding_matrix
 
 
-def padCharacters(chars_dic, max_char):
-    print('\n补齐字符向量长度')
-    for senIdx in tqdm(range(len(chars_dic))):
-        for tokenIdx in range(len(chars_dic[senIdx])):
-            token = chars_dic[senIdx][tokenIdx]
-            lenth = max_char - len(token)
-            if lenth >= 0:
-                chars_dic[senIdx][tokenIdx] = np.pad(token, (0, lenth), 'constant')
-            else:
-                chars_dic[senIdx][tokenIdx] = token[:max_char]
-            assert len(chars_dic[senIdx][tokenIdx])==max_char
-    return chars_dic
-
-
-def getCasting(word):
-    casing = 'other'
-
-    if word.isdigit():
-        casing = 'numeric'
-    elif word.islower():
-        casing='allLower'
-    elif word.isupper():    # DF43 也属于
-        casing = 'allUpper'
-    elif word[0].isupper():
-        casing = 'initialUpper'
-
-    return casing
-
-def getCastingVocab():
-    entries = ['other', 'numeric','allLower', 'allUpper', 'initialUpper']
-    return {entries[idx]:idx for idx in range(len(entries))}
-
-
 def getData(trainCorpus, sen_len_list):
     '''
     获取训练和验证数据
+    :return: {'train': ConllCorpus, 'test': ConllCorpus}, ConllVocab
     '''
-    nb_word = 0     # 用于统计句子的单词个数
-    chars_not_exit = set()     # 统计未登录字符
-    char2idx = createCharDict()
-    casing_vocab = getCastingVocab()    # 大小写字典
     pos2idx = OrderedDict()
     pos2idx['None'] = 0
     chunk2idx = {'None': 0}
+    vocab = ConllVocab(createCharDict(), getCasting, getCastingVocab(),
+                       pos2idx, chunk2idx, dict2idx, label2idx)
+    vocab.word_len_list = word_len_list
+    vocab.sen_len_list = sen_len_list
 
-    datasDic = {'train':[], 'devel':[], 'test':[]}
-    charsDic = {'train':[], 'devel':[], 'test':[]}
-    capDic = {'train':[], 'devel':[], 'test':[]}
-    posDic = {'train': [], 'devel': [], 'test':[]}
-    chunkDic = {'train': [], 'devel': [], 'test':[]}
-    labelsDic = {'train':[], 'devel':[], 'test':[]}
-    dictDic = {'train':[], 'devel':[], 'test':[]}
-    ngramDic = {'train':[], 'devel':[], 'test':[]}
-
-    len_list={'train':[], 'test':[]}
+    corpusDic = {}
     for name in ['train', 'test']:
-        with open(trainCorpus + '/' + name + '.final.txt', encoding='utf-8') as f:
-            data_sen = []
-            char_sen = []
-            cap_sen = []
-            pos_sen = []
-            chunk_sen = []
-            labels_sen = []
-            dict_sen = []
-            # ngram_sen = []
-            num = -1
-            line_number = 0
-            for line in f:
-                if line == '\n':
-                    len_list[name].append(nb_word)
-                    line_number +=1
-                    num += 1
-                    if nb_word > sen_len_list[-1]:
-                        sen_len_list.append(nb_word)
-                    assert len(data_sen) == len(labels_sen)
-                    if nb_word <= maxlen_s:
-                        datasDic[name].append(' '.join(data_sen))  # .join()
-                        charsDic[name].append(char_sen)
-                        capDic[name].append(cap_sen)
-                        posDic[name].append(pos_sen)
-                        chunkDic[name].append(chunk_sen)
-                        labelsDic[name].append(labels_sen)
-                        dictDic[name].append(dict_sen)
-                        # ngramDic[name].append(ngram_sen)
-                    else:
-                        datasDic[name].append(' '.join(data_sen[:maxlen_s]))  # .join()
-                        charsDic[name].append(char_sen[:maxlen_s])
-                        capDic[name].append(cap_sen[:maxlen_s])
-                        posDic[name].append(pos_sen[:maxlen_s])
-                        chunkDic[name].append(chunk_sen[:maxlen_s])
-                        labelsDic[name].append(labels_sen[:maxlen_s])
-                        dictDic[name].append(dict_sen[:maxlen_s])
-                        # ngramDic[name].append(ngram_sen[:maxlen_s])
-
-                    # if name=='train' and num==3725:
-                    #     print(len(data_sen[:maxlen_s]), len(labels_sen[:maxlen_s]))
-                    #     print(data_sen[:maxlen_s])
-                    # elif name=='train' and num==7587:
-                    #     print(len(data_sen[:maxlen_s]), len(labels_sen[:maxlen_s]))
-                    #     print(data_sen[:maxlen_s])
-                    assert len(data_sen[:maxlen_s])==len(labels_sen[:maxlen_s])
-
-                    data_sen = []
-                    char_sen = []
-                    cap_sen = []
-                    pos_sen = []
-                    chunk_sen = []
-                    labels_sen = []
-                    dict_sen = []
-                    nb_word = 0
-                else:
-                    # print(line_number)
-                    nb_word+=1
-                    line_number += 1
-                    token = line.replace('\n', '').split('\t')
-                    word = token[0]
-                    pos = token[1]
-                    chunk = token[2]
-                    dict = token[3]
-                    label = token[-1]
-
-                    labelIdx = label2idx.get(label) if label in label2idx else label2idx.get('O')
-                    labelIdx = np.eye(len(label2idx))[labelIdx]
-                    labelIdx = list(labelIdx)
-
-                    # 大小写特征
-                    cap = casing_vocab[getCasting(word)]
-                    # 对单词进行清洗
-                    word = wordNormalize(word)
-                    # 获取pos和chunk字典
-                    if not pos in pos2idx:
-                        pos2idx[pos] = len(pos2idx)
-                    if not chunk in chunk2idx:
-                        chunk2idx[chunk] = len(chunk2idx)
-                    # 字符特征
-                    nb_char = 0
-                    char_w = []
-                    for char in word:
-                        nb_char+=1
-                        charIdx = char2idx.get(char)
-                        if not charIdx:
-                            chars_not_exit.add(char)
-                            char_w.append(char2idx['**'])
-                        else:
-                            char_w.append(charIdx)
-                    if nb_char > word_len_list[-1]:
-                        word_len_list.append(nb_char)
-                    # 字典特征
-                    dict_fea = dict2idx[dict]
-
-                    data_sen.append(word)
-                    char_sen.append(char_w)
-                    cap_sen.append(cap)
-                    pos_sen.append(pos)
-                    chunk_sen.append(chunk)
-                    labels_sen.append(labelIdx)
-                    dict_sen.append(dict_fea)
-
-
-    print('chars not exits in the char2idx:{}'.format(chars_not_exit))
+        corpusDic[name] = readConll(trainCorpus + '/' + name + '.final.txt', vocab, None)
+
     print('longest char is', word_len_list[-5:])  # [557, 628, 752, 760, 902]
     print('longest word is', sen_len_list[-5:])  # [391, 399, 427, 451, 470]
     print('len(pos2idx):{}'.format(len(pos2idx)))     # 50
     print('len(chunk2idx):{}'.format(len(chunk2idx)))     # 22
 
-    a = sorted(len_list['train'])
-    b = sorted(len_list['test'])
+    a = sorted(corpusDic['train'].lengths.tolist())
+    b = sorted(corpusDic['test'].lengths.tolist())
     print('len_list: {}, {}'.format(a[-5:], b[-5:]))
 
-    return datasDic, charsDic, capDic, posDic, chunkDic, labelsDic, dictDic, pos2idx, chunk2idx
+    return corpusDic, vocab
 
 
 def main():
 
     # stop_word_dic = get_stop_dic()
-    datasDic, charsDic, capDic, posDic, chunkDic, labelsDic, dictDic, pos2idx, chunk2idx = getData(corpusPath, sen_len_list)
+    corpusDic, vocab = getData(corpusPath, sen_len_list)
+    pos2idx, chunk2idx = vocab.pos2idx, vocab.chunk2idx
 
     with open('pos2idx.txt', 'w') as f:
         for key, value in pos2idx.items():
@@ -328,85 +170,43 @@ def main():
             if key:
                 f.write('{}\t{}\n'.format(key, value))
 
-    # # 将验证集并入训练集(无关)
-    # for item in [datasDic, charsDic, capDic, posDic, chunkDic, labelsDic]:
-    #     item['train'].extend(item['devel'])
-    #     item['devel'] = None
-    # print('合并训练集data大小：', len(datasDic['train']))  # 13697
-
-    elmo_input = {}
-    for name in ['train', 'test']:
-        elmo_input[name] = []
-        for i in range(len(datasDic[name])):
-            line = datasDic[name][i]
-            line = line.split()
-            # line = text_to_word_sequence(line)
-            elmo_input[name].append(line)
-    # print(elmo_input['train'][:2])
-
-    data = []
     for name in ['train', 'test']:
-        print('The size of {} is {}'.format(name, len(datasDic[name])))  # 13697   4528
-        data.extend(datasDic[name])
-    tokenizer = Tokenizer(num_words=MAX_NB_WORDS,
-                          filters='',   # 需要过滤掉的字符列表（或连接）
-                          split=' ')    # 词的分隔符
-    tokenizer.fit_on_texts(data)
-    data = []
-
-    word_index = tokenizer.word_index   # 将词（字符串）映射到索引（整型）的字典
-    word_counts = tokenizer.word_counts # 在训练时将词（字符串）映射到其出现次数的字典
+        print('The size of {} is {}'.format(name, len(corpusDic[name])))  # 13697   4528
+    # 词频直接由 words 列统计（与逐句拟合 Tokenizer 的编号一致）
+    # 只统计每个句子的前 maxlen_s 个 token，与截断后拟合的编号一致（NED 中硬编码的编号依赖这一顺序）
+    ids = np.concatenate([corpusDic[name].columns['words'][gatherSentences(
+        corpusDic[name].offsets, np.arange(len(corpusDic[name])), maxlen_s)[2]] for name in ['train', 'test']])
+    # 未登录词单独编号（len(word_index)+1），不与补齐的 0 混在一起：被截断的尾部 token 和服务中的新词都用这一行
+    word_vocab = Vocabulary.fromIds(ids, vocab.word_list, oov='unk')
+    word_index = word_vocab.word_index   # 将词（字符串）映射到索引（整型）的字典
     print('Found %s unique tokens.' % len(word_index))  # 26987
 
+    word_vocab.save('word_vocab.json')
     with open('word_index.pkl', "wb") as f:
         pkl.dump(word_index, f, -1)
 
+    # 将训练数据序列化：先求出单词表中每个词的编号，再对 words 列整体查表
+    word_ids = word_vocab.encode(vocab.word_list)
+    # 字符特征：单词表中每个词的字符编号只算一次，超过 maxlen_w 的截断
+    char_table = vocab.charTable(maxlen_w)
+    print('chars not exits in the char2idx:{}'.format(vocab.chars_not_exit))
 
-    # 将训练数据序列化
-    datasDic['train'] = tokenizer.texts_to_sequences(datasDic['train'])
-    datasDic['test'] = tokenizer.texts_to_sequences(datasDic['test'])
+    # 获取词向量矩阵
+    embedding_matrix = produce_matrix(word_vocab, embeddingPath+'/'+embeddingFile)
 
-    # 保证训练数据与标签长度一致
+    # 保存文件：每个数据集一个目录，各列分别保存为 .npy
+    vocabs = {'word_index': word_index, 'label2idx': label2idx, 'pos2idx': pos2idx,
+              'chunk2idx': chunk2idx, 'dict2idx': dict2idx, 'char2idx': vocab.char2idx}
     for name in ['train', 'test']:
-        for i in range(len(datasDic[name])):
-            assert len(datasDic[name][i]) == len(labelsDic[name][i])== len(elmo_input[name][i])
-
-    # # 保证训练数据与标签长度一致
-    # for i in range(len(datasDic['train'])):
-    #     line = datasDic['train'][i]
-    #     if not len(line) == len(labelsDic['train'][i]):
-    #         print(i)
-    # for i in range(len(datasDic['test'])):
-    #     line = datasDic['test'][i]
-    #     if not len(line) == len(labelsDic['test'][i]):
-    #         print(i)
-
-    # 将pos特征序列化
-    for name in ['train', 'test']:
-        for i in range(len(posDic[name])):
-            sent = posDic[name][i]
-            posDic[name][i] = [pos2idx[item] for item in sent]
-    # 将chunk特征序列化
-    for name in ['train', 'test']:
-        for i in range(len(chunkDic[name])):
-            sent = chunkDic[name][i]
-            chunkDic[name][i] = [chunk2idx[item] for item in sent]
-    # 补齐字符向量长度 word_maxlen
-    charsDic['train'] = padCharacters(charsDic['train'], maxlen_w)
-    charsDic['test'] = padCharacters(charsDic['test'], maxlen_w)
-    # 获取词向量矩阵
-    embedding_matrix = produce_matrix(word_index, embeddingPath+'/'+embeddingFile)
-
-    # 保存文件
-    with open(corpusPath+'/train.pkl', "wb") as f:
-        pkl.dump((datasDic['train'], elmo_input['train'], labelsDic['train'], charsDic['train'],
-                  capDic['train'], posDic['train'], chunkDic['train'], dictDic['train']), f, -1)
-    with open(corpusPath+'/test.pkl', "wb") as f:
-        pkl.dump((datasDic['test'], elmo_input['test'], labelsDic['test'], charsDic['test'],
-                  capDic['test'], posDic['test'], chunkDic['test'], dictDic['test']), f, -1)
-
-    with open(embeddingPath + '/emb.pkl', "wb") as f:
-        pkl.dump((embedding_matrix), f, -1)
+        corpus = corpusDic[name]
+        columns = dict(corpus.columns)
+        columns['tokens'] = corpus.columns['words']
+        columns['words'] = word_ids[corpus.columns['words']]
+        Dataset.save(corpusPath + '/' + name + '_dataset', columns, corpus.offsets,
+                     vocab.word_list, char_table, maxlen_s, vocabs)
+
+    # emb.npy 供 NER/NED 用 mmap 共享打开
+    EmbeddingStore.save(embeddingPath + '/emb', embedding_matrix)
     with open(embeddingPath + '/length.pkl', "wb") as f:
         pkl.dump((maxlen_w, maxlen_s), f, -1)
     embedding_matrix = {}
@@ -38,6 +38,7 @@ import tensorflow as tf
 from keras.backend.tensorflow_backend import set_session
 import importlib
 m=importlib.import_module("4_test_nnet")
+from sample.utils.embedding import EmbeddingStore
 
 # GPU内存分配
 config = tf.ConfigProto()
@@ -404,8 +405,7 @@ if __name__ == '__main__':
     # savedPath = 'data/weights2.{epoch:02d}-{val_acc:.2f}.hdf5'
 
     embeddingPath = r'/home/administrator/PycharmProjects/embedding'
-    with open(embeddingPath + '/emb.pkl', "rb") as f:
-        embedding_matrix = pkl.load(f)
+    embedding_matrix = EmbeddingStore.open(embeddingPath + '/emb').matrix
 
     rootCorpus = r'/home/administrator/PycharmProjects/keras_bc6_track1/sample/ned/data/'
     with open(rootCorpus + 'data_train2.pkl', "rb") as f:
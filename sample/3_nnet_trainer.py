@@ -0,0 +1,124 @@
+'''
+NER 模型的训练：单词/字符/大小写/词性/chunk/字典特征 + BiLSTM + ChainCRF
+
+句子长度不固定（Input(shape=(None, ...))），训练数据由 BucketedSequence 按长度分桶生成：
+每个 batch 只补齐到其中最长的句子，补齐的位置由单词 Embedding(mask_zero=True) 的 mask 传给 ChainCRF，
+不参与损失的计算；超过 maxlen_s 的句子从尾部截断
+不使用 ELMo 特征，4_test_nnet 只取模型需要的前 len(model.inputs) 个特征
+
+python sample/3_nnet_trainer.py
+预测时 importlib.import_module("3_nnet_trainer").buildModel() 得到同样结构的模型，再加载保存的权重
+'''
+import time
+from keras.layers import Input, Embedding, LSTM, Bidirectional, TimeDistributed, Dense, Dropout
+from keras.layers import Conv1D, GlobalMaxPooling1D, concatenate
+from keras.models import Model
+from keras.callbacks import ModelCheckpoint, EarlyStopping
+from sample.keraslayers.ChainCRF import ChainCRF
+from sample.utils.dataset import Dataset
+from sample.utils.batching import BucketedSequence, FEATURES
+from sample.utils.embedding import EmbeddingStore
+from sample.utils.helpers import createCharDict, getCastingVocab
+from sample.utils.ner_service import readIndex
+import tensorflow as tf
+from keras.backend.tensorflow_backend import set_session
+
+config = tf.ConfigProto()
+config.gpu_options.allow_growth = True
+set_session(tf.Session(config=config))
+
+corpusPath = r'data'
+embeddingPath = r'/home/administrator/PycharmProjects/embedding'
+modelPath = r'model/Model_Best.h5'
+dict2idx = {'O': 0, 'B': 1, 'I': 2}  # 与 2_process_conll_data 一致
+features = FEATURES[:-1]    # [words, chars, cap, pos, chunk, dict]，不含 ELMo
+num_classes = 5
+maxlen_w = 21
+batch_size = 32
+epochs = 40
+
+
+def featureSizes():
+    '''
+    各离散特征的编号个数，即对应 Embedding 层的行数
+    '''
+    return {
+        'chars': len(createCharDict()),
+        'cap': len(getCastingVocab()),
+        'pos': max(readIndex('pos2idx.txt').values()) + 1,
+        'chunk': max(readIndex('chunk2idx.txt').values()) + 1,
+        'dict': len(dict2idx),
+    }
+
+
+def buildModel(embedding_matrix=None, sizes=None, maxlen_w=maxlen_w):
+    '''
+    :param embedding_matrix: 词向量矩阵，默认为 2_process_conll_data 保存的 emb.npy（含未登录词的一行）
+    :param sizes: 特征名 -> 编号个数，默认为 featureSizes()
+    '''
+    if embedding_matrix is None:
+        embedding_matrix = EmbeddingStore.open(embeddingPath + '/emb').matrix
+    sizes = sizes or featureSizes()
+
+    word_input = Input(shape=(None,), dtype='int32', name='words')
+    char_input = Input(shape=(None, maxlen_w), dtype='int32', name='chars')
+    inputs = [word_input, char_input] + [Input(shape=(None,), dtype='int32', name=name)
+                                         for name in ['cap', 'pos', 'chunk', 'dict']]
+
+    # 补齐的位置单词编号为 0，mask 经 concatenate、BiLSTM 传给 ChainCRF
+    word_emb = Embedding(input_dim=embedding_matrix.shape[0],
+                         output_dim=embedding_matrix.shape[1],
+                         weights=[embedding_matrix],
+                         mask_zero=True,
+                         trainable=False)(word_input)
+    # 字符特征：每个词的字符经 CNN + max pooling 得到一个向量
+    char_emb = TimeDistributed(Embedding(sizes['chars'], 50))(char_input)
+    char_emb = TimeDistributed(Conv1D(50, 3, padding='same', activation='relu'))(char_emb)
+    char_emb = TimeDistributed(GlobalMaxPooling1D())(char_emb)
+    feature_embs = [Embedding(sizes[name], dim)(x)
+                    for name, dim, x in zip(['cap', 'pos', 'chunk', 'dict'], [5, 25, 10, 5], inputs[2:])]
+
+    x = concatenate([word_emb, char_emb] + feature_embs)
+    x = Dropout(0.5)(x)
+    x = Bidirectional(LSTM(200, return_sequences=True, dropout=0.2, recurrent_dropout=0.2))(x)
+    x = Dropout(0.5)(x)
+    x = TimeDistributed(Dense(num_classes))(x)
+    crf = ChainCRF()
+    output = crf(x)
+
+    model = Model(inputs=inputs, outputs=output)
+    model.compile(loss=crf.loss, optimizer='adam')
+    model.summary()
+    return model
+
+
+def main():
+    train_set = Dataset.open(corpusPath + '/train_dataset')
+    test_set = Dataset.open(corpusPath + '/test_dataset')
+    model = buildModel(maxlen_w=train_set.maxlen_w)
+
+    # 按长度分桶，每个 epoch 打乱 batch 的顺序；标签在取 batch 时才展开为 one-hot
+    train_seq = BucketedSequence(train_set, batch_size, features=features, num_classes=num_classes, shuffle=True)
+    test_seq = BucketedSequence(test_set, batch_size, features=features, num_classes=num_classes)
+    print('train: {} batches, test: {} batches'.format(len(train_seq), len(test_seq)))
+
+    saveModel = ModelCheckpoint(modelPath,
+                                monitor='val_loss',
+                                save_best_only=True,  # 只保存在验证集上性能最好的模型
+                                save_weights_only=True,
+                                mode='auto')
+    earlyStop = EarlyStopping(monitor='val_loss', patience=5, mode='auto')
+
+    start_time = time.time()
+    model.fit_generator(train_seq,
+                        steps_per_epoch=len(train_seq),
+                        epochs=epochs,
+                        validation_data=test_seq,
+                        validation_steps=len(test_seq),
+                        callbacks=[saveModel, earlyStop])
+    time_diff = time.time() - start_time
+    print("Total %.2f min for training" % (time_diff / 60))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,12 @@
 import os
-import pickle as pkl
 import numpy as np
 from keras.models import load_model
-from keras.preprocessing.sequence import pad_sequences
 from sample.keraslayers.ChainCRF import create_custom_objects
 from sample.utils.write_test_result import writeOutputToFile
+from sample.utils.dataset import Dataset
+from sample.utils.batching import BucketedSequence, predictBucketed, FEATURES
+from sample.utils.prediction_cache import PredictionCache, sentenceKeys
+from sample.utils.manifest import fileHash
 import tensorflow as tf
 
 from keras.backend.tensorflow_backend import set_session
@@ -17,88 +19,71 @@ config = tf.ConfigProto()
 config.gpu_options.allow_growth = True
 set_session(tf.Session(config=config))
 
-'''
-获取模型需要预测的测试数据
-'''
-def getTestData():
-
-    with open('data/test.pkl', "rb") as f:
-        test_x, test_elmo, test_y, test_char, test_cap, test_pos, test_chunk, test_dict = pkl.load(f)
-
-    embeddingPath = r'/home/administrator/PycharmProjects/embedding'
-    with open(embeddingPath+'/length.pkl', "rb") as f:
-        word_maxlen, sentence_maxlen = pkl.load(f)
-
-    dataSet = {}
-    batch_size = 32
-    sentence_maxlen = 400
-    dataSet['test'] = [test_x, test_cap, test_pos, test_chunk, test_dict]
-
-
-    # pad the sequences with zero
-    for key, value in dataSet.items():
-        for i in range(len(value)):
-            dataSet[key][i] = pad_sequences(value[i], maxlen=sentence_maxlen, padding='post')
-
-    # pad the char sequences with zero list
-    for j in range(len(test_char)):
-        test_char[j] = test_char[j][:sentence_maxlen]
-        if len(test_char[j]) < sentence_maxlen:
-            test_char[j].extend(np.asarray([[0] * word_maxlen] * (sentence_maxlen - len(test_char[j]))))
-
-    new_test_elmo = []
-    for seq in test_elmo:
-        new_seq = []
-        for i in range(sentence_maxlen):
-            try:
-                new_seq.append(seq[i])
-            except:
-                new_seq.append("__PAD__")
-        new_test_elmo.append(new_seq)
-    test_elmo = np.array(new_test_elmo)
+# 滑动窗口：长句子切分为相互重叠的窗口分别预测再拼接，不再截断，窗口越短每个 batch 的计算量越小
+# 只用于句子长度不固定的模型；长度固定的模型每个窗口都要补齐到 fixed_len，窗口取 fixed_len
+window = 128
+overlap = 32
 
-    dataSet['test'].insert(1, np.asarray(test_char))
-    dataSet['test'].append(test_elmo)
-    test_y = pad_sequences(test_y, maxlen=sentence_maxlen, padding='post')
 
-    end2 = len(dataSet['test'][0]) // batch_size
-    for i in range(len(dataSet['test'])):
-        dataSet['test'][i] = dataSet['test'][i][:end2 * batch_size]
+def predictWindow(fixed_len):
+    '''
+    :param fixed_len: 模型的句子长度（input_shape），不固定时为 None
+    :return: 实际使用的窗口长度
+    '''
+    return fixed_len or window
 
-    dataSet['test'][1] = np.array(dataSet['test'][1])
 
-    print(np.array(test_x).shape)  # (4528, )
-    print(np.asarray(test_char).shape)     # (4528, 455, 21)
-    print(test_y.shape)    # (4528, 455, 5)
-    print('create test set done!\n')
-    return dataSet
+'''
+获取模型需要预测的测试数据
+按 batch 惰性生成，每个 batch 为 [words, chars, cap, pos, chunk, dict, elmo]，
+ELMo 的单词字符串在取 batch 时才由单词编号映射得到，不会生成整个测试集的 (N, 400) 字符串数组
+:param fixed_len: 模型的句子长度；为 None 时按长度分桶，每个 batch 只补齐到其中最长的句子
+:param indices: 只预测其中的句子，默认为全部
+:param window: 滑动窗口的长度（不超过 fixed_len），为 None 时截断到 400
+:param features: 模型的输入，3_nnet_trainer 训练的模型不含 ELMo
+'''
+def getTestData(fixed_len=400, batch_size=32, indices=None, window=None, overlap=overlap, features=FEATURES):
+    dataset = Dataset.open('data/test_dataset')
+    # 句子长度固定时最后一个 batch 也补满 batch_size，所有 batch 形状相同；补的句子在预测结果中去掉，不会丢掉尾部的句子
+    sequence = BucketedSequence(dataset, batch_size=batch_size, maxlen_s=400, fixed_len=fixed_len, indices=indices,
+                                pad_batches=fixed_len is not None, window=window, overlap=overlap,
+                                features=features)
+    print('create test set done! {} sentences, {} batches\n'.format(len(dataset), len(sequence)))
+    return sequence
 
 
 def main(ned_model=None, prob=5.5):
     root = '/home/administrator/PycharmProjects/keras_bc6_track1/sample/'
-    if not os.path.exists(root + 'result/predictions.pkl'):
-        dataSet = getTestData()
-
-        model = load_model('model/Model_4_75.00.h5')
-
-        # # 报错
-        # import importlib
-        # m = importlib.import_module("3_nnet_trainer")
-        # model = m.buildModel()
-        # path = '/home/administrator/PycharmProjects/keras_bc6_track1/sample/model/Model_Best.h5'
-        # model.load_weights(path)
-
-        print('加载模型成功!!')
-
-        predictions = model.predict(dataSet['test'])    # 预测
-        y_pred = predictions.argmax(axis=-1)
-
-        with open(root + 'result/predictions.pkl', "wb") as f:
-            pkl.dump((y_pred), f, -1)
-    else:
-        # with open(root + 'result/predictions_76.31.pkl', "rb") as f:
-        with open(root + 'result/predictions.pkl', "rb") as f:
-            y_pred = pkl.load(f)
+    model_path = 'model/Model_4_75.00.h5'
+    model = load_model(model_path)
+
+    # # 报错
+    # import importlib
+    # m = importlib.import_module("3_nnet_trainer")
+    # model = m.buildModel()
+    # path = '/home/administrator/PycharmProjects/keras_bc6_track1/sample/model/Model_Best.h5'
+    # model.load_weights(path)
+
+    print('加载模型成功!!')
+
+    # 模型的句子长度固定时（input_shape 不为 None）退化为补齐到固定长度，窗口即为该长度
+    fixed_len = model.input_shape[0][1]
+    window_len = predictWindow(fixed_len)
+    # 按句子缓存预测结果：键包含模型文件的 hash、特征 schema、窗口参数和句子内容，只预测新增或模型变化后的句子
+    cache = PredictionCache(root + 'result/predictions.db')
+    keys = sentenceKeys(Dataset.open('data/test_dataset'), fileHash(model_path), window=window_len, overlap=overlap)
+    y_pred = cache.get(keys)     # 每个句子一个标签编号数组，按原顺序
+    missing = [i for i, y in enumerate(y_pred) if y is None]
+    if missing:
+        # 按长度分桶预测
+        sequence = getTestData(fixed_len=fixed_len, indices=missing, window=window_len,
+                               features=FEATURES[:len(model.inputs)])
+        predicted = predictBucketed(model, sequence)
+        for i in missing:
+            y_pred[i] = predicted[i]
+        cache.put({keys[i]: y_pred[i] for i in missing})
+    print(cache)
+    cache.close()
 
     # 对实体预测结果y_pred进行链接，以特定格式写入XML文件
     writeOutputToFile(r'/home/administrator/PycharmProjects/keras_bc6_track1/sample/data/test.final.txt', y_pred, ned_model, prob)
@@ -0,0 +1,112 @@
+'''
+    分桶动态补齐 与 补齐到固定长度 的吞吐量对比
+
+    用 BiLSTM + ChainCRF 的小模型（只用单词特征），分别统计两种方式下
+    训练（train_on_batch）和预测（predict_on_batch）每秒处理的真实 token 数，以及补齐位置的比例
+    没有给出 --dataset 时，生成一个句子长度分布与 BC6 测试集相近的合成数据集
+
+    python -m sample.benchmarks.bench_bucketing --dataset data/test_dataset --batches 50
+    没有安装 keras 时直接退出（tests/test_batching.py 中有不需要模型的补齐比例检查）
+'''
+import time
+import argparse
+import tempfile
+import numpy as np
+from sample.utils.dataset import Dataset, COLUMNS
+
+
+def makeDataset(path, num_sentences, num_words=20000, maxlen_s=455, seed=1337):
+    '''
+    合成数据集：句子长度服从对数正态分布（中位数约 25，少数超过 200）
+    '''
+    rng = np.random.RandomState(seed)
+    lengths = np.clip(rng.lognormal(3.2, 0.7, num_sentences).astype(np.int64), 1, maxlen_s)
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    num_tokens = int(offsets[-1])
+    columns = {name: np.zeros(num_tokens, dtype=np.int8) for name in COLUMNS}
+    columns['words'] = rng.randint(1, num_words, num_tokens).astype(np.int32)
+    columns['tokens'] = columns['words']
+    columns['labels'] = rng.randint(0, 5, num_tokens).astype(np.int8)
+    words = ['w{}'.format(i) for i in range(num_words)]
+    Dataset.save(path, columns, offsets, words, np.zeros((num_words, 21), dtype=np.int16), maxlen_s, {})
+    return Dataset.open(path)
+
+
+def buildModel(num_words, num_classes=5):
+    from keras.models import Model
+    from keras.layers import Input, Embedding, LSTM, Bidirectional, TimeDistributed, Dense
+    from sample.keraslayers.ChainCRF import ChainCRF
+
+    words = Input(shape=(None,), dtype='int32')
+    x = Embedding(num_words, 100, mask_zero=True)(words)
+    x = Bidirectional(LSTM(100, return_sequences=True))(x)
+    x = TimeDistributed(Dense(num_classes))(x)
+    crf = ChainCRF()
+    output = crf(x)
+    model = Model(inputs=words, outputs=output)
+    model.compile(loss=crf.loss, optimizer='adam')
+    return model
+
+
+def run(model, sequence, num_batches, train):
+    '''
+    :param model: 有 train_on_batch / predict_on_batch 的对象
+    :return: (真实 token 数 / 秒, 补齐位置的比例)
+    '''
+    num_batches = min(num_batches, len(sequence))
+    step = max(1, len(sequence) // num_batches)
+    picks = list(range(0, len(sequence), step))[:num_batches]    # 均匀覆盖各个长度的桶
+    real, total, elapsed = 0, 0, 0.0
+    for i in picks:
+        (x,), y = sequence[i]
+        start = time.perf_counter()
+        if train:
+            model.train_on_batch(x, y)
+        else:
+            model.predict_on_batch(x)
+        elapsed += time.perf_counter() - start
+        real += int(sequence.unit_len[sequence.batches[i]].sum())
+        total += x.size
+    return real / elapsed, 1 - real / total
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dataset', default=None)
+    parser.add_argument('--sentences', type=int, default=4528)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--maxlen', type=int, default=400)
+    parser.add_argument('--batches', type=int, default=50)
+    args = parser.parse_args()
+    try:
+        from sample.utils.batching import BucketedSequence
+    except ImportError:
+        print('没有安装 keras，跳过')
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dataset = Dataset.open(args.dataset) if args.dataset else makeDataset(tmp + '/dataset', args.sentences)
+        num_words = int(np.max(dataset.column('words'))) + 1
+        model = buildModel(num_words)
+        sequences = {
+            'fixed': BucketedSequence(dataset, args.batch_size, features=['words'], num_classes=5,
+                                      fixed_len=args.maxlen),
+            'bucketed': BucketedSequence(dataset, args.batch_size, maxlen_s=args.maxlen,
+                                         features=['words'], num_classes=5),
+        }
+        # 预热：构建计算图
+        for sequence in sequences.values():
+            (x,), y = sequence[0]
+            model.train_on_batch(x, y)
+            model.predict_on_batch(x)
+
+        print('{} 个句子，batch_size={}，maxlen={}'.format(len(dataset), args.batch_size, args.maxlen))
+        print('{:<10}{:>10}{:>16}{:>16}'.format('', '补齐比例', '训练 token/s', '预测 token/s'))
+        for name, sequence in sequences.items():
+            train_speed, pad_ratio = run(model, sequence, args.batches, train=True)
+            predict_speed, _ = run(model, sequence, args.batches, train=False)
+            print('{:<10}{:>10.1%}{:>16.0f}{:>16.0f}'.format(name, pad_ratio, train_speed, predict_speed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+'''
+    字典匹配引擎测试：sample.utils.dict_automaton 与 esm 对比
+
+    分别统计构建时间、构建后进程常驻内存的增长、每秒匹配的字符数和匹配个数；
+    dict_automaton 另外统计从磁盘 mmap 加载的时间。未安装 esm 时只测试 dict_automaton
+
+    python -m sample.benchmarks.bench_dict_matcher \
+        --kb uniprot_sprot.dat2 gene_info2 --text train.txt
+    不指定 --kb / --text 时使用合成的字典和句子
+'''
+import gc
+import time
+import random
+import argparse
+import tempfile
+import importlib
+from sample.utils.dict_automaton import DictAutomaton
+
+try:
+    import esm
+except ImportError:
+    esm = None
+
+xml2dict = importlib.import_module('sample.1_xml2dict')
+
+
+def currentRSS():
+    '''
+    当前进程的常驻内存(MB)，仅支持 Linux
+    '''
+    with open('/proc/self/statm') as f:
+        pages = int(f.read().split()[1])
+    return pages * 4096 / 2 ** 20
+
+
+def makeWords(num_words, seed=1337):
+    rng = random.Random(seed)
+    letters = 'abcdefghijklmnopqrstuvwxyz0123456789-'
+    words = set()
+    while len(words) < num_words:
+        n = rng.randint(4, 24)
+        words.add(''.join(rng.choice(letters) for _ in range(n)))
+    return list(words)
+
+
+def makeText(words, num_sentences, seed=1337):
+    rng = random.Random(seed)
+    fillers = ['the', 'of', 'cells', 'were', 'stained', 'with', 'and', 'in', 'mutant', 'expression']
+    sentences = []
+    for _ in range(num_sentences):
+        tokens = [rng.choice(words) if rng.random() < 0.1 else rng.choice(fillers)
+                  for _ in range(rng.randint(10, 60))]
+        sentences.append(' '.join(tokens))
+    return sentences
+
+
+def bench(name, build, sentences):
+    gc.collect()
+    rss = currentRSS()
+    start = time.time()
+    dic = build()
+    build_time = time.time() - start
+    memory = currentRSS() - rss
+
+    num_chars = sum(len(s) for s in sentences)
+    num_matches = 0
+    start = time.time()
+    for sentence in sentences:
+        num_matches += len(dic.query(sentence))
+    elapsed = time.time() - start
+    print('{:<16}构建 {:7.2f} s  内存 {:8.1f} MB  匹配 {:10.0f} 字符/s  {:8.0f} 匹配/s  共 {} 个匹配'.format(
+        name, build_time, memory, num_chars / elapsed, num_matches / elapsed, num_matches))
+    return dic
+
+
+def buildEsm(words):
+    dic = esm.Index()
+    for word in words:
+        dic.enter(word)
+    dic.fix()
+    return dic
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--kb', nargs='*', help='uniprot_sprot.dat2 / gene_info2 格式的同义词表')
+    parser.add_argument('--text', help='每行一个句子，如 train.txt')
+    parser.add_argument('--words', type=int, default=200000, help='合成字典的词数')
+    parser.add_argument('--sentences', type=int, default=5000)
+    args = parser.parse_args()
+
+    if args.kb:
+        word_set = set()
+        for path in args.kb:
+            xml2dict.readSynonyms(path, word_set)
+        words = sorted(word_set)
+    else:
+        words = makeWords(args.words)
+    if args.text:
+        with open(args.text, encoding='utf-8') as f:
+            sentences = [line.rstrip('\n').lower() for line in f][:args.sentences]
+    else:
+        sentences = makeText(words, args.sentences)
+    print('字典 {} 个词，{} 个句子'.format(len(words), len(sentences)))
+
+    dic = bench('dict_automaton', lambda: DictAutomaton.build(words), sentences)
+    with tempfile.TemporaryDirectory() as tmp:
+        dic.save(tmp)
+        start = time.time()
+        DictAutomaton.load(tmp)
+        print('{:<16}mmap 加载 {:.4f} s，{} 个状态'.format('dict_automaton', time.time() - start,
+                                                         dic.header['num_states']))
+        del dic
+        bench('dict (mmap)', lambda: DictAutomaton.load(tmp), sentences)
+
+    if esm is None:
+        print('未安装 esm，跳过对比')
+    else:
+        bench('esm', lambda: buildEsm(words), sentences)
+
+
+if __name__ == '__main__':
+    main()
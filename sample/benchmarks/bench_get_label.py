@@ -0,0 +1,70 @@
+'''
+    getLabel 吞吐量测试
+
+    生成一个合成的 genia 文件（默认 100 万个 token），统计 getLabel 每秒处理的 token 数
+    和进程的内存峰值
+
+    python -m sample.benchmarks.bench_get_label --tokens 1000000
+'''
+import os
+import time
+import random
+import argparse
+import resource
+import tempfile
+import importlib
+
+conv = importlib.import_module('sample.1_xml2conll_offset')
+
+WORDS = ['Gli1', 'ZF', 'DNA', 'binding', 'the', 'of', 'p53', 'cells', '(', ')', 'mutant', 'Smo', 'kinase', 'in']
+
+
+def makeGeniaFile(path, num_tokens, seed=1337):
+    '''
+    生成合成的 genia 文件：word  base  POS  chunk  NE
+    约 10% 的 token 为标记过的实体（单词实体和多词实体各占一半）
+    '''
+    rng = random.Random(seed)
+    B, I = conv.B_tag, conv.I_tag
+    n = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        while n < num_tokens:
+            for _ in range(rng.randint(5, 60)):
+                word = rng.choice(WORDS)
+                r = rng.random()
+                k = rng.randint(0, 1)
+                if r < 0.05:
+                    words = [B[k] + word + I[k]]
+                elif r < 0.1:
+                    words = [B[k] + word, rng.choice(WORDS) + I[k]]
+                else:
+                    words = [word]
+                for w in words:
+                    f.write('{}\t{}\tNN\tB-NP\tO\n'.format(w, w))
+                    n += 1
+            f.write('\n')
+    return n
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tokens', type=int, default=1000000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        num_tokens = makeGeniaFile(os.path.join(tmp, 'train.genia.txt'), args.tokens)
+        size = os.path.getsize(os.path.join(tmp, 'train.genia.txt'))
+        print('合成 genia 文件：{} 个 token，{:.1f} MB'.format(num_tokens, size / 2 ** 20))
+
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.time()
+        conv.getLabel(tmp, label_array=True)
+        elapsed = time.time() - start
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    print('getLabel：{:.2f} s，{:.0f} tokens/s'.format(elapsed, num_tokens / elapsed))
+    print('内存峰值增长：{:.1f} MB'.format((rss_after - rss_before) / 1024))
+
+
+if __name__ == '__main__':
+    main()
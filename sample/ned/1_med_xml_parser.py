@@ -1,5 +1,7 @@
+import glob
 import pubmed_parser as pp
 from tqdm import tqdm
+from sample.utils.corpus_builder import buildCorpus
 
 '''
 从XML大文件中，抽取相应的摘要和题目
@@ -135,16 +137,20 @@ corpus_path2 = path_xml + '/' + 'corpus2.txt'
 '''
 将训练预料和测试预料加入到pubmed摘要中，用于训练词向量
 '''
-sen_list = []
-with open('/home/administrator/PycharmProjects/keras_bc6_track1/sample/data/train_raw.txt') as f:
-    for line in f:
-        sen_list.append(line)
-with open('/home/administrator/PycharmProjects/keras_bc6_track1/sample/data/test_raw.txt') as f:
-    for line in f:
-        sen_list.append(line)
-with open(corpus_path) as f:
-    for line in f:
-        sen_list.append(line)
-with open(corpus_path2, 'w') as f:
-    for line in sen_list:
-        f.write(line)
\ No newline at end of file
+# sen_list = []
+# with open('/home/administrator/PycharmProjects/keras_bc6_track1/sample/data/train_raw.txt') as f:
+#     for line in f:
+#         sen_list.append(line)
+# ...
+# with open(corpus_path2, 'w') as f:
+#     for line in sen_list:
+#         f.write(line)
+
+if __name__ == '__main__':
+    # 多进程并行解析 gzip 压缩的 MEDLINE 分片，去重后流式写入 corpus2/corpus.00000.txt, ...
+    # 最后追加 BC6 的原始语料，内存占用与 PubMed 的规模无关
+    medline_path = path_xml + '/' + 'medline'
+    xml_paths = sorted(glob.glob(medline_path + '/*.xml.gz')) + [infile]
+    raw_paths = ['/home/administrator/PycharmProjects/keras_bc6_track1/sample/data/train_raw.txt',
+                 '/home/administrator/PycharmProjects/keras_bc6_track1/sample/data/test_raw.txt']
+    buildCorpus(xml_paths, path_xml + '/' + 'corpus2', extra_paths=raw_paths)
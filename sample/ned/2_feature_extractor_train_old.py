@@ -13,6 +13,8 @@ from tqdm import tqdm
 import numpy as np
 from xml.dom.minidom import parse
 from sample.utils.helpers import postprocess, extract_id_from_res, extract_id_from_res2
+from sample.utils.embedding import EmbeddingStore, loadTxtEmbeddings
+from sample.utils.dataset import Dataset, ELMO_PAD
 import Levenshtein
 from collections import OrderedDict
 from bioservices import UniProt
@@ -57,15 +59,15 @@ def strippingAlgorithm(entity):
 def readSynVec(synsetsVec_path):
     '''
     读取AutoExtend训练得到的同义词集向量
+    第一次读取时转换为 EmbeddingStore（synsetsVec.npy + synsetsVec.vocab），之后直接 mmap 打开
+    :return: EmbeddingStore，支持 `id in store` 和 store.get(id)
     '''
-    proteinId2vec = {}
-    with open(synsetsVec_path, 'r') as f:
-        for line in f:
-            splited = line.strip('\n').split(' ')
-            proteinId = splited[0]
-            vec = np.asarray(splited[1:], dtype=np.float32)
-            proteinId2vec[proteinId] = vec
-    return proteinId2vec
+    store_path = os.path.splitext(synsetsVec_path)[0]
+    if not EmbeddingStore.exists(store_path) or \
+            os.path.getmtime(store_path + '.npy') < os.path.getmtime(synsetsVec_path):
+        index, matrix = loadTxtEmbeddings(synsetsVec_path, lower=False)
+        EmbeddingStore.save(store_path, matrix, list(index))
+    return EmbeddingStore.open(store_path)
 
 
 def getCSVData(csv_path, entity2id):
@@ -352,6 +354,24 @@ def get_train_out_data(path):
     return sen_list
 
 
+def contextIndex(x_sen, start, step):
+    '''
+    从 start 开始，按 step（1 或 -1）的方向取 context_window_size 个不是停用词的位置
+    超出句子的位置为 -1（补齐）
+    '''
+    index = []
+    i = start
+    while len(index) < context_window_size:
+        if 0 <= i < len(x_sen):
+            # 过滤停用词 stop_word
+            if x_sen[i] not in stop_word:
+                index.append(i)
+        else:
+            index.append(-1)
+        i += step
+    return index
+
+
 def get_x_y(entity, id, x_sen, x_data, pos_sen, position, res):
     '''
     获取实体的上下文及其对应的pos标记
@@ -360,49 +380,21 @@ def get_x_y(entity, id, x_sen, x_data, pos_sen, position, res):
     x_left, x_pos_left, x_right, x_pos_right, x_id, y, x_elmo_l, x_elmo_r = res
     x_id_one, labels = get_s_features(entity, id, entity2id)
 
-    # 获取左边的上下文
-    num = 0
-    end_l = position
-    elmo_sen_left = []
-    x_sen_left = []
-    pos_sen_left = []
-    while num<context_window_size:
-        end_l -= 1
-        if end_l>=0:
-            # 过滤停用词 stop_word
-            if x_sen[end_l] not in stop_word:
-                elmo_sen_left.append(x_data[end_l])
-                x_sen_left.append(x_sen[end_l])
-                pos_sen_left.append(pos_sen[end_l])
-                num+=1
-        else:
-            elmo_sen_left.append("__PAD__")
-            x_sen_left.append(0)
-            pos_sen_left.append(0)
-            num += 1
-    x_sen_left = x_sen_left[::-1]
-    pos_sen_left = pos_sen_left[::-1]
-
-    # 获取右边的上下文
-    num = 0
-    start_r = position + len(entity.split())
-    elmo_sen_right = []
-    x_sen_right = []
-    pos_sen_right = []
-    while num < context_window_size:
-        if start_r < len(x_sen):
-            # 过滤停用词 stop_word
-            if x_sen[start_r] not in stop_word:
-                elmo_sen_right.append(x_data[start_r])
-                x_sen_right.append(x_sen[start_r])
-                pos_sen_right.append(pos_sen[start_r])
-                num += 1
-        else:
-            elmo_sen_right.append("__PAD__")
-            x_sen_right.append(0)
-            pos_sen_right.append(0)
-            num += 1
-        start_r += 1
+    # 左右两边各取 context_window_size 个不是停用词的位置，超出句子的位置为 -1，
+    # 取到各数组最后补的一项：单词/POS 为 0，ELMo 为 ELMO_PAD（与 Dataset.word_array 相同）
+    left = contextIndex(x_sen, position - 1, -1)
+    right = contextIndex(x_sen, position + len(entity.split()), 1)
+    words = np.append(x_sen, 0)
+    tags = np.append(pos_sen, 0)
+    strings = np.array(list(x_data) + [ELMO_PAD], dtype=object)
+
+    # ELMo 的左侧上下文保持原来的顺序（离实体最近的在前），单词和 POS 按句子中的顺序
+    elmo_sen_left = strings[left].tolist()
+    x_sen_left = words[left[::-1]].tolist()
+    pos_sen_left = tags[left[::-1]].tolist()
+    elmo_sen_right = strings[right].tolist()
+    x_sen_right = words[right].tolist()
+    pos_sen_right = tags[right].tolist()
 
     assert len(x_sen_left)==len(x_sen_right)
 
@@ -558,19 +550,15 @@ if __name__ == '__main__':
         word_maxlen, sentence_maxlen = pkl.load(f)
 
     # 获取训练集和测试集的golden实体
-    with codecs.open('../data/train.pkl', "rb") as f:
-        train_x, train_elmo, train_y, train_char, train_cap, train_pos, train_chunk, train_dict = pkl.load(f)
-    train_label_list = []
-    for y in train_y:
-        y = np.array(y).argmax(axis=-1)
-        train_label_list.append(y)
-
-    with codecs.open('../data/test.pkl', "rb") as f:
-        test_x, test_elmo, test_y, test_char, test_cap, test_pos, test_chunk, test_dict = pkl.load(f)
-    test_label_list = []
-    for y in test_y:
-        y = np.array(y).argmax(axis=-1)
-        test_label_list.append(y)
+    # 只读取用到的列：单词编号、标签（label2idx 中的小整数）和 POS
+    # 数据集中保存的是完整的句子，截断到 sentence_maxlen 与原始数据一致
+    train_set = Dataset.open('../data/train_dataset')
+    train_x, train_pos = train_set.sentences('words', maxlen=sentence_maxlen), train_set.sentences('pos', maxlen=sentence_maxlen)
+    train_label_list = train_set.sentences('labels', maxlen=sentence_maxlen)
+
+    test_set = Dataset.open('../data/test_dataset')
+    test_x, test_pos = test_set.sentences('words', maxlen=sentence_maxlen), test_set.sentences('pos', maxlen=sentence_maxlen)
+    test_label_list = test_set.sentences('labels', maxlen=sentence_maxlen)
 
     # idx2pos = {}
     # with open('/home/administrator/PycharmProjects/keras_bc6_track1/sample/data/pos2idx.txt') as f:
@@ -38,6 +38,7 @@ import tensorflow as tf
 from keras.backend.tensorflow_backend import set_session
 import importlib
 m=importlib.import_module("sample.4_test_nnet")
+from sample.utils.embedding import EmbeddingStore
 import keras.backend as K
 
 # set GPU memory
@@ -540,8 +541,7 @@ if __name__ == '__main__':
 
     rootCorpus = r'data'
     embeddingPath = r'/home/administrator/PycharmProjects/embedding'
-    with open(embeddingPath + '/emb.pkl', "rb") as f:
-        embedding_matrix = pkl.load(f)
+    embedding_matrix = EmbeddingStore.open(embeddingPath + '/emb').matrix
 
     with open('data/data_train2.pkl', "rb") as f:
         x_left, x_pos_left, x_right, x_pos_right, y, x_elmo_l, x_elmo_r = pkl.load(f)
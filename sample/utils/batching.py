@@ -0,0 +1,167 @@
+'''
+    按句子长度分桶的 batch 生成，每个 batch 只补齐到本 batch 中最长的句子
+
+    句子按长度排序后每 batch_size 个分为一个 batch，batch 内的长度相近，补齐的位置很少
+    补齐的位置单词编号为 0，由 Embedding(mask_zero=True) 产生的 mask 传递给 ChainCRF，
+    ChainCRF 的损失和 Viterbi 解码都会忽略这些位置，因此不同 batch 的长度可以不同
+    （模型的输入须为 Input(shape=(None, ...))，即不固定句子长度）
+
+    超过 maxlen_s 的句子从尾部截断（与字符特征一致，保留句首的 token）
+    预测结果由 restore() 按原来的句子顺序还原，并去掉补齐的部分
+
+    滑动窗口（window 不为 None，预测用）：不截断句子，超过 window 的句子切分为相互重叠 overlap 个 token 的窗口，
+    最后一个窗口与句尾对齐；窗口和短句子一样参与分桶。restore() 把各窗口的 CRF 输出拼接回整个句子：
+    相邻两个窗口的重叠部分以其中点为界，前一半取前一个窗口的结果，后一半取后一个窗口的结果
+    （每个 token 都取自离窗口边缘较远、上下文较完整的窗口），结果与 batch 的划分和顺序无关
+'''
+import numpy as np
+from keras.utils import Sequence
+from sample.utils.dataset import ELMO_PAD
+
+# 模型的输入顺序，与 4_test_nnet.getTestData 一致
+FEATURES = ['words', 'chars', 'cap', 'pos', 'chunk', 'dict', 'elmo']
+
+
+class BucketedSequence(Sequence):
+    '''
+    :param dataset: sample.utils.dataset.Dataset
+    :param maxlen_s: 句子截断长度，默认为数据集的 maxlen_s
+    :param num_classes: 不为 None 时同时返回 one-hot 标签（训练用），在取 batch 时才展开
+    :param shuffle: 每个 epoch 结束后打乱 batch 的顺序（batch 内的句子不变）
+    :param pad_multiple: batch 的长度向上取整到它的倍数，减少不同形状的个数
+    :param fixed_len: 不为 None 时不分桶，按原顺序切分，所有 batch 都补齐到 fixed_len（对照用）
+    :param indices: 只取其中的句子（如预测缓存中缺少的句子），默认为全部
+    :param pad_batches: 最后一个不满 batch_size 的 batch 用全 0（被 mask）的句子补满，
+                        使所有 batch 的形状相同（固定形状的计算图可以复用）；补的句子在 restore 中去掉
+    :param window: 滑动窗口的长度，不为 None 时不截断句子（不超过 fixed_len）
+    :param overlap: 相邻窗口重叠的 token 数，须小于 window
+    '''
+
+    def __init__(self, dataset, batch_size=32, maxlen_s=None, features=FEATURES, num_classes=None,
+                 shuffle=False, pad_multiple=8, fixed_len=None, seed=1337, indices=None, pad_batches=False,
+                 window=None, overlap=32):
+        if window is not None and not 0 <= overlap < window <= (fixed_len or window):
+            raise ValueError('窗口长度 {} 与重叠长度 {} 不合法'.format(window, overlap))
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.maxlen_s = window or fixed_len or maxlen_s or dataset.maxlen_s
+        self.features = features
+        self.num_classes = num_classes
+        self.shuffle = shuffle
+        self.pad_multiple = pad_multiple
+        self.fixed_len = fixed_len
+        self.pad_batches = pad_batches
+        self.window = window
+        self.overlap = overlap
+        self.rng = np.random.RandomState(seed)
+
+        self.offsets = np.asarray(dataset.column('offsets'))
+        self.lengths = np.diff(self.offsets)
+        if window is None:
+            self.lengths = np.minimum(self.lengths, self.maxlen_s)
+        self.indices = np.arange(len(self.lengths)) if indices is None else np.asarray(indices, dtype=np.int64)
+
+        # 送入模型的单位：不分窗口时即句子；unit_sen/unit_start/unit_len 为所属的句子、起始位置和长度
+        if window is None:
+            self.unit_sen = self.indices
+            self.unit_start = np.zeros(len(self.indices), dtype=np.int64)
+            self.unit_len = self.lengths[self.indices]
+        else:
+            self.unit_sen, self.unit_start, self.unit_len = makeWindows(self.lengths[self.indices], window, overlap)
+            self.unit_sen = self.indices[self.unit_sen]
+        order = np.arange(len(self.unit_sen))
+        if not fixed_len:
+            order = order[np.argsort(self.unit_len, kind='mergesort')]     # 稳定排序，结果可复现
+        self.batches = [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+    def __len__(self):
+        return len(self.batches)
+
+    def batchLen(self, units):
+        if self.fixed_len:
+            return self.fixed_len
+        n = int(self.unit_len[units].max())
+        n = -(-n // self.pad_multiple) * self.pad_multiple
+        return max(2, min(n, self.maxlen_s))    # ChainCRF 要求至少 2 个时间步
+
+    def __getitem__(self, i):
+        units = self.batches[i]
+        n = self.batchLen(units)
+        indices, starts = self.unit_sen[units], self.unit_start[units]
+        inputs = self.dataset.batch(indices, n, self.features, starts)
+        if self.pad_batches and len(units) < self.batch_size:
+            inputs = [self._padRows(x) for x in inputs]
+
+        if self.num_classes is None:
+            return inputs
+        labels, = self.dataset.batch(indices, n, ['labels'], starts)   # 补齐的位置为 0，即 'O'
+        if self.pad_batches and len(units) < self.batch_size:
+            labels = self._padRows(labels)
+        y = np.eye(self.num_classes, dtype=np.float32)[labels]
+        return inputs, y
+
+    def _padRows(self, x):
+        pad = np.full((self.batch_size - len(x),) + x.shape[1:], ELMO_PAD if x.dtype == object else 0, dtype=x.dtype)
+        return np.concatenate([x, pad])
+
+    def on_epoch_end(self):
+        if self.shuffle:
+            self.rng.shuffle(self.batches)
+
+    def restore(self, outputs):
+        '''
+        :param outputs: 与 batches 一一对应的预测结果，每个为 [batch 大小, batch 长度, ...]
+        :return: 按原句子顺序排列的列表，每个句子只保留前 min(句子长度, maxlen_s) 个位置
+                 （滑动窗口时为整个句子）；不在 indices 中的句子为 None
+        '''
+        assert len(outputs) == len(self.batches)
+        pieces = [None] * len(self.unit_sen)
+        for units, output in zip(self.batches, outputs):
+            assert len(output) >= len(units)     # 多出的为补满 batch 的句子
+            for k, u in enumerate(units.tolist()):
+                pieces[u] = output[k, :self.unit_len[u]]
+
+        result = [None] * len(self.lengths)
+        if self.window is None:
+            for u, idx in enumerate(self.unit_sen.tolist()):
+                result[idx] = pieces[u]
+            return result
+        # 同一句子的窗口在 unit 中相邻且按起始位置排列，相邻窗口在重叠部分的中点处拼接
+        bounds = np.flatnonzero(np.diff(self.unit_sen)) + 1
+        for group in np.split(np.arange(len(self.unit_sen)), bounds):
+            if len(group) == 1:
+                result[self.unit_sen[group[0]]] = pieces[group[0]]
+                continue
+            starts = self.unit_start[group]
+            ends = starts + self.unit_len[group]
+            cuts = np.concatenate([[0], (starts[1:] + ends[:-1]) // 2, [ends[-1]]])
+            result[self.unit_sen[group[0]]] = np.concatenate([
+                pieces[u][a - s:b - s] for u, s, a, b in zip(group.tolist(), starts, cuts[:-1], cuts[1:])])
+        return result
+
+
+def predictBucketed(model, sequence):
+    '''
+    逐 batch 预测（各 batch 的长度不同，不能用 predict_generator 拼接），再还原句子顺序
+    :return: 每个句子一个标签编号数组
+    '''
+    outputs = [model.predict_on_batch(sequence[i]).argmax(axis=-1) for i in range(len(sequence))]
+    result = sequence.restore(outputs)
+    num_predicted = sum(y is not None for y in result)
+    if num_predicted != len(sequence.indices):
+        raise RuntimeError('预测结果个数 {} 与句子个数 {} 不一致'.format(num_predicted, len(sequence.indices)))
+    return result
+
+
+def makeWindows(lengths, window, overlap):
+    '''
+    将句子切分为长度不超过 window、相邻重叠 overlap 个 token 的窗口，最后一个窗口与句尾对齐
+    :return: (sen, start, length)  每个窗口所属句子在 lengths 中的下标、起始位置和长度，按句子和起始位置排列
+    '''
+    lengths = np.asarray(lengths, dtype=np.int64)
+    stride = window - overlap
+    num = 1 + np.maximum(0, -(-(lengths - window) // stride))
+    sen = np.repeat(np.arange(len(lengths)), num)
+    k = np.arange(num.sum()) - np.repeat(np.cumsum(num) - num, num)     # 句子中的第几个窗口
+    start = np.minimum(k * stride, np.maximum(lengths[sen] - window, 0))
+    return sen, start, np.minimum(lengths[sen] - start, window)
@@ -0,0 +1,180 @@
+'''
+    BioC(XML) -> 标记实体后的句子，1_xml2conll_offset.py 和 1_xml2conll_offset.test.py 共用
+
+    1、通过offset，将句子中所有的实体用一对标签 <B^>entity<^I> 进行标记
+       注意：offset 是在二进制编码下索引的，要对句子进行编码 s=s.encode(‘utf-8’)
+    2、对于嵌套实体（offset 相同），仅保留其中长度较长的实体
+    3、对句子中的标点符号  !\”#$%‘()*+,-./:;<=>?@[\\]_`{|}~ 进行切分；^ 保留用于实体标签！！
+'''
+import os
+from multiprocessing import Pool
+from tqdm import tqdm
+from sample.utils.bioc_reader import iterBioC
+from sample.utils.entity_tagger import resolveNested, tagEntities
+from sample.utils.helpers import splitPunctuation
+from sample.utils.manifest import Manifest, fileHash
+
+B_tag = ['B‐^', 'B‐^^']   # '‐' != '-'
+I_tag = ['^‐I', '^^‐I']
+MANIFEST_VERSION = 1      # 修改转换逻辑后需递增，使上次的增量结果作废
+
+
+def xx(entity):
+    if entity.startswith('NCBI gene:') or entity.startswith('Uniprot:') or \
+    entity.startswith('gene:') or entity.startswith('protein:'):
+        return True
+    else:
+        return False
+
+
+def convertPassage(passage):
+    '''
+    对单个 passage 中的实体进行标记
+    :return: 标记后的句子, gene/protein的ID列表, [proID, pro类型, geneID, gene类型]实体个数
+    '''
+    num_annotations_pro = 0
+    num_entitytype_pro = 0
+    num_annotations_gene = 0
+    num_entitytype_gene = 0
+    sentence_byte = passage.text  # byte
+    records = []    # (start, end, ID, entity)
+
+    for annotation in passage.annotations:
+        ID = annotation.type
+        offset = annotation.offset
+        length = annotation.length
+        entity = annotation.text
+        assert len(sentence_byte[offset:offset+length].decode('utf-8'))==len(entity) 
+        records.append((offset, offset + length, ID, entity))
+
+    # 针对实体嵌套的情况
+    # 即两个实体的start/end相同，保留其中的蛋白质或基因实体，否则保留其中长度较长的实体
+    records = resolveNested(records, prefer=xx)
+
+    # 根据offset的大小对数组进行逆序排序
+    records.sort(key=lambda x:x[0], reverse=True)
+
+    # 用一对标签 <B^>entity<^I> 包裹筛选后的所有实体
+    spans = []
+    id_list_only = []   # 仅保留gene or protein的ID
+    for start, end, ID, entity in records:
+        if ID.startswith('Uniprot:') or ID.startswith('protein:'):
+            if ID.startswith('Uniprot:'):
+                num_annotations_pro+=1
+            elif ID.startswith('protein:'):
+                num_entitytype_pro+=1
+            id_list_only.append(ID.strip('\n').strip())
+            spans.append((start, end - start, 0))
+        elif ID.startswith('NCBI gene:') or ID.startswith('gene:'):
+            if ID.startswith('NCBI gene:'):
+                num_annotations_gene+=1
+            elif ID.startswith('gene:'):
+                num_entitytype_gene+=1
+            id_list_only.append(ID.strip('\n').strip())
+            spans.append((start, end - start, 1))
+        else:
+            # 暂时不考虑其他类别的实体
+            continue
+    if not id_list_only:
+        id_list_only.append('') # 不包含实体也要占位
+
+    # 按 offset 一次线性扫描完成标记
+    tmp = tagEntities(sentence_byte, spans, B_tag, I_tag)
+
+    # 对标点符号进行切分，但保留 ^ 用作标记识别符
+    tmp = splitPunctuation(tmp)
+    if '' in tmp.split():
+        print('tmp中存在空字符error\n')
+
+    return tmp, id_list_only, [num_annotations_pro, num_entitytype_pro, num_annotations_gene, num_entitytype_gene]
+
+
+def convertFile(f):
+    '''
+    转换单个 BioC 文件，作为进程池中的一个任务
+    :return: 文件中每个 passage 的 (原始句子, 标记后的句子, ID列表, 实体个数)
+    '''
+    results = []
+    for passage in iterBioC(f):    # 流式读取 XML 文档中的所有 passage
+        sentence_str = passage.text.decode("utf-8")  # str
+        results.append((sentence_str,) + convertPassage(passage))
+    return results
+
+
+def readXML(files, BioC_PATH, out_path, name, skip_passages=(), processes=1, incremental=False):
+    '''
+    将 BioC_PATH 下的 files 转换为 out_path 下的 <name>.txt、<name>_goldenID.txt 和 <name>_raw.txt
+    :param skip_passages: 按全局序号(从1开始)跳过的 passage
+
+    processes>1 时将文件分片到进程池中并行转换；
+    各文件的结果按文件名排序后的顺序合并写出，与串行转换的输出逐字节一致
+
+    incremental=True 时根据 manifest.json 只转换新增或修改过的文件，
+    未修改文件的结果直接从上次的输出中拷贝，输出与完整转换逐字节一致
+    '''
+    num_sentence = 0
+    num_annotations = [0, 0, 0, 0]
+    paths = [BioC_PATH + "/" + file for file in sorted(files) if not os.path.isdir(file)]  #不是文件夹才打开
+    outputs = [out_path + "/" + name + suffix for suffix in ['.txt', '_goldenID.txt', '_raw.txt']]
+
+    manifest = Manifest(out_path + "/" + 'manifest.json', outputs, MANIFEST_VERSION)
+    hashes = {path: fileHash(path) for path in paths}
+    if incremental:
+        todo = [path for path in paths if manifest.lookup(path, hashes[path]) is None]
+    else:
+        todo = paths
+    print('需要转换的文件：{}/{}'.format(len(todo), len(paths)))
+
+    pool = None
+    if processes > 1 and len(todo) > 1:
+        pool = Pool(processes)
+        results = pool.imap(convertFile, todo)  # imap 按 todo 的顺序返回各文件的结果
+    else:
+        results = map(convertFile, todo)
+    todo = set(todo)
+
+    manifest.begin()
+    with open(outputs[0], 'wb') as f_txt, open(outputs[1], 'wb') as f_id, open(outputs[2], 'wb') as f_raw:
+        fouts = [f_txt, f_id, f_raw]
+        for path in tqdm(paths):
+            entry = manifest.lookup(path, hashes[path]) if path not in todo else None
+            if entry is not None:
+                # 跳过的 passage 按全局序号确定，前面的文件变化后可能落到本文件中
+                skipped = [k for k in range(entry['passages']) if num_sentence + k + 1 in skip_passages]
+                if skipped != entry['skipped']:
+                    entry = None
+            if entry is not None:
+                entry = dict(entry, spans=manifest.copy(entry, fouts))
+                num_sentence += entry['passages']
+                num_annotations = [a + b for a, b in zip(num_annotations, entry['counts'])]
+                manifest.record(path, entry)
+                continue
+
+            result = next(results) if path in todo else convertFile(path)
+            starts = [f.tell() for f in fouts]
+            skipped = []
+            counts = [0, 0, 0, 0]
+            for k, (sentence_str, tmp, id_list_only, passage_counts) in enumerate(result):
+                f_raw.write((sentence_str + '\n').encode('utf-8'))
+                num_sentence += 1
+                if num_sentence in skip_passages:
+                    skipped.append(k)
+                    continue    # golden 标签好像有错
+                f_txt.write((tmp + '\n').encode('utf-8'))
+                f_id.write(('\t'.join(id_list_only) + '\n').encode('utf-8'))
+                counts = [a + b for a, b in zip(counts, passage_counts)]
+            num_annotations = [a + b for a, b in zip(num_annotations, counts)]
+            manifest.record(path, {'hash': hashes[path], 'passages': len(result), 'skipped': skipped,
+                                   'counts': counts,
+                                   'spans': [[s, f.tell() - s] for s, f in zip(starts, fouts)]})
+    manifest.commit()
+
+    if pool is not None:
+        pool.close()
+        pool.join()
+
+    print('标注proID的实体的个数：{}'.format((num_annotations[0])))
+    print('标注pro类型的实体的个数：{}'.format((num_annotations[1])))
+    print('标注geneID的实体的个数：{}'.format((num_annotations[2])))
+    print('标注gene类型的实体的个数：{}'.format((num_annotations[3])))
+    print('passage 总数： {}'.format(num_sentence)) # 13697
@@ -0,0 +1,80 @@
+'''
+    BioC(XML) 流式读取
+
+    使用 iterparse 增量解析 caption_bioc 文件，逐个 document 解析后立即释放对应的元素，
+    避免 minidom 将整棵 DOM 树保留在内存中，内存占用与文件大小无关。
+'''
+from collections import namedtuple
+
+try:
+    import xml.etree.cElementTree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
+
+
+# text 为 utf-8 编码后的 bytes，annotation 的 offset 即是在 bytes 下索引的
+BioCPassage = namedtuple('BioCPassage', ['doc_id', 'offset', 'text', 'annotations'])
+# type 为 annotation 的第一个 infon，如 'Uniprot:P17046'
+BioCAnnotation = namedtuple('BioCAnnotation', ['type', 'offset', 'length', 'text'])
+# infons 为 document 的 [(key, value), ...]，保持原文件中的顺序
+BioCDocument = namedtuple('BioCDocument', ['id', 'infons', 'passages'])
+
+
+def _parseAnnotation(elem):
+    location = elem.find('location')
+    return BioCAnnotation(elem.findtext('infon', ''),
+                          int(location.get('offset')),
+                          int(location.get('length')),
+                          elem.findtext('text', ''))
+
+
+def _parseDocument(elem):
+    doc_id = elem.findtext('id', '')
+    infons = [(infon.get('key'), infon.text or '') for infon in elem.findall('infon')]
+    passages = []
+    for passage in elem.iterfind('passage'):
+        text = (passage.findtext('text') or '').encode('utf-8')
+        annotations = [_parseAnnotation(a) for a in passage.iterfind('annotation')]
+        passages.append(BioCPassage(doc_id, int(passage.findtext('offset', '0')), text, annotations))
+    return BioCDocument(doc_id, infons, passages)
+
+
+def readBioCHeader(path):
+    '''
+    读取 collection 的 source/date/key，遇到第一个 document 即停止解析
+    '''
+    header = {}
+    depth = 0
+    for event, elem in ET.iterparse(path, events=('start', 'end')):
+        if event == 'start':
+            depth += 1
+            if elem.tag == 'document':
+                break
+        else:
+            depth -= 1
+            if depth == 1 and elem.tag in ('source', 'date', 'key'):
+                header[elem.tag] = elem.text or ''
+    return header
+
+
+def iterBioCDocuments(path):
+    '''
+    逐个 document 解析 BioC 文件
+    每解析完一个 document 就清空根元素，已处理的元素随即被释放
+    '''
+    context = ET.iterparse(path, events=('start', 'end'))
+    _, root = next(context)
+    for event, elem in context:
+        if event == 'end' and elem.tag == 'document':
+            document = _parseDocument(elem)
+            root.clear()    # 非常关键：丢弃已解析的 document，释放内存
+            yield document
+
+
+def iterBioC(path):
+    '''
+    以生成器的形式返回 BioC 文件中的所有 passage 记录 (doc_id, offset, text, annotations)
+    '''
+    for document in iterBioCDocuments(path):
+        for passage in document.passages:
+            yield passage
@@ -0,0 +1,262 @@
+'''
+    列式读取 *.final.txt（word  POS  chunk  dict  label，句子之间以空行分隔）
+
+    所有句子的 token 特征拼接为一维整数数组，offsets[i]:offsets[i+1] 为第 i 个句子的 token；
+    标签直接存为 label2idx 中的小整数（不再展开为 one-hot），
+    下游按句子切片得到的都是数组的视图，不需要复制
+
+    字符特征不逐个 token 计算：先对单词表中的每个词用 256 项的查找表（按字节）得到字符编号，
+    再按 words 列一次性 gather 到 (句子数, maxlen_s, maxlen_w) 的 int16 张量中
+
+    单词的清洗和大小写特征由 TokenFeaturizer 按原始单词缓存，每个不同的单词只计算一次
+'''
+from array import array
+from collections import OrderedDict
+import numpy as np
+from sample.utils.helpers import wordNormalize
+
+# 列名 -> (array 的类型码, numpy 类型)
+COLUMNS = [('words', 'i', np.int32), ('cap', 'b', np.int8), ('pos', 'h', np.int16),
+           ('chunk', 'h', np.int16), ('dict', 'b', np.int8), ('labels', 'b', np.int8)]
+
+
+def charLUT(char2idx):
+    '''
+    字节 -> 字符编号 的查找表，未收录的字符为 '**'
+    wordNormalize 已将非 printable 的字符替换为 '*'，清洗后的单词都是 ASCII
+    '''
+    lut = np.full(256, char2idx['**'], dtype=np.int16)
+    for char, idx in char2idx.items():
+        if len(char) == 1 and ord(char) < 256 and idx:
+            lut[ord(char)] = idx
+    return lut
+
+
+class TokenFeaturizer(object):
+    '''
+    原始单词 -> (清洗后的单词, 大小写特征编号, 字符编号数组)
+    按原始单词缓存（LRU），超过 maxsize 时淘汰最久未使用的；预处理和在线预测共用
+    :param maxlen_w: 字符编号数组的截断长度，None 表示不截断
+    :param chars: 为 False 时不计算字符编号（返回 None），只缓存单词和大小写特征；
+                  预处理时字符特征由 ConllVocab.charTable 对单词表统一计算
+    '''
+
+    def __init__(self, casing, casing_vocab, char2idx, maxlen_w=None, maxsize=1 << 18, chars=True):
+        self.casing = casing
+        self.casing_vocab = casing_vocab
+        self.lut = charLUT(char2idx)
+        self.maxlen_w = maxlen_w
+        self.chars = chars
+        self.maxsize = maxsize
+        self.cache = OrderedDict()
+        self.num_hit = 0
+        self.num_miss = 0
+        self.num_evict = 0
+
+    def __call__(self, word):
+        entry = self.cache.get(word)
+        if entry is not None:
+            self.num_hit += 1
+            self.cache.move_to_end(word)
+            return entry
+
+        self.num_miss += 1
+        normalized = wordNormalize(word)
+        chars = None
+        if self.chars:
+            chars = self.lut[np.frombuffer(normalized.encode('utf-8'), dtype=np.uint8)[:self.maxlen_w]]
+        entry = self.cache[word] = (normalized, self.casing_vocab[self.casing(word)], chars)
+        if len(self.cache) > self.maxsize:
+            self.cache.popitem(last=False)
+            self.num_evict += 1
+        return entry
+
+    def featurize(self, tokens):
+        '''
+        :return: (清洗后的单词列表, 大小写特征 int8 [len], 字符编号 int16 [len, maxlen_w])
+        '''
+        if not self.chars:
+            raise ValueError('TokenFeaturizer(chars=False) 不计算字符特征')
+        entries = [self(word) for word in tokens]
+        cap = np.array([e[1] for e in entries], dtype=np.int8)
+        chars = np.zeros((len(entries), self.maxlen_w or max([len(e[2]) for e in entries] + [1])), dtype=np.int16)
+        for i, e in enumerate(entries):
+            chars[i, :len(e[2])] = e[2]
+        return [e[0] for e in entries], cap, chars
+
+    def __str__(self):
+        total = self.num_hit + self.num_miss
+        return '单词特征缓存：{} 个单词，命中 {}/{}（{:.1%}），淘汰 {}'.format(
+            len(self.cache), self.num_hit, total, self.num_hit / max(total, 1), self.num_evict)
+
+
+class ConllVocab(object):
+    '''
+    各列的词典，在 train/test 之间共享；单词表、pos2idx、chunk2idx 在读取过程中增长
+    单词表按单词第一次出现的顺序编号（从 0 开始），words 列中存的即是这个编号
+    '''
+
+    def __init__(self, char2idx, casing, casing_vocab, pos2idx, chunk2idx, dict2idx, label2idx):
+        self.char2idx = char2idx
+        self.casing = casing
+        self.casing_vocab = casing_vocab
+        self.pos2idx = pos2idx
+        self.chunk2idx = chunk2idx
+        self.dict2idx = dict2idx
+        self.label2idx = label2idx
+        self.featurizer = TokenFeaturizer(casing, casing_vocab, char2idx, chars=False)   # 字符特征见 charTable
+        self.word_list = []
+        self.word2id = {}
+        self.chars_not_exit = set()     # 统计未登录字符
+        self.word_len_list = [0]  # 用于统计单词长度
+        self.sen_len_list = [0]  # 用于统计句子长度
+
+    def wordId(self, word):
+        i = self.word2id.get(word)
+        if i is None:
+            i = self.word2id[word] = len(self.word_list)
+            self.word_list.append(word)
+        return i
+
+    def charTable(self, maxlen_w):
+        '''
+        单词表中每个词的字符编号，超过 maxlen_w 的截断，不足的补 0
+        :return: int16 [len(word_list), maxlen_w]
+        '''
+        encoded = [word.encode('utf-8') for word in self.word_list]
+        lens = np.array([len(b) for b in encoded], dtype=np.int64)
+        ids = charLUT(self.char2idx)[np.frombuffer(b''.join(encoded), dtype=np.uint8)]
+        row = np.repeat(np.arange(len(encoded)), lens)
+        col = np.arange(len(ids)) - np.repeat(np.cumsum(lens) - lens, lens)
+        keep = col < maxlen_w
+        table = np.zeros((len(encoded), maxlen_w), dtype=np.int16)
+        table[row[keep], col[keep]] = ids[keep]
+
+        self.chars_not_exit.update(set(''.join(self.word_list)) - set(self.char2idx))
+        return table
+
+
+class ConllCorpus(object):
+    '''
+    :param columns: 列名 -> token 级的一维数组
+    :param offsets: 句子的起始位置，长度为句子数 + 1
+    :param lengths: 截断前的句子长度
+    '''
+
+    def __init__(self, columns, offsets, lengths):
+        self.columns = columns
+        self.offsets = offsets
+        self.lengths = lengths
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def sentence(self, name, i):
+        return self.columns[name][self.offsets[i]:self.offsets[i + 1]]
+
+    def split(self, col):
+        '''
+        将 token 级的一维数组按句子切分，每个句子一个数组视图
+        '''
+        bounds = self.offsets.tolist()
+        return [col[a:b] for a, b in zip(bounds, bounds[1:])]
+
+    def sentences(self, name):
+        return self.split(self.columns[name])
+
+    def charTensor(self, char_table, maxlen_s, out=None):
+        '''
+        字符特征张量，超过 maxlen_s 的句子被截断，补齐部分为 0
+        :param char_table: ConllVocab.charTable(maxlen_w)
+        :param out: 预先分配的 (句子数, maxlen_s, maxlen_w) 数组（可以是 np.memmap），须已填 0
+        :return: int16 [句子数, maxlen_s, maxlen_w]
+        '''
+        return scatterSentences(self.offsets, char_table[self.columns['words']], maxlen_s, out)
+
+    def tokens(self, i, vocab):
+        '''
+        :return: 第 i 个句子清洗后的单词
+        '''
+        return [vocab.word_list[k] for k in self.sentence('words', i).tolist()]
+
+
+def scatterSentences(offsets, values, maxlen_s, out=None):
+    '''
+    将 token 级的 values（第一维为 token）按句子放入 [句子数, maxlen_s, ...] 的数组，
+    超过 maxlen_s 的句子从尾部截断，补齐部分为 0
+    :param offsets: 句子的起始位置，从 0 开始
+    :param out: 预先分配并已填 0 的数组（可以是 np.memmap）
+    '''
+    num = len(offsets) - 1
+    if out is None:
+        out = np.zeros((num, maxlen_s) + values.shape[1:], dtype=values.dtype)
+    lens = np.diff(offsets)
+    sen = np.repeat(np.arange(num), lens)
+    pos = np.arange(offsets[-1] - offsets[0]) - np.repeat(offsets[:-1] - offsets[0], lens)
+    keep = pos < maxlen_s
+    out[sen[keep], pos[keep]] = values[keep]
+    return out
+
+
+def gatherSentences(offsets, indices, maxlen, starts=None):
+    '''
+    取出 indices 中的句子（每个最多 maxlen 个 token）
+    :param starts: 每个句子从第几个 token 开始取（滑动窗口），默认为句首
+    :return: (row, col, tok)  第 row 个句子的第 col 个位置对应 token 级数组中的第 tok 个
+    '''
+    starts = np.asarray(offsets[indices]) + (0 if starts is None else np.asarray(starts))
+    lens = np.minimum(np.asarray(offsets[indices + 1]) - starts, maxlen)
+    row = np.repeat(np.arange(len(indices)), lens)
+    col = np.arange(lens.sum()) - np.repeat(np.cumsum(lens) - lens, lens)
+    return row, col, np.repeat(starts, lens) + col
+
+
+def readConll(path, vocab, maxlen_s):
+    '''
+    读取一个 *.final.txt，超过 maxlen_s 的句子被截断（为 None 时保留整个句子）
+    '''
+    cols = {name: array(code) for name, code, _ in COLUMNS}
+    offsets = array('q', [0])
+    lengths = array('i')
+    sen = {name: [] for name, _, _ in COLUMNS}
+    featurizer = vocab.featurizer
+
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line == '\n':
+                nb_word = len(sen['words'])
+                lengths.append(nb_word)
+                if nb_word > vocab.sen_len_list[-1]:
+                    vocab.sen_len_list.append(nb_word)
+                for name, _, _ in COLUMNS:
+                    cols[name].extend(sen[name][:maxlen_s])
+                    sen[name] = []
+                offsets.append(len(cols['words']))
+            else:
+                token = line.replace('\n', '').split('\t')
+                word = token[0]
+                pos = token[1]
+                chunk = token[2]
+                dict = token[3]
+                label = token[-1]
+
+                # 获取pos和chunk字典
+                if not pos in vocab.pos2idx:
+                    vocab.pos2idx[pos] = len(vocab.pos2idx)
+                if not chunk in vocab.chunk2idx:
+                    vocab.chunk2idx[chunk] = len(vocab.chunk2idx)
+                # 清洗后的单词和大小写特征（按原始单词缓存）
+                word, cap, _ = featurizer(word)
+                sen['cap'].append(cap)
+                if len(word) > vocab.word_len_list[-1]:
+                    vocab.word_len_list.append(len(word))
+
+                sen['words'].append(vocab.wordId(word))
+                sen['pos'].append(vocab.pos2idx[pos])
+                sen['chunk'].append(vocab.chunk2idx[chunk])
+                sen['dict'].append(vocab.dict2idx[dict])
+                sen['labels'].append(vocab.label2idx.get(label, vocab.label2idx['O']))
+
+    print(featurizer)
+    columns = {name: np.frombuffer(cols[name], dtype=dtype) for name, _, dtype in COLUMNS}
+    return ConllCorpus(columns, np.frombuffer(offsets, dtype=np.int64), np.frombuffer(lengths, dtype=np.int32))
@@ -0,0 +1,223 @@
+'''
+    训练词向量用的 PubMed 语料构建
+
+    1、每个 MEDLINE XML 分片（可为 .xml.gz）由一个工作进程用 iterparse 流式解析，
+       抽取每篇文章的标题和摘要，解析完一篇即 clear()，逐行写入该分片的临时文件，内存占用与分片大小无关
+    2、主进程按分片顺序逐行读取临时文件合并：按每行文本的 hash 去重后，依次写入大小有上限的输出分片；
+       同时在处理中的分片最多 max_pending 个，已解析但未合并的临时文件不会无限堆积
+    3、最后逐行追加 BC6 的原始语料（train_raw.txt / test_raw.txt）
+    全程不把任何一个文件整体读入内存
+
+    去重用固定大小的 BloomFilter（默认 2^31 位，即 256 MB），内存与语料的行数无关；
+    代价是少量没出现过的行被误判为重复而丢掉（6000 万个不同的行时约 5e-6），重复的行一定会被去掉
+'''
+import os
+import gzip
+import shutil
+import hashlib
+import tempfile
+from collections import deque
+from multiprocessing import Pool
+import numpy as np
+
+try:
+    import xml.etree.cElementTree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
+
+
+def lineHash(line):
+    '''
+    16 字节的 hash，拆为两个 64 位整数 (h1, h2)，供 BloomFilter 生成各个位置
+    '''
+    digest = hashlib.blake2b(line.encode('utf-8'), digest_size=16).digest()
+    return int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little')
+
+
+class BloomFilter(object):
+    '''
+    固定大小的 Bloom filter，内存为 num_bits / 8 字节
+    第 i 个位置为 (h1 + i * h2) mod num_bits（double hashing）；
+    加入 n 个不同的元素后，误判的概率约为 (1 - exp(-num_hashes * n / num_bits)) ^ num_hashes
+    '''
+
+    def __init__(self, num_bits=1 << 31, num_hashes=7):
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.bits = np.zeros((num_bits + 7) // 8, dtype=np.uint8)
+        self.num_added = 0
+
+    def add(self, hashes):
+        '''
+        按顺序加入一批元素
+        :param hashes: [(h1, h2), ...]，即 lineHash 的结果
+        :return: bool 数组，各元素加入前是否不在集合中（同一批中重复的只有第一个为 True）
+        '''
+        hashes = np.array(hashes, dtype=np.uint64).reshape(-1, 2)
+        first = np.zeros(len(hashes), dtype=bool)
+        first[np.unique(hashes, axis=0, return_index=True)[1]] = True
+
+        i = np.arange(self.num_hashes, dtype=np.uint64)
+        pos = (hashes[:, :1] + i * (hashes[:, 1:] | np.uint64(1))) % np.uint64(self.num_bits)   # 溢出即 mod 2^64
+        byte, bit = pos >> np.uint64(3), (pos & np.uint64(7)).astype(np.uint8)
+        present = ((self.bits[byte] >> bit) & 1).all(axis=1)
+
+        new = first & ~present
+        np.bitwise_or.at(self.bits, byte[new].ravel(), np.left_shift(1, bit[new].ravel()).astype(np.uint8))
+        self.num_added += int(new.sum())
+        return new
+
+
+def _text(elem):
+    return ' '.join(''.join(elem.itertext()).split())
+
+
+def iterMedline(path):
+    '''
+    逐篇解析 MEDLINE XML，依次 yield 标题和每一段摘要
+    '''
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as f:
+        root = None
+        for event, elem in ET.iterparse(f, events=('start', 'end')):
+            if root is None:
+                root = elem
+            if event != 'end' or elem.tag != 'PubmedArticle':
+                continue
+            article = elem.find('MedlineCitation/Article')
+            if article is not None:
+                title = article.find('ArticleTitle')
+                if title is not None:
+                    title = _text(title)
+                    if title.startswith('[') and title.endswith(']'):
+                        title = title[1:-1]     # 非英文文章的标题为 [译名]
+                    if title:
+                        yield title
+                for abstract in article.iterfind('Abstract/AbstractText'):
+                    abstract = _text(abstract)
+                    if abstract:
+                        yield abstract
+            root.clear()     # 非常关键：将元素废弃，释放出系统分配的内存
+
+
+def parseShard(path, tmp_path):
+    '''
+    工作进程：解析一个分片，在子进程中算好 hash，每行 "hash\t文本" 写入 tmp_path
+    :return: tmp_path
+    '''
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for line in iterMedline(path):
+            f.write('{:016x}{:016x}\t{}\n'.format(*lineHash(line), line))
+    return tmp_path
+
+
+def iterShard(tmp_path):
+    '''
+    逐行读取 parseShard 的输出
+    :return: ((h1, h2), line)
+    '''
+    with open(tmp_path, encoding='utf-8') as f:
+        for row in f:
+            h, line = row.rstrip('\n').split('\t', 1)
+            yield (int(h[:16], 16), int(h[16:], 16)), line
+
+
+def iterChunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class ShardWriter(object):
+    '''
+    按大小切分的输出文件：prefix.00000.txt, prefix.00001.txt, ...
+    '''
+
+    def __init__(self, out_dir, prefix='corpus', shard_bytes=1 << 30):
+        if not os.path.exists(out_dir):
+            os.makedirs(out_dir)
+        self.out_dir = out_dir
+        self.prefix = prefix
+        self.shard_bytes = shard_bytes
+        self.paths = []
+        self.f = None
+        self.size = 0
+
+    def write(self, line):
+        data = (line + '\n').encode('utf-8')
+        if self.f is None or (self.size and self.size + len(data) > self.shard_bytes):
+            self._next()
+        self.f.write(data)
+        self.size += len(data)
+
+    def _next(self):
+        if self.f is not None:
+            self.f.close()
+        path = os.path.join(self.out_dir, '{}.{:05d}.txt'.format(self.prefix, len(self.paths)))
+        self.paths.append(path)
+        self.f = open(path, 'wb')
+        self.size = 0
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+
+def buildCorpus(xml_paths, out_dir, extra_paths=(), processes=None, shard_bytes=1 << 30, prefix='corpus',
+                max_pending=None, bloom_bits=1 << 31, chunk_size=1 << 16):
+    '''
+    :param xml_paths: MEDLINE XML 分片
+    :param extra_paths: 追加到语料末尾的纯文本文件，每行一个句子
+    :param max_pending: 同时提交给进程池的分片数上限，默认为进程数的 2 倍
+    :param bloom_bits: 去重用的 BloomFilter 的位数，内存占用为 bloom_bits / 8 字节
+    :param chunk_size: 每次批量去重的行数
+    :return: 输出分片的路径列表
+    '''
+    seen = BloomFilter(bloom_bits)
+    num_lines = 0
+    writer = ShardWriter(out_dir, prefix, shard_bytes)
+
+    def add(rows):
+        nonlocal num_lines
+        for chunk in iterChunks(rows, chunk_size):
+            num_lines += len(chunk)
+            new = seen.add([h for h, _ in chunk])
+            for (_, line), keep in zip(chunk, new.tolist()):
+                if keep:
+                    writer.write(line)
+
+    processes = processes or os.cpu_count()
+    max_pending = max_pending or 2 * processes
+    tmp_dir = tempfile.mkdtemp(prefix='.shards_', dir=out_dir)
+    pool = Pool(processes)
+    try:
+        # 滑动窗口：按 xml_paths 的顺序提交和合并（输出与并行度无关），合并完一个才提交下一个
+        pending = deque()
+        for i in range(len(xml_paths)):
+            while len(pending) < max_pending and len(pending) + i < len(xml_paths):
+                k = len(pending) + i
+                tmp_path = os.path.join(tmp_dir, '{:05d}.txt'.format(k))
+                pending.append(pool.apply_async(parseShard, (xml_paths[k], tmp_path)))
+            tmp_path = pending.popleft().get()
+            add(iterShard(tmp_path))
+            os.remove(tmp_path)
+            print('{}/{} {}：累计 {} 行，去重后 {} 行'.format(i + 1, len(xml_paths), xml_paths[i], num_lines,
+                                                       seen.num_added))
+    finally:
+        pool.terminate()
+        pool.join()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    for path in extra_paths:
+        with open(path, encoding='utf-8') as f:
+            lines = (line.strip() for line in f)
+            add((lineHash(line), line) for line in lines if line)
+    writer.close()
+    print('语料共 {} 行，去重后 {} 行，{} 个分片'.format(num_lines, seen.num_added, len(writer.paths)))
+    return writer.paths
@@ -0,0 +1,193 @@
+'''
+    预处理结果的磁盘格式，取代 train.pkl / test.pkl 中的 8 元组
+
+    每个数据集是一个目录：
+        header.json     schema 版本、maxlen、句子数/token 数、各列的类型、各词典的 hash
+                        （句子不截断地保存，maxlen_s 为训练时的截断长度；预测时可用滑动窗口覆盖整个句子）
+        offsets.npy     句子的起始位置，长度为句子数 + 1，第 i 个句子为 [offsets[i], offsets[i+1])
+        <列名>.npy      token 级的一维数组，所有句子拼接在一起
+                            words   word_index 中的编号（送入词向量层）
+                            tokens  tokens.vocab 中的行号（清洗后的单词，用于 ELMo 输入）
+                            labels/cap/pos/chunk/dict  各特征在对应词典中的编号
+        char_table.npy  tokens.vocab 中每个词的字符编号 [词数, maxlen_w]，字符特征按需 gather
+        tokens.vocab    清洗后的单词表，每行一个词
+
+    打开时只读 header.json，各列在第一次使用时才用 mmap 打开，可以只读一列或一段句子
+    header.json 最后写入，写到一半的目录打开时即报错
+'''
+import os
+import json
+import hashlib
+import numpy as np
+from sample.utils.conll_reader import scatterSentences, gatherSentences
+
+SCHEMA_VERSION = 2     # 2: 句子不再在预处理时截断
+ELMO_PAD = '__PAD__'
+COLUMNS = ['words', 'tokens', 'labels', 'cap', 'pos', 'chunk', 'dict']
+
+
+def vocabHash(vocab):
+    '''
+    词典（dict 或 list）内容的 hash，与插入顺序无关
+    '''
+    data = json.dumps(vocab, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+class Dataset(object):
+
+    def __init__(self, path, header):
+        self.path = path
+        self.header = header
+        self._columns = {}
+        self._words = None
+        self._word_array = None
+
+    @staticmethod
+    def save(path, columns, offsets, words, char_table, maxlen_s, vocabs):
+        '''
+        :param columns: 列名 -> token 级的一维数组，须包含 COLUMNS 中的所有列
+        :param words: tokens 列对应的单词表
+        :param vocabs: 词典名 -> 词典，只把 hash 写入 header，打开时用于校验
+        '''
+        if not os.path.exists(path):
+            os.makedirs(path)
+        header_path = os.path.join(path, 'header.json')
+        if os.path.exists(header_path):
+            os.remove(header_path)
+
+        num_tokens = int(offsets[-1])
+        for name in COLUMNS:
+            assert len(columns[name]) == num_tokens, name
+            np.save(os.path.join(path, name + '.npy'), columns[name])
+        np.save(os.path.join(path, 'offsets.npy'), np.asarray(offsets, dtype=np.int64))
+        np.save(os.path.join(path, 'char_table.npy'), char_table)
+        with open(os.path.join(path, 'tokens.vocab'), 'w', encoding='utf-8') as f:
+            for word in words:
+                f.write(word)
+                f.write('\n')
+
+        header = {
+            'schema_version': SCHEMA_VERSION,
+            'num_sentences': len(offsets) - 1,
+            'num_tokens': num_tokens,
+            'maxlen_s': maxlen_s,
+            'maxlen_w': int(char_table.shape[1]),
+            'columns': {name: str(columns[name].dtype) for name in COLUMNS},
+            'vocab_hashes': {name: vocabHash(vocab) for name, vocab in vocabs.items()},
+        }
+        with open(header_path, 'w') as f:
+            json.dump(header, f, indent=2, sort_keys=True)
+
+    @classmethod
+    def open(cls, path, vocabs=None):
+        '''
+        :param vocabs: 词典名 -> 当前使用的词典，与生成数据集时的不一致则报错
+        '''
+        header_path = os.path.join(path, 'header.json')
+        if not os.path.exists(header_path):
+            raise ValueError('数据集不存在或未写完：{}'.format(path))
+        with open(header_path) as f:
+            header = json.load(f)
+        if header.get('schema_version') != SCHEMA_VERSION:
+            raise ValueError('数据集版本 {} 与当前版本 {} 不一致，请重新运行 2_process_conll_data.py：{}'.format(
+                header.get('schema_version'), SCHEMA_VERSION, path))
+        for name, vocab in (vocabs or {}).items():
+            if header['vocab_hashes'].get(name) != vocabHash(vocab):
+                raise ValueError('{} 与生成数据集时的不一致：{}'.format(name, path))
+        return cls(path, header)
+
+    def __len__(self):
+        return self.header['num_sentences']
+
+    @property
+    def maxlen_s(self):
+        return self.header['maxlen_s']
+
+    @property
+    def maxlen_w(self):
+        return self.header['maxlen_w']
+
+    def column(self, name):
+        '''
+        token 级的一维数组（mmap）
+        '''
+        col = self._columns.get(name)
+        if col is None:
+            col = self._columns[name] = np.load(os.path.join(self.path, name + '.npy'), mmap_mode='r')
+        return col
+
+    @property
+    def words(self):
+        if self._words is None:
+            with open(os.path.join(self.path, 'tokens.vocab'), encoding='utf-8') as f:
+                self._words = f.read().split('\n')[:-1]
+        return self._words
+
+    @property
+    def word_array(self):
+        '''
+        tokens 编号 -> 字符串 的数组，最后一项为 ELMo 的补齐符号
+        '''
+        if self._word_array is None:
+            self._word_array = np.array(self.words + [ELMO_PAD], dtype=object)
+        return self._word_array
+
+    def _range(self, start, stop):
+        stop = len(self) if stop is None else min(stop, len(self))
+        offsets = np.asarray(self.column('offsets')[start:stop + 1])
+        return offsets, offsets[0], offsets[-1]
+
+    def sentences(self, name, start=0, stop=None, maxlen=None):
+        '''
+        :param maxlen: 不为 None 时每个句子最多取前 maxlen 个 token
+        :return: [start, stop) 中每个句子一个数组视图
+        '''
+        offsets, _, _ = self._range(start, stop)
+        col = self.column(name)
+        bounds = offsets.tolist()
+        return [col[a:b if maxlen is None else min(b, a + maxlen)] for a, b in zip(bounds, bounds[1:])]
+
+    def charTensor(self, start=0, stop=None, maxlen_s=None, out=None):
+        '''
+        [start, stop) 的字符特征，超过 maxlen_s 的句子被截断，补齐部分为 0
+        :return: int16 [句子数, maxlen_s, maxlen_w]
+        '''
+        offsets, a, b = self._range(start, stop)
+        char_table = self.column('char_table')
+        values = char_table[np.asarray(self.column('tokens')[a:b])]
+        return scatterSentences(offsets - a, values, maxlen_s or self.maxlen_s, out)
+
+    def elmo(self, start=0, stop=None):
+        '''
+        :return: [start, stop) 中每个句子清洗后的单词列表
+        '''
+        words = self.words
+        return [[words[k] for k in sen.tolist()] for sen in self.sentences('tokens', start, stop)]
+
+    def batch(self, indices, maxlen, names, starts=None):
+        '''
+        取出 indices 中的句子，各特征补齐（或截断）到 maxlen
+        :param names: 列名，以及 'chars'（字符特征）和 'elmo'（ELMo 的单词字符串，补齐为 '__PAD__'）
+        :param starts: 每个句子从第几个 token 开始取（滑动窗口），默认为句首
+        :return: 与 names 对应的数组列表，每个为 [len(indices), maxlen, ...]
+        '''
+        indices = np.asarray(indices)
+        row, col, tok = gatherSentences(self.column('offsets'), indices, maxlen, starts)
+        result = []
+        for name in names:
+            if name == 'chars':
+                table = self.column('char_table')
+                x = np.zeros((len(indices), maxlen, table.shape[1]), dtype=table.dtype)
+                x[row, col] = table[self.column('tokens')[tok]]
+            elif name == 'elmo':
+                # 先补齐单词编号，再在送入模型前一次性映射为字符串
+                ids = np.full((len(indices), maxlen), len(self.words), dtype=np.int32)
+                ids[row, col] = self.column('tokens')[tok]
+                x = self.word_array[ids]
+            else:
+                column = self.column(name)
+                x = np.zeros((len(indices), maxlen), dtype=column.dtype)
+                x[row, col] = column[tok]
+            result.append(x)
+        return result
@@ -0,0 +1,231 @@
+'''
+    蛋白质/基因字典的 Aho-Corasick 自动机
+
+    自动机只构建一次，以若干 .npy 数组的形式保存到目录中，之后用 mmap 加载，几毫秒即可使用。
+    header.json 中记录 KB 文件的版本戳（路径、大小、修改时间），KB 文件变化后才重新构建
+
+    数组（状态按 trie 的先序编号，0 为根）：
+        edge_start  状态 s 的出边为 edge_start[s]:edge_start[s+1]
+        edge_char   出边上的字符(unicode 码位)，同一状态内升序
+        edge_target 出边指向的状态
+        fail        失配指针
+        out_link    沿 fail 链的下一个终止状态，没有则为 -1
+        depth       状态的深度，即匹配到的模式串长度
+        term        是否为某个模式串的结尾
+'''
+import os
+import json
+import hashlib
+from array import array
+from bisect import bisect_left
+import numpy as np
+
+BUILD_VERSION = 1
+ARRAYS = ['edge_start', 'edge_char', 'edge_target', 'fail', 'out_link', 'depth', 'term']
+
+
+def kbStamp(paths):
+    '''
+    KB 文件的版本戳，任一文件的大小或修改时间变化即不同
+    '''
+    sha1 = hashlib.sha1(str(BUILD_VERSION).encode('utf-8'))
+    for path in paths:
+        st = os.stat(path)
+        sha1.update('{}\t{}\t{}\n'.format(os.path.abspath(path), st.st_size, st.st_mtime_ns).encode('utf-8'))
+    return sha1.hexdigest()
+
+
+def buildArrays(words):
+    '''
+    由模式串构建自动机的各个数组（模式串统一转为小写）
+    '''
+    words = sorted(set(w.lower() for w in words if w))
+
+    # 1、按字典序插入 trie：与前一个词的公共前缀部分不必重复插入，
+    #    节点按先序编号，同一节点的子节点按字符升序生成
+    parent = array('i', [-1])
+    char = array('i', [0])
+    depth = array('i', [0])
+    term = array('b', [0])
+    path = [0]
+    prev = ''
+    for w in words:
+        k = 0
+        m = min(len(w), len(prev))
+        while k < m and w[k] == prev[k]:
+            k += 1
+        del path[k + 1:]
+        for d in range(k, len(w)):
+            path.append(len(parent))
+            parent.append(path[d])
+            char.append(ord(w[d]))
+            depth.append(d + 1)
+            term.append(0)
+        term[path[len(w)]] = 1
+        prev = w
+
+    n = len(parent)
+    parent = np.frombuffer(parent, dtype=np.int32)
+    depth = np.frombuffer(depth, dtype=np.int32)
+    char = np.frombuffer(char, dtype=np.int32)
+
+    # 2、goto 表：出边按父节点分组（稳定排序保持字符升序）
+    order = np.argsort(parent[1:], kind='stable') + 1
+    edge_start = np.zeros(n + 1, dtype=np.int32)
+    np.cumsum(np.bincount(parent[1:], minlength=n), out=edge_start[1:])
+    edge_char = char[order]
+    edge_target = order.astype(np.int32)
+
+    # 3、按深度的 BFS 顺序计算 fail 和 out_link
+    starts, chars, targets = edge_start.tolist(), edge_char.tolist(), edge_target.tolist()
+
+    def goto(s, c):
+        lo, hi = starts[s], starts[s + 1]
+        i = bisect_left(chars, c, lo, hi)
+        return targets[i] if i < hi and chars[i] == c else -1
+
+    fail = [0] * n
+    out_link = [-1] * n
+    par, ch = parent.tolist(), char.tolist()
+    for v in np.argsort(depth, kind='stable').tolist()[1:]:
+        p, c = par[v], ch[v]
+        f = 0
+        if p != 0:
+            f = fail[p]
+            t = goto(f, c)
+            while t < 0 and f != 0:
+                f = fail[f]
+                t = goto(f, c)
+            f = t if t >= 0 else 0
+        fail[v] = f
+        out_link[v] = f if term[f] else out_link[f]
+
+    return {'edge_start': edge_start, 'edge_char': edge_char, 'edge_target': edge_target,
+            'fail': np.array(fail, dtype=np.int32), 'out_link': np.array(out_link, dtype=np.int32),
+            'depth': depth, 'term': np.frombuffer(term, dtype=np.int8)}
+
+
+class DictAutomaton(object):
+    '''
+    多模式串匹配，query 的返回值与 esm.Index.query 相同：[((start, end), word), ...]
+    状态的出边等信息在第一次访问时才从数组中解码并缓存，加载时无需遍历整个自动机
+    '''
+
+    def __init__(self, arrays, header=None):
+        self.arrays = arrays
+        self.header = header or {}
+        self._nodes = {}
+
+    @classmethod
+    def build(cls, words):
+        return cls(buildArrays(words))
+
+    def save(self, path, stamp=None):
+        if not os.path.exists(path):
+            os.makedirs(path)
+        for name in ARRAYS:
+            np.save(os.path.join(path, name + '.npy'), self.arrays[name])
+        # header 最后写入，构建中断时不会被当作有效的自动机
+        self.header = {'version': BUILD_VERSION, 'stamp': stamp,
+                       'num_states': len(self.arrays['fail']),
+                       'num_patterns': int(self.arrays['term'].sum())}
+        with open(os.path.join(path, 'header.json'), 'w') as f:
+            json.dump(self.header, f)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        with open(os.path.join(path, 'header.json')) as f:
+            header = json.load(f)
+        if header['version'] != BUILD_VERSION:
+            raise ValueError('字典自动机版本不匹配：{} != {}'.format(header['version'], BUILD_VERSION))
+        arrays = {name: np.load(os.path.join(path, name + '.npy'), mmap_mode=mmap_mode) for name in ARRAYS}
+        return cls(arrays, header)
+
+    def _node(self, s):
+        '''
+        :return: (出边 {字符: 状态}, fail, 以该状态结尾的所有模式串的长度)
+        '''
+        node = self._nodes.get(s)
+        if node is None:
+            a = self.arrays
+            lo, hi = int(a['edge_start'][s]), int(a['edge_start'][s + 1])
+            children = dict(zip(a['edge_char'][lo:hi].tolist(), a['edge_target'][lo:hi].tolist()))
+            outputs = []
+            v = s if a['term'][s] else int(a['out_link'][s])
+            while v > 0:
+                outputs.append(int(a['depth'][v]))
+                v = int(a['out_link'][v])
+            node = (children, int(a['fail'][s]), tuple(outputs))
+            self._nodes[s] = node
+        return node
+
+    def query(self, text):
+        '''
+        查找 text（需已转为小写）中所有模式串的出现位置
+        '''
+        results = []
+        node = self._node(0)
+        for end, ch in enumerate(text, 1):
+            c = ord(ch)
+            t = node[0].get(c)
+            while t is None and node is not self._nodes[0]:
+                node = self._node(node[1])
+                t = node[0].get(c)
+            node = self._node(t if t is not None else 0)
+            for length in node[2]:
+                results.append(((end - length, end), text[end - length:end]))
+        return results
+
+    def tagTokens(self, tokens):
+        '''
+        在 token 序列上做最长匹配：匹配的起止必须与 token 边界对齐，
+        从左到右每次取从当前 token 开始的最长匹配，匹配之间互不重叠
+        :param tokens: 分词后的句子 [word, ...]
+        :return: np.int8 数组，0:O 1:B 2:I，与 dict2idx 一致
+        '''
+        tokens = [t.lower() for t in tokens]
+        starts = {}     # 字符偏移 -> token 下标
+        ends = {}
+        pos = 0
+        for i, token in enumerate(tokens):
+            starts[pos] = i
+            pos += len(token)
+            ends[pos] = i + 1
+            pos += 1
+
+        n = len(tokens)
+        longest = list(range(n))    # 从第 i 个 token 开始的最长匹配的结束下标
+        for (s, e), _ in self.query(' '.join(tokens)):
+            i = starts.get(s)
+            j = ends.get(e)
+            if i is not None and j is not None and j > longest[i]:
+                longest[i] = j
+
+        tags = np.zeros(n, dtype=np.int8)
+        i = 0
+        while i < n:
+            j = longest[i]
+            if j > i:
+                tags[i] = 1
+                tags[i + 1:j] = 2
+                i = j
+            else:
+                i += 1
+        return tags
+
+
+def loadOrBuild(path, kb_paths, readWords):
+    '''
+    KB 文件未变化时直接加载 path 下的自动机，否则调用 readWords() 读取字典重新构建
+    '''
+    stamp = kbStamp(kb_paths)
+    header_path = os.path.join(path, 'header.json')
+    if os.path.exists(header_path):
+        with open(header_path) as f:
+            header = json.load(f)
+        if header.get('version') == BUILD_VERSION and header.get('stamp') == stamp:
+            return DictAutomaton.load(path)
+        os.remove(header_path)
+    dic = DictAutomaton.build(readWords())
+    dic.save(path, stamp)
+    return DictAutomaton.load(path)
@@ -0,0 +1,208 @@
+'''
+    预训练词向量的读取
+
+    只保留所需词表中的词：顺序扫描一遍词向量文件，命中的词向量直接写入预先分配的 float32 矩阵，
+    其余的跳过不解析。峰值内存只与词表大小有关，与词向量文件的大小无关
+    文本格式的词向量文件按字节范围切分，多进程并行解析
+    EmbeddingStore 为预处理、NER 和 NED 共用的 .npy + 词表 存储格式
+'''
+import os
+import string
+import numpy as np
+from multiprocessing import Pool
+from tqdm import tqdm
+
+
+def normalizeKeys(word):
+    '''
+    查找词向量时依次尝试的键：小写；去掉标点后小写（与 produce_matrix 一致）
+    '''
+    stripped = word
+    for punc in string.punctuation:
+        stripped = stripped.replace(punc, '')
+    return word.lower(), stripped.lower()
+
+
+def loadBinEmbeddings(embFile, vocab, chunk_size=1 << 24):
+    '''
+    流式读取 word2vec 二进制格式的词向量文件
+    文件中的词统一转为小写，小写后重复的词以最后出现的为准（与原来的 OrderedDict 一致）
+
+    :param vocab: 需要的词（小写）的集合
+    :return: (index, matrix)  index: 词 -> matrix 的行号；matrix: float32 [len(index), dim]
+    '''
+    with open(embFile, 'rb') as f:
+        header = f.readline().split()
+        num, dim = int(header[0]), int(header[1])
+        nbytes = dim * 4
+        index = {}
+        matrix = np.zeros((len(vocab), dim), dtype=np.float32)
+
+        buf = f.read(chunk_size)
+        pos = 0
+        for _ in tqdm(range(num)):
+            sp = buf.find(b' ', pos)
+            while sp < 0 or len(buf) - sp - 1 < nbytes:
+                more = f.read(chunk_size)
+                if not more:
+                    raise ValueError('词向量文件不完整：{}'.format(embFile))
+                buf = buf[pos:] + more
+                pos = 0
+                sp = buf.find(b' ')
+            word = buf[pos:sp].lstrip(b'\n').decode('utf-8', errors='replace').lower()
+            if word in vocab:
+                row = index.setdefault(word, len(index))
+                matrix[row] = np.frombuffer(buf, dtype=np.float32, count=dim, offset=sp + 1)
+            pos = sp + 1 + nbytes
+
+    print('词向量文件共 {} 个词，命中词表 {}/{}'.format(num, len(index), len(vocab)))
+    return index, matrix[:len(index)].copy()
+
+
+_vocab = None     # 工作进程中的词表，由 _initWorker 设置，避免随每个任务重复传递
+
+
+def _initWorker(vocab):
+    global _vocab
+    _vocab = vocab
+
+
+def _byteRanges(path, num_chunks):
+    '''
+    将文件切分为 num_chunks 段，每段的边界对齐到行首
+    '''
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, 'rb') as f:
+        for i in range(1, num_chunks):
+            f.seek(max(size * i // num_chunks, bounds[-1]))
+            f.readline()
+            bounds.append(min(f.tell(), size))
+    bounds.append(size)
+    return [(path, a, b) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+
+def _parseTxtRange(task):
+    '''
+    工作进程：解析 [start, end) 字节范围内的行，数值部分一次性转换为 float32
+    :return: (words, matrix, 范围内词向量的个数（词表过滤前）)
+    '''
+    path, start, end, lower = task
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start).decode('utf-8', errors='replace')
+    words = []
+    values = []
+    num_records = 0
+    for line in data.split('\n'):
+        word, _, rest = line.strip().partition(' ')
+        if not rest or ' ' not in rest.strip():
+            continue    # 空行或 fastText 的首行 "词数 维度"
+        num_records += 1
+        if lower:
+            word = word.lower()
+        if _vocab is not None and word not in _vocab:
+            continue
+        words.append(word)
+        values.append(rest)
+    if not words:
+        return words, np.zeros((0, 0), dtype=np.float32), num_records
+    # 数值部分拼接后由 numpy 一次性解析
+    dim = len(values[0].split())
+    matrix = np.fromstring(' '.join(values), dtype=np.float32, sep=' ')
+    if len(matrix) != len(words) * dim:
+        raise ValueError('词向量维度不一致：{}'.format(path))
+    matrix = matrix.reshape(len(words), dim)
+    return words, matrix, num_records
+
+
+def loadTxtEmbeddings(embFile, vocab=None, processes=None, lower=True):
+    '''
+    多进程读取文本格式（GloVe/fastText 等，每行 "词 v1 v2 ..."）的词向量文件
+    文件按字节范围切分后由各进程并行解析，再按原顺序拼接；词表过滤与 loadBinEmbeddings 相同
+
+    :param vocab: 需要的词的集合，None 表示全部保留
+    :param lower: 是否将词转为小写；小写后重复的词以最后出现的为准
+    :return: (index, matrix)  index: 词 -> matrix 的行号；matrix: float32 [len(index), dim]
+    '''
+    processes = processes or os.cpu_count()
+    tasks = [task + (lower,) for task in _byteRanges(embFile, processes * 4)]
+    with Pool(processes, initializer=_initWorker, initargs=(vocab,)) as pool:
+        chunks = pool.map(_parseTxtRange, tasks)
+
+    index = {}
+    for words, _, _ in chunks:
+        for word in words:
+            index.setdefault(word, len(index))
+    dims = set(m.shape[1] for words, m, _ in chunks if words)
+    if len(dims) > 1:
+        raise ValueError('词向量维度不一致：{}'.format(sorted(dims)))
+    matrix = np.zeros((len(index), dims.pop() if dims else 0), dtype=np.float32)
+    num_records = sum(n for _, _, n in chunks)
+    while chunks:
+        words, m, _ = chunks.pop(0)    # 拼接完即释放
+        if not words:
+            continue
+        last = {word: i for i, word in enumerate(words)}    # 重复的词以最后出现的为准
+        matrix[[index[word] for word in last]] = m[list(last.values())]
+
+    if vocab is None:
+        print('词向量文件共 {} 个词，去重后 {} 个'.format(num_records, len(index)))
+    else:
+        print('词向量文件共 {} 个词，命中词表 {}/{}'.format(num_records, len(index), len(vocab)))
+    return index, matrix
+
+
+class EmbeddingStore(object):
+    '''
+    共享的词向量存储格式：
+        <path>.npy    float32 矩阵，用 mmap 打开，多个进程通过 page cache 共享同一份物理内存
+        <path>.vocab  词表，每行一个词，行号即矩阵的行号；按 id 索引的矩阵（如 emb）可以没有词表
+    '''
+
+    def __init__(self, matrix, words=None):
+        self.matrix = matrix
+        self.words = words
+        self._index = None
+
+    @staticmethod
+    def save(path, matrix, words=None):
+        if words is not None:
+            assert len(words) == len(matrix)
+            with open(path + '.vocab', 'w', encoding='utf-8') as f:
+                for word in words:
+                    f.write(word)
+                    f.write('\n')
+        elif os.path.exists(path + '.vocab'):
+            os.remove(path + '.vocab')
+        np.save(path + '.npy', np.asarray(matrix, dtype=np.float32))
+
+    @staticmethod
+    def exists(path):
+        return os.path.exists(path + '.npy')
+
+    @classmethod
+    def open(cls, path, mmap_mode='r'):
+        matrix = np.load(path + '.npy', mmap_mode=mmap_mode)
+        words = None
+        if os.path.exists(path + '.vocab'):
+            with open(path + '.vocab', encoding='utf-8') as f:
+                words = f.read().split('\n')[:-1]
+        return cls(matrix, words)
+
+    @property
+    def index(self):
+        # 词 -> 行号，第一次按词查询时才建立
+        if self._index is None:
+            self._index = {word: i for i, word in enumerate(self.words)}
+        return self._index
+
+    def __len__(self):
+        return len(self.matrix)
+
+    def __contains__(self, word):
+        return word in self.index
+
+    def get(self, word, default=None):
+        i = self.index.get(word)
+        return default if i is None else self.matrix[i]
@@ -0,0 +1,109 @@
+'''
+    根据 BioC 的 offset 对句子中的实体进行标记
+
+    1、嵌套实体的筛选：对实体的起止位置排序后扫描一遍，O(k log k)
+    2、offset 是在 utf-8 编码下索引的。先计算一次 字节偏移->字符偏移 的映射，
+       再按 offset 顺序线性扫描一遍，输出用 <B^>entity<^I> 包裹实体后的句子
+'''
+
+
+def resolveNested(records, prefer=None, contained=False):
+    '''
+    针对实体嵌套的情况：start 相同或 end 相同的实体互相冲突，冲突中仅保留
+    prefer(type) 为真的实体，否则保留长度较长的实体（长度相同则保留靠后的）
+    contained=True 时，被其他实体完全包含的实体也一并丢弃（用于字典匹配的结果）
+
+    :param records: [(start, end, type, id), ...]
+    :param prefer: 优先保留的实体类型，如 xx()
+    :return: 保留下来的记录，保持输入顺序
+    '''
+    n = len(records)
+    if n < 2:
+        return list(records)
+
+    def rank(i):
+        start, end, type, _ = records[i]
+        return (bool(prefer(type)) if prefer else False, end - start, i)
+
+    removed = [False] * n
+    # 分别按 (start, rank) 和 (end, rank) 排序，同一 start/end 的组内只有 rank 最大的保留
+    for col in (0, 1):
+        order = sorted(range(n), key=lambda i: (records[i][col], rank(i)))
+        for i, j in zip(order, order[1:]):
+            if records[i][col] == records[j][col]:
+                removed[i] = True
+
+    if contained:
+        # 按 start 升序、end 降序扫描，end 不超过之前最大 end 的实体即被包含
+        # （与取得最大 end 的实体起止相同的不算被包含，二者之间按上面的 rank 取舍）
+        order = sorted(range(n), key=lambda i: (records[i][0], -records[i][1]))
+        max_span = None
+        for i in order:
+            span = records[i][:2]
+            if max_span is not None and span[1] <= max_span[1]:
+                if span != max_span:
+                    removed[i] = True
+            else:
+                max_span = span
+
+    return [records[i] for i in range(n) if not removed[i]]
+
+
+def byteToCharMap(text):
+    '''
+    计算 utf-8 字节偏移 -> 字符下标 的映射
+    b2c[b] 为第 b 个字节所属字符的下标，b2c[len(bytes)] = len(text)
+    纯 ASCII 句子返回 None（字节偏移即字符下标）
+    '''
+    lens = [len(ch.encode('utf-8')) for ch in text]
+    if len(lens) == sum(lens):
+        return None
+    b2c = []
+    for i, n in enumerate(lens):
+        b2c.extend([i] * n)
+    b2c.append(len(text))
+    return b2c
+
+
+def _charRange(b2c, b):
+    '''
+    字节偏移 b 在字符串中的切分位置 (左侧结束, 右侧开始)
+    若 b 落在多字节字符内部，则丢弃该字符，与 decode(errors='ignore') 的结果一致
+    '''
+    c = b2c[b]
+    if b > 0 and b2c[b - 1] == c:
+        return c, c + 1
+    return c, c
+
+
+def tagEntities(sentence_byte, spans, B_tag, I_tag):
+    '''
+    用一对标签 <B^>entity<^I> 包裹所有实体，一次线性扫描完成
+    :param sentence_byte: utf-8 编码的句子
+    :param spans: [(offset, length, k), ...] 实体的字节偏移和长度，k 为 B_tag/I_tag 的下标
+    :return: 标记后的句子(str)
+    '''
+    text = sentence_byte.decode('utf-8', errors='ignore')
+    nbytes = len(sentence_byte)
+    b2c = byteToCharMap(text) if len(text) != nbytes else None
+
+    # 实体的起止位置作为事件：同一位置先闭合再开始；
+    # 同一位置的多个开始，长的实体在外层；多个闭合，内层(后开始)的先闭合
+    events = []
+    for offset, length, k in spans:
+        start = min(offset, nbytes)
+        end = min(offset + length, nbytes)
+        events.append((start, 1, -end, ' ' + B_tag[k]))
+        events.append((end, 0, -start, I_tag[k] + ' '))
+    events.sort()
+
+    pieces = []
+    prev = 0
+    for b, _, _, marker in events:
+        left, right = _charRange(b2c, b) if b2c else (b, b)
+        if left > prev:
+            pieces.append(text[prev:left])
+        pieces.append(marker)
+        prev = max(prev, right)
+    pieces.append(text[prev:])
+    return ''.join(pieces)
@@ -0,0 +1,185 @@
+'''
+    GENIA tagger 分词/词性标注阶段
+
+    每个 CPU 核启动一个常驻的 geniatagger 子进程，按批送入句子；
+    标注结果按句子内容的 hash 缓存到磁盘，重复运行时只标注新增或修改过的句子。
+
+    没有 geniatagger 时可用 STANDIN_COMMAND 代替（纯 Python 实现，按空格分词），
+    其输出格式与 geniatagger 相同：word  base  POS  chunk  NE，每句以空行结束
+'''
+import os
+import sys
+import dbm
+import hashlib
+import threading
+import subprocess
+from queue import Queue
+from concurrent.futures import ThreadPoolExecutor
+
+# 纯 Python 的替代 tagger，直接运行本文件即可
+STANDIN_COMMAND = [sys.executable, os.path.abspath(__file__)]
+
+
+class GeniaTagger(object):
+    '''
+    一个常驻的 tagger 子进程
+    geniatagger 需要在其所在目录下运行才能找到模型文件，因此需指定 cwd
+    '''
+
+    def __init__(self, command, cwd=None):
+        self.proc = subprocess.Popen(command, cwd=cwd,
+                                     stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                     stderr=subprocess.DEVNULL,
+                                     universal_newlines=True, encoding='utf-8')
+
+    def _write(self, sentences):
+        for sentence in sentences:
+            self.proc.stdin.write(sentence)
+            self.proc.stdin.write('\n')
+        self.proc.stdin.flush()
+
+    def tag(self, sentences):
+        '''
+        标注一批句子（不能包含空句子）
+        :return: 每个句子的标注结果(str)，每个 token 一行，不含结尾的空行
+        '''
+        # 另起线程写入，避免子进程的输出管道写满后双方互相等待
+        writer = threading.Thread(target=self._write, args=(sentences,))
+        writer.start()
+        results = []
+        lines = []
+        while len(results) < len(sentences):
+            line = self.proc.stdout.readline()
+            if not line:
+                raise RuntimeError('tagger 进程意外退出')
+            if line == '\n':
+                results.append(''.join(lines))
+                lines = []
+            else:
+                lines.append(line)
+        writer.join()
+        return results
+
+    def close(self):
+        self.proc.stdin.close()
+        self.proc.wait()
+
+
+class TaggingStage(object):
+    '''
+    批量标注 + 磁盘缓存
+    :param command: tagger 命令，如 ['./geniatagger']
+    :param cache_path: dbm 缓存文件路径
+    :param processes: tagger 子进程个数，默认每个 CPU 核一个
+    :param batch_size: 每次送入一个子进程的句子数
+    '''
+
+    def __init__(self, command, cache_path, processes=None, batch_size=500, cwd=None):
+        self.command = command
+        self.cwd = cwd
+        self.processes = processes or os.cpu_count()
+        self.batch_size = batch_size
+        self.cache = dbm.open(cache_path, 'c')
+        # 缓存的键包含 tagger 命令和运行目录（geniatagger 从中读取模型），更换 tagger 或模型后不会误用旧的结果
+        self.namespace = ' '.join(command) + '\t' + os.path.abspath(cwd or os.curdir)
+        self.taggers = None
+        self.idle = Queue()
+        self.num_hit = 0
+        self.num_miss = 0
+
+    def _key(self, sentence):
+        s = self.namespace + '\t' + sentence
+        return hashlib.sha1(s.encode('utf-8')).hexdigest()
+
+    def _start(self):
+        # 子进程在第一次遇到未缓存的句子时才启动
+        if self.taggers is None:
+            self.taggers = [GeniaTagger(self.command, self.cwd) for _ in range(self.processes)]
+            for tagger in self.taggers:
+                self.idle.put(tagger)
+            self.pool = ThreadPoolExecutor(max_workers=self.processes)
+
+    def _tagBatch(self, batch):
+        tagger = self.idle.get()
+        try:
+            return tagger.tag(batch)
+        finally:
+            self.idle.put(tagger)
+
+    def tagSentences(self, sentences):
+        '''
+        :return: 与 sentences 一一对应的标注结果
+        '''
+        keys = [self._key(s) for s in sentences]
+        results = [None] * len(sentences)
+        todo = {}   # key -> 未缓存的句子，相同的句子只标注一次
+        for i, (sentence, key) in enumerate(zip(sentences, keys)):
+            if not sentence.strip():
+                results[i] = ''     # 空句子没有 token
+            elif key in self.cache:
+                results[i] = self.cache[key].decode('utf-8')
+                self.num_hit += 1
+            elif key not in todo:
+                todo[key] = sentence
+                self.num_miss += 1
+
+        if todo:
+            self._start()
+            todo_keys = list(todo.keys())
+            batches = [[todo[k] for k in todo_keys[i:i + self.batch_size]]
+                       for i in range(0, len(todo_keys), self.batch_size)]
+            tagged = {}
+            for i, batch_result in enumerate(self.pool.map(self._tagBatch, batches)):
+                for key, result in zip(todo_keys[i * self.batch_size:], batch_result):
+                    tagged[key] = result
+                    self.cache[key] = result.encode('utf-8')
+            for i, key in enumerate(keys):
+                if results[i] is None:
+                    results[i] = tagged[key]
+        return results
+
+    def tagFile(self, inPath, outPath, chunk_size=20000):
+        '''
+        标注 inPath 中的每一行句子，输出 geniatagger 格式的文件
+        按 chunk_size 行分块读取，内存占用与语料大小无关
+        '''
+        with open(inPath, encoding='utf-8') as fin, open(outPath, 'w', encoding='utf-8') as fout:
+            chunk = []
+            for line in fin:
+                chunk.append(line.rstrip('\n'))
+                if len(chunk) == chunk_size:
+                    self._writeChunk(chunk, fout)
+                    chunk = []
+            if chunk:
+                self._writeChunk(chunk, fout)
+        print('tagger 缓存命中：{}，新标注：{}'.format(self.num_hit, self.num_miss))
+
+    def _writeChunk(self, chunk, fout):
+        for result in self.tagSentences(chunk):
+            fout.write(result)
+            fout.write('\n')
+
+    def close(self):
+        if self.taggers is not None:
+            self.pool.shutdown()
+            for tagger in self.taggers:
+                tagger.close()
+            self.taggers = None
+        self.cache.close()
+
+
+def standInTagger(fin, fout):
+    '''
+    geniatagger 的纯 Python 替代：按空格分词，POS 统一为 NN，chunk 和 NE 为 O
+    '''
+    for line in fin:
+        for word in line.split():
+            fout.write('{}\t{}\tNN\tO\tO\n'.format(word, word))
+        fout.write('\n')
+        fout.flush()
+
+
+if __name__ == '__main__':
+    sys.stdin.reconfigure(encoding='utf-8')
+    sys.stdout.reconfigure(encoding='utf-8')
+    standInTagger(sys.stdin, sys.stdout)
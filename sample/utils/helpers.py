@@ -189,6 +189,39 @@ def pos_surround(test_x, test_pos, tokenIdx, entity, idx2pos, features_dict):
     return pos, surroundding_word
 
 
+def splitPunctuation(text):
+    '''
+    送入 GENIA tagger 前的预处理：合并空白，在标点符号两侧加空格（保留 ^ 用作实体标记）
+    训练语料（1_xml2conll_offset）和在线预测使用同一份切分规则
+    '''
+    text = ' '.join(text.split())
+    for special in "!\"#$%'()*+,-./:;<=>?@[\\]_`{|}~":
+        text = text.replace(special, ' '+special+' ')
+    text = text.replace('°C', ' °C ')
+    text = text.replace('   ', ' ').replace('  ', ' ')
+    return text
+
+
+def getCasting(word):
+    casing = 'other'
+
+    if word.isdigit():
+        casing = 'numeric'
+    elif word.islower():
+        casing='allLower'
+    elif word.isupper():    # DF43 也属于
+        casing = 'allUpper'
+    elif word[0].isupper():
+        casing = 'initialUpper'
+
+    return casing
+
+
+def getCastingVocab():
+    entries = ['other', 'numeric','allLower', 'allUpper', 'initialUpper']
+    return {entries[idx]:idx for idx in range(len(entries))}
+
+
 def createCharDict():
     '''
     创建字符字典
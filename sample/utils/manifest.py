@@ -0,0 +1,90 @@
+'''
+    语料增量转换的清单文件 manifest.json
+
+    记录每个 BioC 文件的内容 hash，以及该文件的 passage 在各个输出文件中的字节位置。
+    重新转换时只需处理新增或修改过的文件，其余文件的结果直接从上次的输出文件中拷贝
+'''
+import os
+import json
+import hashlib
+
+
+def fileHash(path):
+    '''
+    文件内容的 sha1
+    '''
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+class Manifest(object):
+    '''
+    :param path: manifest.json 的路径
+    :param outputs: 输出文件的路径列表
+    :param version: 转换逻辑的版本号，版本不同时上次的结果全部作废
+
+    每个 BioC 文件对应一条记录：
+        {'hash': 内容hash, 'passages': passage个数, 'skipped': 被跳过的passage下标,
+         'counts': 实体个数, 'spans': [[起始字节, 字节数], ...] 与 outputs 一一对应}
+    '''
+
+    def __init__(self, path, outputs, version):
+        self.path = path
+        self.outputs = outputs
+        self.version = version
+        self.old = {}
+        self.new = {}
+        self.old_files = []
+        if os.path.exists(path) and all(os.path.exists(p) for p in outputs):
+            with open(path) as f:
+                data = json.load(f)
+            if data.get('version') == version and data.get('outputs') == outputs:
+                self.old = data['files']
+
+    def lookup(self, bioc_path, digest):
+        '''
+        文件未修改时返回上次的记录，否则返回 None
+        '''
+        entry = self.old.get(bioc_path)
+        if entry is not None and entry['hash'] == digest:
+            return entry
+        return None
+
+    def begin(self):
+        '''
+        开始写新的输出文件前，将上次的输出文件改名为 *.old 以便拷贝；
+        同时删除旧的 manifest，避免转换中断后误用不完整的输出
+        '''
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        if self.old:
+            for p in self.outputs:
+                os.replace(p, p + '.old')
+            self.old_files = [open(p + '.old', 'rb') for p in self.outputs]
+
+    def copy(self, entry, fouts):
+        '''
+        将一个未修改文件的结果从旧输出文件拷贝到新输出文件中
+        :return: 新输出文件中的 spans
+        '''
+        spans = []
+        for fin, fout, (start, length) in zip(self.old_files, fouts, entry['spans']):
+            fin.seek(start)
+            spans.append([fout.tell(), length])
+            fout.write(fin.read(length))
+        return spans
+
+    def record(self, bioc_path, entry):
+        self.new[bioc_path] = entry
+
+    def commit(self):
+        for f in self.old_files:
+            f.close()
+        for p in self.outputs:
+            if os.path.exists(p + '.old'):
+                os.remove(p + '.old')
+        with open(self.path, 'w') as f:
+            json.dump({'version': self.version, 'outputs': self.outputs, 'files': self.new}, f)
@@ -0,0 +1,347 @@
+'''
+    常驻的 NER 预测服务
+
+    模型、单词表、字典自动机和 GENIA tagger 子进程只加载/启动一次，之后从标准输入或本地 socket
+    逐行接收请求，返回 BIO 标签（每行一个 JSON）：
+        请求    纯文本（一段图注）  或  {"text": "..."}  或  {"bioc": "BioC 文件路径"}
+                （不是这两种 JSON 对象的行，即使以 '{' 开头，也按纯文本处理）
+        响应    {"tokens": [...], "labels": [...]}；BioC 文件为 {"passages": [每个 passage 的结果]}
+
+    并发的请求由 MicroBatcher 合并为一个 batch：收到第一个请求后最多再等待 max_wait 秒
+    （或凑满 max_batch 个句子）即一起送入模型，在延迟和吞吐量之间折中
+
+    python -m sample.utils.ner_service --model model/Model_4_75.00.h5 --stdin
+    python -m sample.utils.ner_service --model model/Model_4_75.00.h5 --port 8765
+'''
+import sys
+import json
+import time
+import argparse
+import threading
+import socketserver
+from queue import Queue, Empty
+from concurrent.futures import Future
+import numpy as np
+from sample.utils.bioc_reader import iterBioC
+from sample.utils.conll_reader import TokenFeaturizer, scatterSentences
+from sample.utils.dataset import ELMO_PAD
+from sample.utils.helpers import splitPunctuation, createCharDict, getCasting, getCastingVocab
+from sample.utils.vocabulary import Vocabulary
+
+label2idx = {'O': 0, 'B-protein': 1, 'I-protein': 2, 'B-gene': 3, 'I-gene': 4}   # 与 2_process_conll_data 一致
+idx2label = {idx: label for label, idx in label2idx.items()}
+
+
+def readIndex(path):
+    '''
+    读取 2_process_conll_data 保存的 pos2idx.txt / chunk2idx.txt（每行 "键\t编号"）
+    '''
+    index = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            key, idx = line.rstrip('\n').split('\t')
+            index[key] = int(idx)
+    return index
+
+
+class MicroBatcher(object):
+    '''
+    将多个线程提交的请求合并为 batch，由调用 run() 的线程统一处理
+    （keras 模型只在加载它的线程中调用）
+    :param handler: 处理一个 batch 的函数，输入请求列表，返回等长的结果列表
+    :param max_batch: 每个 batch 最多的请求数
+    :param max_wait: 收到第一个请求后，等待更多请求的最长时间（秒）
+    '''
+
+    def __init__(self, handler, max_batch=32, max_wait=0.02):
+        self.handler = handler
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = Queue()
+        self.num_batch = 0
+        self.num_request = 0
+
+    def submit(self, request):
+        future = Future()
+        self.queue.put((request, future))
+        return future
+
+    def close(self):
+        self.queue.put(None)
+
+    def _collect(self):
+        item = self.queue.get()
+        if item is None:
+            return None
+        batch = [item]
+        deadline = time.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=timeout)
+            except Empty:
+                break
+            if item is None:
+                self.queue.put(None)    # 处理完当前 batch 后再退出
+                break
+            batch.append(item)
+        return batch
+
+    def run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                break
+            self.num_batch += 1
+            self.num_request += len(batch)
+            try:
+                results = self.handler([request for request, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+
+def embeddingSize(model):
+    '''
+    :return: 单词输入（模型的第一个输入）所接的 Embedding 层的行数，找不到时为 None
+    '''
+    for layer in model.layers:
+        if hasattr(layer, 'input_dim') and getattr(layer, 'input', None) is model.inputs[0]:
+            return layer.input_dim
+    return None
+
+
+class NERService(object):
+    '''
+    原始文本 -> GENIA 分词/词性/chunk -> 字典特征 -> 特征编号 -> 模型 -> BIO 标签
+    :param word_vocab: OOV 策略须为 'unk'：编号 0 是补齐符号，会被 mask，未登录词不能编为 0；
+                       模型的词向量矩阵须包含未登录词的一行（word_vocab.num_ids 行）
+    :param tagger: sample.utils.genia_tagger.TaggingStage
+    :param dic: sample.utils.dict_automaton.DictAutomaton
+    :param fixed_len: 模型的句子长度；为 None 时每个 batch 只补齐到其中最长的句子
+    '''
+
+    def __init__(self, model, tagger, dic, word_vocab, pos2idx, chunk2idx,
+                 maxlen_s=400, maxlen_w=21, fixed_len=None, pad_multiple=8):
+        if word_vocab.oov != 'unk':
+            raise ValueError('单词表的 OOV 策略为 {!r}，未登录词会被编为补齐符号 0 而被 mask，'
+                             '请使用 oov=\'unk\' 的单词表'.format(word_vocab.oov))
+        input_dim = embeddingSize(model)
+        if input_dim is not None and input_dim < word_vocab.num_ids:
+            raise ValueError('模型的词向量矩阵只有 {} 行，单词表需要 {} 行（含未登录词）'.format(
+                input_dim, word_vocab.num_ids))
+        self.model = model
+        self.tagger = tagger
+        self.dic = dic
+        self.word_vocab = word_vocab
+        self.pos2idx = pos2idx
+        self.chunk2idx = chunk2idx
+        self.featurizer = TokenFeaturizer(getCasting, getCastingVocab(), createCharDict(), maxlen_w)
+        self.maxlen_s = fixed_len or maxlen_s
+        self.maxlen_w = maxlen_w
+        self.fixed_len = fixed_len
+        self.pad_multiple = pad_multiple
+
+    def tokenize(self, texts):
+        '''
+        :return: 每个句子的 GENIA 结果 [(word, POS, chunk), ...]
+        '''
+        results = self.tagger.tagSentences([splitPunctuation(text) for text in texts])
+        sentences = []
+        for result in results:
+            tokens = []
+            for line in result.splitlines():
+                splited = line.split('\t')
+                tokens.append((splited[0], splited[2], splited[3]))
+            sentences.append(tokens)
+        return sentences
+
+    def featurize(self, sentences):
+        '''
+        :return: (offsets, 各特征的 token 级数组, 清洗后的单词)，超过 maxlen_s 的句子被截断
+        '''
+        sentences = [tokens[:self.maxlen_s] for tokens in sentences]
+        offsets = np.cumsum([0] + [len(tokens) for tokens in sentences])
+        words = [word for tokens in sentences for word, _, _ in tokens]
+        normalized, cap, chars = self.featurizer.featurize(words)
+        columns = {
+            'words': self.word_vocab.encode(normalized),
+            'chars': chars,
+            'cap': cap,
+            'pos': np.array([self.pos2idx.get(pos, 0) for tokens in sentences for _, pos, _ in tokens], dtype=np.int16),
+            'chunk': np.array([self.chunk2idx.get(chunk, 0) for tokens in sentences for _, _, chunk in tokens], dtype=np.int16),
+            'dict': np.concatenate([self.dic.tagTokens([word for word, _, _ in tokens]) for tokens in sentences]
+                                   + [np.zeros(0, dtype=np.int8)]),
+        }
+        return offsets, columns, normalized
+
+    def batchLen(self, offsets):
+        if self.fixed_len:
+            return self.fixed_len
+        n = int(np.diff(offsets).max())
+        n = -(-n // self.pad_multiple) * self.pad_multiple
+        return max(2, min(n, self.maxlen_s))    # ChainCRF 要求至少 2 个时间步
+
+    def predict(self, texts):
+        '''
+        :return: 每段文本一个 {"tokens": [...], "labels": [...]}
+        '''
+        sentences = self.tokenize(texts)
+        results = [{'tokens': [word for word, _, _ in tokens], 'labels': ['O'] * len(tokens)}
+                   for tokens in sentences]
+        todo = [i for i, tokens in enumerate(sentences) if tokens]
+        if not todo:
+            return results
+
+        offsets, columns, normalized = self.featurize([sentences[i] for i in todo])
+        n = self.batchLen(offsets)
+        inputs = [scatterSentences(offsets, columns[name], n)
+                  for name in ['words', 'chars', 'cap', 'pos', 'chunk', 'dict']]
+        # ELMo 的输入：补齐的位置为 '__PAD__'
+        word_array = np.array([ELMO_PAD] + normalized, dtype=object)
+        inputs.append(word_array[scatterSentences(offsets, np.arange(1, len(normalized) + 1), n)])
+
+        y_pred = self.model.predict_on_batch(inputs).argmax(axis=-1)
+        for k, i in enumerate(todo):
+            length = offsets[k + 1] - offsets[k]
+            results[i]['labels'][:length] = [idx2label[idx] for idx in y_pred[k, :length].tolist()]
+        return results
+
+
+def parseRequest(line):
+    '''
+    JSON 请求须为含 "text" 或 "bioc" 的对象，其他的行（包括以 '{' 开头的纯文本）都作为纯文本
+    :return: (文本列表, 是否为 BioC 文件)
+    '''
+    line = line.rstrip('\n')
+    request = None
+    if line.startswith('{'):
+        try:
+            request = json.loads(line)
+        except ValueError:
+            pass
+    if isinstance(request, dict) and 'bioc' in request:
+        return [passage.text.decode('utf-8') for passage in iterBioC(request['bioc'])], True
+    if isinstance(request, dict) and isinstance(request.get('text'), str):
+        return [request['text']], False
+    return [line], False
+
+
+def handleLine(batcher, line):
+    '''
+    在请求线程中调用：逐个句子提交，等待结果后组装响应
+    '''
+    try:
+        texts, is_bioc = parseRequest(line)
+        results = [future.result() for future in [batcher.submit(text) for text in texts]]
+        response = {'passages': results} if is_bioc else results[0]
+    except Exception as e:
+        response = {'error': repr(e)}
+    return json.dumps(response, ensure_ascii=False)
+
+
+def serveStdin(batcher, fin=sys.stdin, fout=sys.stdout):
+    '''
+    逐行读取请求；每个请求在单独的线程中等待结果，响应按请求的顺序输出
+    '''
+    pending = Queue()
+
+    def read():
+        for line in fin:
+            if line.strip():
+                result = Future()
+                threading.Thread(target=lambda l=line, r=result: r.set_result(handleLine(batcher, l)),
+                                 daemon=True).start()
+                pending.put(result)
+        pending.put(None)
+
+    def write():
+        while True:
+            result = pending.get()
+            if result is None:
+                break
+            fout.write(result.result())
+            fout.write('\n')
+            fout.flush()
+        batcher.close()
+
+    threading.Thread(target=read, daemon=True).start()
+    threading.Thread(target=write, daemon=True).start()
+
+
+def serveSocket(batcher, host='127.0.0.1', port=8765):
+    '''
+    每个连接一个线程，连接内逐行请求/响应；不同连接的请求合并为 batch
+    '''
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                line = line.decode('utf-8')
+                if line.strip():
+                    self.wfile.write((handleLine(batcher, line) + '\n').encode('utf-8'))
+
+    server = socketserver.ThreadingTCPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print('NER 服务已启动：{}:{}'.format(host, port), file=sys.stderr)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', default='model/Model_4_75.00.h5')
+    parser.add_argument('--vocab', default='word_vocab.json')
+    parser.add_argument('--pos', default='pos2idx.txt')
+    parser.add_argument('--chunk', default='chunk2idx.txt')
+    parser.add_argument('--dict', default='/Users/ningshixian/Desktop/bc6_data_big/dict_automaton')
+    parser.add_argument('--genia', default='./geniatagger')
+    parser.add_argument('--genia-cwd', default='/Users/ningshixian/Desktop/BC6_Track1/geniatagger-3.0.2')
+    parser.add_argument('--genia-cache', default='genia_service.cache')
+    parser.add_argument('--genia-processes', type=int, default=1)
+    parser.add_argument('--maxlen', type=int, default=400)
+    parser.add_argument('--max-batch', type=int, default=32)
+    parser.add_argument('--max-wait', type=float, default=0.02, help='等待合并 batch 的最长时间（秒）')
+    parser.add_argument('--stdin', action='store_true')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    import tensorflow as tf
+    from keras.models import load_model
+    from keras.backend.tensorflow_backend import set_session
+    from sample.keraslayers.ChainCRF import create_custom_objects
+    from sample.utils.dict_automaton import DictAutomaton
+    from sample.utils.genia_tagger import TaggingStage
+
+    config = tf.ConfigProto()
+    config.gpu_options.allow_growth = True
+    set_session(tf.Session(config=config))
+
+    model = load_model(args.model, custom_objects=create_custom_objects())
+    tagger = TaggingStage(args.genia.split(), args.genia_cache, processes=args.genia_processes,
+                          cwd=args.genia_cwd)
+    service = NERService(model, tagger, DictAutomaton.load(args.dict), Vocabulary.load(args.vocab),
+                         readIndex(args.pos), readIndex(args.chunk),
+                         maxlen_s=args.maxlen, fixed_len=model.input_shape[0][1])
+    batcher = MicroBatcher(service.predict, args.max_batch, args.max_wait)
+
+    if args.stdin:
+        serveStdin(batcher)
+    else:
+        serveSocket(batcher, args.host, args.port)
+    try:
+        batcher.run()   # 模型在主线程中调用
+    except KeyboardInterrupt:
+        pass
+    finally:
+        tagger.close()
+        print('共 {} 个请求，{} 个 batch'.format(batcher.num_request, batcher.num_batch), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+'''
+    按句子缓存 NER 的预测结果，取代 result/predictions.pkl
+
+    键 = hash(模型文件的 hash, 特征 schema, 句子内容)：
+        模型文件的 hash      换了模型（或重新训练）后旧的结果不会被误用
+        特征 schema          数据集的 schema 版本、各词典的 hash、maxlen_w、句子截断长度或滑动窗口的参数
+        句子内容             该句子各特征列的取值和清洗后的单词
+    值为标签编号（int8）。缓存存放在 sqlite 中，超过 max_bytes 时按最近使用时间淘汰
+'''
+import json
+import time
+import sqlite3
+import hashlib
+import numpy as np
+
+# 句子内容中参与 hash 的列（字符特征和 ELMo 输入由清洗后的单词和 char2idx 决定）
+KEY_COLUMNS = ['words', 'cap', 'pos', 'chunk', 'dict']
+
+
+def sentenceKeys(dataset, model_hash, maxlen=None, window=None, overlap=None):
+    '''
+    :param dataset: sample.utils.dataset.Dataset
+    :param model_hash: 模型文件的 hash（manifest.fileHash）
+    :param maxlen: 句子截断长度，为 None 时为整个句子（滑动窗口）
+    :param window: 滑动窗口的长度和重叠长度（BucketedSequence），影响拼接后的结果
+    :return: 每个句子一个键
+    '''
+    header = dataset.header
+    schema = json.dumps([model_hash, header['schema_version'], header['vocab_hashes'],
+                         header['maxlen_w'], maxlen, window, overlap], sort_keys=True)
+    prefix = hashlib.sha1(schema.encode('utf-8')).digest()
+
+    offsets = np.asarray(dataset.column('offsets'))
+    columns = [np.asarray(dataset.column(name)) for name in KEY_COLUMNS]
+    tokens = np.asarray(dataset.column('tokens'))
+    words = dataset.words
+    keys = []
+    for a, b in zip(offsets[:-1].tolist(), offsets[1:].tolist()):
+        if maxlen is not None:
+            b = min(b, a + maxlen)
+        h = hashlib.sha1(prefix)
+        for column in columns:
+            h.update(column[a:b].tobytes())
+        h.update('\0'.join(words[k] for k in tokens[a:b].tolist()).encode('utf-8'))
+        keys.append(h.hexdigest())
+    return keys
+
+
+class PredictionCache(object):
+    '''
+    :param path: sqlite 文件路径
+    :param max_bytes: 缓存的预测结果总字节数上限，超过后删除最久未使用的，直到低于上限的 90%
+    '''
+
+    def __init__(self, path, max_bytes=1 << 28):
+        self.db = sqlite3.connect(path)
+        self.db.execute('CREATE TABLE IF NOT EXISTS predictions '
+                        '(key TEXT PRIMARY KEY, value BLOB NOT NULL, atime REAL NOT NULL)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS predictions_atime ON predictions (atime)')
+        self.max_bytes = max_bytes
+        self.num_hit = 0
+        self.num_miss = 0
+        self.num_evict = 0
+
+    def get(self, keys, chunk_size=500):
+        '''
+        :return: 与 keys 一一对应的标签编号数组，未缓存的为 None
+        '''
+        found = {}
+        for i in range(0, len(keys), chunk_size):
+            chunk = keys[i:i + chunk_size]
+            rows = self.db.execute('SELECT key, value FROM predictions WHERE key IN ({})'.format(
+                ','.join('?' * len(chunk))), chunk)
+            found.update(rows)
+        if found:
+            now = time.time()
+            self.db.executemany('UPDATE predictions SET atime = ? WHERE key = ?', [(now, key) for key in found])
+            self.db.commit()
+        results = [None if key not in found else np.frombuffer(found[key], dtype=np.int8) for key in keys]
+        self.num_hit += len(found)
+        self.num_miss += len(keys) - len(found)
+        return results
+
+    def put(self, items):
+        '''
+        :param items: 键 -> 标签编号数组
+        '''
+        now = time.time()
+        self.db.executemany('INSERT OR REPLACE INTO predictions VALUES (?, ?, ?)',
+                            [(key, np.asarray(value, dtype=np.int8).tobytes(), now) for key, value in items.items()])
+        self.db.commit()
+        self.evict()
+
+    def evict(self):
+        total, = self.db.execute('SELECT COALESCE(SUM(LENGTH(value)), 0) FROM predictions').fetchone()
+        if total <= self.max_bytes:
+            return
+        target = total - self.max_bytes * 0.9
+        removed = []
+        for key, size in self.db.execute('SELECT key, LENGTH(value) FROM predictions ORDER BY atime'):
+            if target <= 0:
+                break
+            removed.append((key,))
+            target -= size
+        self.db.executemany('DELETE FROM predictions WHERE key = ?', removed)
+        self.db.commit()
+        self.num_evict += len(removed)
+
+    def close(self):
+        self.db.close()
+
+    def __str__(self):
+        return '预测缓存命中：{}，新预测：{}，淘汰：{}'.format(self.num_hit, self.num_miss, self.num_evict)
@@ -0,0 +1,98 @@
+'''
+    冻结的单词表，取代 keras 的 Tokenizer
+
+    build/fromIds 扫描一遍语料得到词频，冻结后不再增长；保存为 JSON（单词、词频、OOV 策略）
+    编号规则与 Tokenizer.word_index 相同：按词频降序，词频相同的按第一次出现的顺序，从 1 开始，0 留给补齐
+    （NED 中硬编码的停用词编号依赖这一顺序）
+    新的文本只需 encode，不用重新拟合单词表、重建词向量矩阵
+
+    OOV 策略：
+        'zero'  未登录词编号为 0，与补齐相同（即原来 word_index.get(word, 0) 的行为）
+        'unk'   未登录词使用单独的编号 len(words) + 1，词向量矩阵需多一行
+'''
+import json
+import numpy as np
+
+SCHEMA_VERSION = 1
+OOV_POLICIES = ('zero', 'unk')
+
+
+class Vocabulary(object):
+
+    def __init__(self, words, counts, oov='zero'):
+        if oov not in OOV_POLICIES:
+            raise ValueError('未知的 OOV 策略：{}'.format(oov))
+        self.words = list(words)
+        self.counts = list(counts)
+        self.oov = oov
+        self.word_index = {word: i + 1 for i, word in enumerate(self.words)}
+        self.oov_id = len(self.words) + 1 if oov == 'unk' else 0
+
+    @classmethod
+    def fromCounts(cls, words, counts, min_count=1, oov='zero'):
+        '''
+        :param words: 按第一次出现的顺序排列的单词
+        :param counts: 对应的词频
+        '''
+        order = sorted(range(len(words)), key=lambda i: -counts[i])     # 稳定排序，词频相同的保持原顺序
+        order = [i for i in order if counts[i] >= min_count and words[i]]
+        return cls([words[i] for i in order], [int(counts[i]) for i in order], oov)
+
+    @classmethod
+    def fromIds(cls, ids, words, min_count=1, oov='zero'):
+        '''
+        由编号序列统计，如 ConllCorpus 的 words 列
+        :param ids: token 在 words 中的编号，按语料顺序排列
+        '''
+        uniq, first, counts = np.unique(ids, return_index=True, return_counts=True)
+        order = np.argsort(first, kind='mergesort')     # 按第一次出现的顺序
+        return cls.fromCounts([words[i] for i in uniq[order].tolist()], counts[order].tolist(), min_count, oov)
+
+    @classmethod
+    def build(cls, sentences, min_count=1, oov='zero'):
+        '''
+        :param sentences: 可迭代的 token 列表，只扫描一遍
+        '''
+        counts = {}
+        for tokens in sentences:
+            for word in tokens:
+                counts[word] = counts.get(word, 0) + 1
+        return cls.fromCounts(list(counts), list(counts.values()), min_count, oov)
+
+    @property
+    def word_counts(self):
+        return dict(zip(self.words, self.counts))
+
+    @property
+    def num_ids(self):
+        '''
+        编号的个数（含补齐和未登录词），即词向量矩阵的行数
+        '''
+        return len(self.words) + (2 if self.oov == 'unk' else 1)
+
+    def __len__(self):
+        return len(self.words)
+
+    def __contains__(self, word):
+        return word in self.word_index
+
+    def encode(self, tokens):
+        '''
+        :return: int32 编号数组
+        '''
+        get, oov_id = self.word_index.get, self.oov_id
+        return np.fromiter((get(word, oov_id) for word in tokens), dtype=np.int32, count=len(tokens))
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'schema_version': SCHEMA_VERSION, 'oov': self.oov,
+                       'words': self.words, 'counts': self.counts}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('schema_version') != SCHEMA_VERSION:
+            raise ValueError('单词表版本 {} 与当前版本 {} 不一致：{}'.format(
+                data.get('schema_version'), SCHEMA_VERSION, path))
+        return cls(data['words'], data['counts'], data['oov'])
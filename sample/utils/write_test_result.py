@@ -8,11 +8,9 @@ import string
 from urllib.error import URLError
 from collections import OrderedDict
 import numpy as np
-import word2vec
 from tqdm import tqdm
 import xml.dom.minidom
 import xml.dom.minidom
-from xml.dom.minidom import parse
 from bioservices import UniProt
 from Bio import Entrez
 from keras.models import load_model
@@ -23,6 +21,8 @@ from keras.preprocessing.sequence import pad_sequences
 from sklearn.preprocessing import StandardScaler
 from sample.utils.helpers import get_stop_dic, pos_surround
 from sample.utils.helpers import makeEasyTag, Indent, postprocess, cos_sim, extract_id_from_res
+from sample.utils.bioc_reader import ET, readBioCHeader, iterBioCDocuments
+from sample.utils.dataset import Dataset
 u = UniProt(cache=True)
 
 # GPU内存分配
@@ -544,12 +544,8 @@ def writeOutputToFile(path, predLabels, ned_model, prob):
     sen_list = get_test_out_data(path)
 
     # 读取测试预料的数据和golden ID
-    with open(root + 'data/test.pkl', "rb") as f:
-        test_x, test_elmo, test_y, test_char, test_cap, test_pos, test_chunk, test_dict = pkl.load(f)
-    with open('/home/administrator/PycharmProjects/embedding/length.pkl', "rb") as f:
-        word_maxlen, sentence_maxlen = pkl.load(f)
-
-    sentence_maxlen = 427
+    test_set = Dataset.open(root + 'data/test_dataset')
+    test_x, test_pos = test_set.sentences('words'), test_set.sentences('pos')
 
     # all_id.txt
     with open(root + 'all_id_elmo.txt', "r") as f:
@@ -629,15 +625,14 @@ def writeOutputToFile(path, predLabels, ned_model, prob):
         if not os.path.isdir(file):  # 判断是否是文件夹，不是文件夹才打开
             f = BioC_path + "/" + file
             try:
-                DOMTree = parse(f)  # 使用minidom解析器打开 XML 文档
-                collection = DOMTree.documentElement  # 得到了根元素对象
-            except:
+                header = readBioCHeader(f)  # 流式读取 collection 的 source/date/key
+            except ET.ParseError:
                 print('异常情况：'.format(f))
                 continue
 
-            source = collection.getElementsByTagName("source")[0].childNodes[0].data
-            date = collection.getElementsByTagName("date")[0].childNodes[0].data  # 时间
-            key = collection.getElementsByTagName("key")[0].childNodes[0].data
+            source = header['source']
+            date = header['date']  # 时间
+            key = header['key']
 
             # 一、生成dom对象，根元素名collection
             impl = xml.dom.minidom.getDOMImplementation()
@@ -653,17 +648,17 @@ def writeOutputToFile(path, predLabels, ned_model, prob):
             root.appendChild(date)
             root.appendChild(key)
 
-            # 在集合中获取所有 document 的内容
-            documents = collection.getElementsByTagName("document")
+            # 逐个读取文件中 document 的内容，读完即释放
             # 一篇文档中的相同实体理应具有县相同的ID?
             SameIdForSameEnt = {}
-            for doc in documents:
-                id = doc.getElementsByTagName("id")[0].childNodes[0].data
-                sourcedata_document = doc.getElementsByTagName("infon")[0].childNodes[0].data
-                doi = doc.getElementsByTagName("infon")[1].childNodes[0].data
-                pmc_id = doc.getElementsByTagName("infon")[2].childNodes[0].data
-                figure = doc.getElementsByTagName("infon")[3].childNodes[0].data
-                sourcedata_figure_dir = doc.getElementsByTagName("infon")[4].childNodes[0].data
+            for doc in iterBioCDocuments(f):
+                id = doc.id
+                infons = [value for _, value in doc.infons]
+                sourcedata_document = infons[0]
+                doi = infons[1]
+                pmc_id = infons[2]
+                figure = infons[3]
+                sourcedata_figure_dir = infons[4]
 
                 document = dom.createElement('document')
                 id_node = makeEasyTag(dom, 'id', str(id))
@@ -686,17 +681,13 @@ def writeOutputToFile(path, predLabels, ned_model, prob):
 
 
 
-                passages = doc.getElementsByTagName("passage")
-                for passage in passages:
-                    text = passage.getElementsByTagName('text')[0].childNodes[0].data
-                    text_byte = text.encode('utf-8')
-                    annotations = passage.getElementsByTagName('annotation')
+                for passage in doc.passages:
+                    text_byte = passage.text
+                    text = text_byte.decode('utf-8')
                     entity2golden = {}
-                    for annotation in annotations:
-                        info = annotation.getElementsByTagName("infon")[0]
-                        ID = info.childNodes[0].data
-                        txt = annotation.getElementsByTagName("text")[0]
-                        entity = txt.childNodes[0].data
+                    for annotation in passage.annotations:
+                        ID = annotation.type
+                        entity = annotation.text
                         if ID.startswith('gene') or ID.startswith('protein') or ID.startswith(
                                 'Uniprot') or ID.startswith('NCBI'):
                             a = strippingAlgorithm(entity)[0]
@@ -705,8 +696,11 @@ def writeOutputToFile(path, predLabels, ned_model, prob):
                     '''每读取一篇passage，在<annotation>结点记录识别实体'''
                     idx_line += 1
                     annotation_list = []
-                    sentence = sen_list[idx_line][:sentence_maxlen]  # 单词列表形成的句子
+                    if idx_line >= len(predLabels):
+                        raise ValueError('第 {} 个 passage 没有预测结果（共 {} 个）'.format(idx_line, len(predLabels)))
                     prediction = predLabels[idx_line]
+                    # 单词列表形成的句子，截断到预测结果的长度（滑动窗口预测时为整个句子）
+                    sentence = sen_list[idx_line][:len(prediction)]
 
                     # 根据预测结果来抽取句子中的所有实体，并进行实体链接
                     result = searchEntityId(sentence, prediction, entity2id, text_byte)
@@ -880,6 +874,8 @@ def writeOutputToFile(path, predLabels, ned_model, prob):
 
     print('exit:{}, not_exit:{}'.format(exit, not_exit))  # exit:5440, not_exit:3131
     print('num_match:{}, not_find:{}'.format(num_match, not_find))  # num_match:3784, not_find:1744
+    if idx_line + 1 != len(predLabels):
+        raise ValueError('passage 个数 {} 与预测结果个数 {} 不一致'.format(idx_line + 1, len(predLabels)))
     print('测试集预测结果写入成功！')
     print('{}个词未找到对应的ID'.format(num_entity_no_id))  # 751
     print('{}个词有歧义'.format(len(words_with_multiId)))  # 1654
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+from .context import sample
+
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from sample.utils.dataset import Dataset, ELMO_PAD
+from sample.benchmarks import bench_bucketing
+
+try:
+    from sample.utils.batching import BucketedSequence, predictBucketed, makeWindows
+except ImportError:     # 没有 keras
+    BucketedSequence = None
+
+
+class TokenModel(object):
+    '''
+    每个位置的输出只取决于该位置的单词编号：words % 5；同时检查各输入的形状一致
+    '''
+
+    def __init__(self):
+        self.shapes = set()
+
+    def predict_on_batch(self, inputs):
+        words = inputs[0]
+        assert all(x.shape[:2] == words.shape for x in inputs)
+        self.shapes.add(words.shape)
+        y = np.zeros(words.shape + (5,), dtype=np.float32)
+        y[np.arange(words.shape[0])[:, None], np.arange(words.shape[1]), words % 5] = 1
+        return y
+
+
+def makeDataset(path, lengths, seed=1337):
+    rng = np.random.RandomState(seed)
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    n = int(offsets[-1])
+    columns = {name: rng.randint(1, 5, n).astype(np.int8) for name in ['labels', 'cap', 'pos', 'chunk', 'dict']}
+    columns['words'] = rng.randint(1, 1000, n).astype(np.int32)
+    columns['tokens'] = columns['words'].copy()
+    words = ['w{}'.format(i) for i in range(1000)]
+    Dataset.save(path, columns, offsets, words, np.zeros((1000, 4), dtype=np.int16), 455, {})
+    return Dataset.open(path)
+
+
+@unittest.skipIf(BucketedSequence is None, 'keras is not installed')
+class BatchingTestSuite(unittest.TestCase):
+    """restore() returns one prediction per sentence, in order, in every mode."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        rng = np.random.RandomState(0)
+        cls.lengths = np.concatenate([rng.randint(0, 60, 300), rng.randint(120, 600, 30), [0, 1, 128, 129, 161]])
+        cls.dataset = makeDataset(cls.tmp + '/dataset', cls.lengths)
+        cls.words = cls.dataset.sentences('words')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp)
+
+    def check(self, sequence, maxlen=None, indices=None):
+        model = TokenModel()
+        result = predictBucketed(model, sequence)
+        indices = range(len(self.lengths)) if indices is None else indices
+        for i in range(len(self.lengths)):
+            if i not in indices:
+                self.assertIsNone(result[i])
+                continue
+            np.testing.assert_array_equal(result[i], self.words[i][:maxlen] % 5)
+        return model
+
+    def test_fixed(self):
+        model = self.check(BucketedSequence(self.dataset, 32, fixed_len=200, pad_batches=True), maxlen=200)
+        self.assertEqual(model.shapes, {(32, 200)})
+
+    def test_bucketed(self):
+        model = self.check(BucketedSequence(self.dataset, 32, maxlen_s=400), maxlen=400)
+        self.assertGreater(len(model.shapes), 1)
+        indices = [0, 5, 301, 333, 334]
+        self.check(BucketedSequence(self.dataset, 4, maxlen_s=400, indices=indices), maxlen=400, indices=indices)
+
+    def test_windowed(self):
+        for fixed_len in [None, 128]:
+            sequence = BucketedSequence(self.dataset, 32, fixed_len=fixed_len, pad_batches=fixed_len is not None,
+                                        window=128, overlap=32)
+            self.assertEqual(int(sequence.unit_len.max()), 128)
+            self.check(sequence)
+        indices = [2, 320, 334]
+        self.check(BucketedSequence(self.dataset, 8, window=64, overlap=16, indices=indices), indices=indices)
+
+    def test_padded_rows(self):
+        sequence = BucketedSequence(self.dataset, 32, fixed_len=200, pad_batches=True, num_classes=5)
+        inputs, y = sequence[len(sequence) - 1]
+        num = len(sequence.batches[-1])
+        self.assertEqual(y.shape, (32, 200, 5))
+        self.assertTrue((inputs[0][num:] == 0).all())
+        self.assertTrue((inputs[-1][num:] == ELMO_PAD).all())
+
+    def test_make_windows(self):
+        sen, start, length = makeWindows([0, 1, 128, 129, 300], 128, 32)
+        self.assertEqual(sen.tolist(), [0, 1, 2, 3, 3, 4, 4, 4])
+        self.assertEqual(start.tolist(), [0, 0, 0, 0, 1, 0, 96, 172])
+        self.assertEqual(length.tolist(), [0, 1, 128, 128, 128, 128, 128, 128])
+
+    def test_stitch_at_overlap_midpoint(self):
+        # 输出为窗口内的位置：拼接后可以看出每个 token 取自哪个窗口
+        class PositionModel(object):
+            def predict_on_batch(self, inputs):
+                n = inputs[0].shape[1]
+                y = np.zeros(inputs[0].shape + (n,), dtype=np.float32)
+                y[:, np.arange(n), np.arange(n)] = 1
+                return y
+
+        i = int(np.flatnonzero(self.lengths == 161)[0])
+        sequence = BucketedSequence(self.dataset, 4, window=128, overlap=32, indices=[i])
+        self.assertEqual(sequence.unit_start.tolist(), [0, 33])
+        result = predictBucketed(PositionModel(), sequence)[i]
+        cut = (33 + 128) // 2
+        self.assertEqual(result.tolist(), list(range(cut)) + list(range(cut - 33, 128)))
+
+
+class NullModel(object):
+    '''
+    只检查输入输出的形状，用于不依赖 keras 模型运行 bench_bucketing.run
+    '''
+
+    def train_on_batch(self, x, y):
+        assert y.shape == x.shape + (5,)
+
+    def predict_on_batch(self, x):
+        return np.zeros(x.shape + (5,), dtype=np.float32)
+
+
+@unittest.skipIf(BucketedSequence is None, 'keras is not installed')
+class BenchBucketingTestSuite(unittest.TestCase):
+    """bench_bucketing runs end to end and bucketing pads less than fixed_len."""
+
+    def test_pad_ratio(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            dataset = bench_bucketing.makeDataset(tmp + '/dataset', 500, num_words=100)
+            fixed = BucketedSequence(dataset, 32, features=['words'], num_classes=5, fixed_len=400)
+            bucketed = BucketedSequence(dataset, 32, maxlen_s=400, features=['words'], num_classes=5, shuffle=True)
+            ratios = {}
+            for name, sequence in [('fixed', fixed), ('bucketed', bucketed)]:
+                for train in [True, False]:
+                    speed, ratios[name] = bench_bucketing.run(NullModel(), sequence, len(sequence), train)
+                    self.assertGreater(speed, 0)
+            self.assertGreater(ratios['fixed'], 0.8)
+            self.assertLess(ratios['bucketed'], ratios['fixed'] / 2)
+        finally:
+            shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    unittest.main()
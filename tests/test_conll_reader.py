@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+
+from .context import sample
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from sample.utils.conll_reader import ConllVocab, TokenFeaturizer, readConll, scatterSentences, gatherSentences
+from sample.utils.dataset import Dataset
+from sample.utils.helpers import createCharDict, getCasting, getCastingVocab, wordNormalize
+
+label2idx = {'O': 0, 'B-protein': 1, 'I-protein': 2, 'B-gene': 3, 'I-gene': 4}
+dict2idx = {'O': 0, 'B': 1, 'I': 2}
+
+
+def randomOffsets(rng, num, maxlen=12):
+    return np.cumsum([0] + [rng.randint(0, maxlen) for _ in range(num)]).astype(np.int64)
+
+
+class ConllReaderTestSuite(unittest.TestCase):
+    """readConll produces the same sentences as a line-by-line parse."""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_read(self):
+        rng = random.Random(1337)
+        words = ['MDM2', 'binds', 'p53', '.', 'Actin', '(', 'ACTB', ')']
+        sentences = [[(rng.choice(words), rng.choice(['NN', 'VBZ', '.']), rng.choice(['B-NP', 'O']),
+                       rng.choice(list(dict2idx)), rng.choice(list(label2idx)))
+                      for _ in range(rng.randint(1, 9))] for _ in range(30)]
+        path = os.path.join(self.tmp, 'test.final.txt')
+        with open(path, 'w', encoding='utf-8') as f:
+            for sen in sentences:
+                for token in sen:
+                    f.write('\t'.join(token) + '\n')
+                f.write('\n')
+
+        maxlen_s = 6
+        vocab = ConllVocab(createCharDict(), getCasting, getCastingVocab(), {'None': 0}, {'None': 0},
+                           dict2idx, label2idx)
+        corpus = readConll(path, vocab, maxlen_s)
+        self.assertEqual(len(corpus), len(sentences))
+        self.assertEqual(corpus.lengths.tolist(), [len(sen) for sen in sentences])
+        for i, sen in enumerate(sentences):
+            sen = sen[:maxlen_s]
+            self.assertEqual([vocab.word_list[k] for k in corpus.sentence('words', i)],
+                             [vocab.featurizer(token[0])[0] for token in sen])
+            self.assertEqual(corpus.sentence('pos', i).tolist(), [vocab.pos2idx[token[1]] for token in sen])
+            self.assertEqual(corpus.sentence('dict', i).tolist(), [dict2idx[token[3]] for token in sen])
+            self.assertEqual(corpus.sentence('labels', i).tolist(), [label2idx[token[4]] for token in sen])
+
+        # maxlen_s 为 None 时不截断
+        full = readConll(path, vocab, None)
+        self.assertEqual(np.diff(full.offsets).tolist(), [len(sen) for sen in sentences])
+
+
+def oldCharTensor(sentences, char2idx, maxlen_s, maxlen_w):
+    '''
+    原来的字符特征：逐个字符查 char2idx，每个句子截断到 maxlen_s，
+    padCharacters 把每个词补齐/截断到 maxlen_w，句子再在句尾补齐到 maxlen_s
+    '''
+    def padCharacters(chars_dic, max_char):
+        for senIdx in range(len(chars_dic)):
+            for tokenIdx in range(len(chars_dic[senIdx])):
+                token = chars_dic[senIdx][tokenIdx]
+                lenth = max_char - len(token)
+                if lenth >= 0:
+                    chars_dic[senIdx][tokenIdx] = np.pad(token, (0, lenth), 'constant')
+                else:
+                    chars_dic[senIdx][tokenIdx] = token[:max_char]
+        return chars_dic
+
+    chars = []
+    for sen in sentences:
+        char_sen = []
+        for word in sen:
+            char_w = []
+            for char in wordNormalize(word):
+                charIdx = char2idx.get(char)
+                char_w.append(charIdx if charIdx else char2idx['**'])
+            char_sen.append(char_w)
+        chars.append(char_sen[:maxlen_s])
+    chars = padCharacters(chars, maxlen_w)
+
+    tensor = np.zeros((len(sentences), maxlen_s, maxlen_w), dtype=np.int16)
+    for i, char_sen in enumerate(chars):
+        for j, char_w in enumerate(char_sen):
+            tensor[i, j] = char_w
+    return tensor
+
+
+class CharTensorTestSuite(unittest.TestCase):
+    """The char-table gather matches the per-character padCharacters output."""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_random(self):
+        rng = random.Random(1337)
+        alphabet = 'abcXYZ019-()/.,"+' + 'αβé–²µ'   # 含 char2idx 中没有的字符和非 ASCII 字符
+        maxlen_s, maxlen_w = 7, 5
+        vocab = ConllVocab(createCharDict(), getCasting, getCastingVocab(), {'None': 0}, {'None': 0},
+                           dict2idx, label2idx)
+        sentences = [['p53']]   # 第一个句子不为空
+        for _ in range(200):
+            # 空句子、不超过/超过 maxlen_s 的句子；单词长度从 1 到远超 maxlen_w
+            length = rng.choice([0, 1, rng.randint(2, maxlen_s), maxlen_s, maxlen_s + 1, rng.randint(10, 30)])
+            sentences.append([''.join(rng.choice(alphabet) for _ in range(rng.choice([1, 3, maxlen_w, maxlen_w + 1,
+                                                                                      rng.randint(8, 40)])))
+                              for _ in range(length)])
+        path = os.path.join(self.tmp, 'test.final.txt')
+        with open(path, 'w', encoding='utf-8') as f:
+            for sen in sentences:
+                for word in sen:
+                    f.write('\t'.join([word, 'NN', 'O', 'O', 'O']) + '\n')
+                f.write('\n')
+
+        corpus = readConll(path, vocab, None)
+        self.assertEqual(corpus.lengths.tolist(), [len(sen) for sen in sentences])
+        columns = dict(corpus.columns)
+        columns['tokens'] = corpus.columns['words']
+        Dataset.save(os.path.join(self.tmp, 'dataset'), columns, corpus.offsets, vocab.word_list,
+                     vocab.charTable(maxlen_w), maxlen_s, {})
+        dataset = Dataset.open(os.path.join(self.tmp, 'dataset'))
+
+        expected = oldCharTensor(sentences, vocab.char2idx, maxlen_s, maxlen_w)
+        np.testing.assert_array_equal(dataset.charTensor(), expected)
+        np.testing.assert_array_equal(dataset.charTensor(5, 50), expected[5:50])
+        # 按 batch 取（分桶/预测用的路径），补齐到 batch 中的长度
+        indices = np.array(rng.sample(range(len(sentences)), 32))
+        chars, = dataset.batch(indices, maxlen_s, ['chars'])
+        np.testing.assert_array_equal(chars, expected[indices])
+        chars, = dataset.batch(indices, 4, ['chars'])
+        np.testing.assert_array_equal(chars, oldCharTensor([sentences[i] for i in indices], vocab.char2idx, 4, maxlen_w))
+
+
+class ScatterGatherTestSuite(unittest.TestCase):
+    """scatterSentences / gatherSentences agree with per-sentence loops."""
+
+    def test_scatter(self):
+        rng = random.Random(1337)
+        for _ in range(50):
+            offsets = randomOffsets(rng, rng.randint(0, 10))
+            values = np.arange(1, offsets[-1] + 1, dtype=np.int32)
+            maxlen = rng.randint(1, 10)
+            expected = np.zeros((len(offsets) - 1, maxlen), dtype=np.int32)
+            for i, (a, b) in enumerate(zip(offsets[:-1], offsets[1:])):
+                n = min(b - a, maxlen)
+                expected[i, :n] = values[a:a + n]
+            np.testing.assert_array_equal(scatterSentences(offsets, values, maxlen), expected)
+
+    def test_gather(self):
+        rng = random.Random(42)
+        for _ in range(50):
+            offsets = randomOffsets(rng, rng.randint(1, 10))
+            num = len(offsets) - 1
+            indices = np.array([rng.randrange(num) for _ in range(rng.randint(0, 6))], dtype=np.int64)
+            starts = np.array([rng.randint(0, offsets[i + 1] - offsets[i]) for i in indices], dtype=np.int64)
+            maxlen = rng.randint(1, 10)
+            row, col, tok = gatherSentences(offsets, indices, maxlen, starts)
+            expected = [(r, c, offsets[i] + s + c) for r, (i, s) in enumerate(zip(indices, starts))
+                        for c in range(min(offsets[i + 1] - offsets[i] - s, maxlen))]
+            self.assertEqual(list(zip(row.tolist(), col.tolist(), tok.tolist())),
+                             [tuple(int(x) for x in e) for e in expected])
+
+
+class TokenFeaturizerTestSuite(unittest.TestCase):
+    """TokenFeaturizer caches per raw word with LRU eviction and counts hits/misses."""
+
+    def featurizer(self, **kwargs):
+        return TokenFeaturizer(getCasting, getCastingVocab(), createCharDict(), **kwargs)
+
+    def test_lru(self):
+        featurizer = self.featurizer(maxsize=2)
+        for word in ['MDM2', 'p53', 'MDM2', 'Actin']:   # 'Actin' 淘汰最久未使用的 'p53'
+            featurizer(word)
+        self.assertEqual(list(featurizer.cache), ['MDM2', 'Actin'])
+        self.assertEqual((featurizer.num_hit, featurizer.num_miss, featurizer.num_evict), (1, 3, 1))
+
+        featurizer('p53')   # 重新计算，淘汰 'MDM2'
+        self.assertEqual(list(featurizer.cache), ['Actin', 'p53'])
+        self.assertEqual((featurizer.num_hit, featurizer.num_miss, featurizer.num_evict), (1, 4, 2))
+        featurizer('Actin')
+        self.assertEqual(list(featurizer.cache), ['p53', 'Actin'])
+        self.assertEqual((featurizer.num_hit, featurizer.num_miss, featurizer.num_evict), (2, 4, 2))
+        self.assertIn('命中 2/6', str(featurizer))
+
+    def test_entries(self):
+        char2idx = createCharDict()
+        featurizer = self.featurizer(maxlen_w=4)
+        for word in ['MDM2', 'p53', 'Interleukin-2', '1.5', 'IL-2']:
+            for _ in range(2):  # 第二次取自缓存
+                normalized, cap, chars = featurizer(word)
+                self.assertEqual(normalized, wordNormalize(word))
+                self.assertEqual(cap, getCastingVocab()[getCasting(word)])
+                self.assertEqual(chars.tolist(), [char2idx.get(c, char2idx['**']) for c in normalized[:4]])
+        words, cap, chars = featurizer.featurize(['p53', 'Interleukin-2'])
+        self.assertEqual(chars.shape, (2, 4))
+        self.assertEqual(chars[0, 3], 0)
+
+    def test_without_chars(self):
+        featurizer = self.featurizer(chars=False)
+        self.assertIsNone(featurizer('MDM2')[2])
+        self.assertEqual(featurizer('MDM2')[:2], self.featurizer()('MDM2')[:2])
+        with self.assertRaises(ValueError):
+            featurizer.featurize(['MDM2'])
+
+
+if __name__ == '__main__':
+    unittest.main()
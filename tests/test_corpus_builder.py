@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+from .context import sample
+
+import gzip
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from sample.utils.corpus_builder import BloomFilter, buildCorpus, lineHash
+
+
+def writeMedline(path, articles):
+    '''
+    articles: [(标题, [摘要段落, ...]), ...]
+    '''
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        f.write('<PubmedArticleSet>\n')
+        for title, abstracts in articles:
+            f.write('<PubmedArticle><MedlineCitation><Article><ArticleTitle>{}</ArticleTitle><Abstract>'.format(title))
+            for abstract in abstracts:
+                f.write('<AbstractText>{}</AbstractText>'.format(abstract))
+            f.write('</Abstract></Article></MedlineCitation></PubmedArticle>\n')
+        f.write('</PubmedArticleSet>\n')
+
+
+class BloomFilterTestSuite(unittest.TestCase):
+    """BloomFilter.add agrees with a set when the filter is large enough."""
+
+    def test_against_set(self):
+        rng = random.Random(1337)
+        lines = ['line {}'.format(rng.randint(0, 3000)) for _ in range(10000)]
+        bloom = BloomFilter(1 << 20)
+        seen = set()
+        new = []
+        for start in range(0, len(lines), 777):
+            new.extend(bloom.add([lineHash(line) for line in lines[start:start + 777]]).tolist())
+        for line, is_new in zip(lines, new):
+            self.assertEqual(is_new, line not in seen)
+            seen.add(line)
+        self.assertEqual(bloom.num_added, len(seen))
+
+    def test_duplicates_in_batch(self):
+        bloom = BloomFilter(1 << 10)
+        self.assertEqual(bloom.add([lineHash('a'), lineHash('b'), lineHash('a')]).tolist(), [True, True, False])
+        self.assertEqual(bloom.add([lineHash('b'), lineHash('c')]).tolist(), [False, True])
+        self.assertEqual(bloom.add([]).tolist(), [])
+
+    def test_saturated(self):
+        # 所有位都为 1 时，任何元素都被当作已出现（只会误判为重复，不会漏掉重复）
+        bloom = BloomFilter(8, num_hashes=3)
+        bloom.bits[:] = 0xff
+        self.assertEqual(bloom.add([lineHash('x')]).tolist(), [False])
+
+
+class BuildCorpusTestSuite(unittest.TestCase):
+    """buildCorpus keeps the first occurrence of each line, in shard order."""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_build(self):
+        rng = random.Random(1337)
+        sentences = ['IL-{} binds receptor {}'.format(rng.randint(0, 50), rng.randint(0, 5)) for _ in range(300)]
+        xml_paths, expected_lines = [], []
+        for k in range(5):
+            articles = [(rng.choice(sentences), [rng.choice(sentences) for _ in range(rng.randint(0, 3))])
+                        for _ in range(40)]
+            path = os.path.join(self.tmp, 'medline{}.xml.gz'.format(k))
+            writeMedline(path, articles)
+            xml_paths.append(path)
+            for title, abstracts in articles:
+                expected_lines.extend([title] + abstracts)
+        extra = os.path.join(self.tmp, 'train_raw.txt')
+        with open(extra, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(rng.choice(sentences) + ' ' for _ in range(50)) + '\n\nnew sentence\n')
+        with open(extra, encoding='utf-8') as f:
+            expected_lines.extend(line.strip() for line in f if line.strip())
+        expected = list(dict.fromkeys(expected_lines))
+
+        paths = buildCorpus(xml_paths, os.path.join(self.tmp, 'out'), extra_paths=[extra], processes=2,
+                            shard_bytes=2000, max_pending=2, bloom_bits=1 << 20, chunk_size=7)
+        lines = []
+        for path in paths:
+            with open(path, encoding='utf-8') as f:
+                lines.extend(f.read().split('\n')[:-1])
+        self.assertEqual(lines, expected)
+        self.assertGreater(len(paths), 1)
+        self.assertEqual(sorted(os.listdir(os.path.join(self.tmp, 'out'))), sorted(os.path.basename(p) for p in paths))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+from .context import sample
+
+import random
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from sample.utils.dict_automaton import DictAutomaton
+
+
+def bruteQuery(words, text):
+    words = set(w.lower() for w in words if w)
+    return sorted(((s, e), text[s:e]) for s in range(len(text)) for e in range(s + 1, len(text) + 1)
+                  if text[s:e] in words)
+
+
+def randomWords(rng, n, alphabet='abc -'):
+    return [''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 5))) for _ in range(n)]
+
+
+class DictQueryTestSuite(unittest.TestCase):
+    """DictAutomaton.query finds the same matches as brute force."""
+
+    def test_examples(self):
+        dic = DictAutomaton.build(['he', 'She', 'his', 'hers'])
+        self.assertEqual(sorted(dic.query('ushers')), [((1, 4), 'she'), ((2, 4), 'he'), ((2, 6), 'hers')])
+        self.assertEqual(dic.query(''), [])
+        self.assertEqual(DictAutomaton.build([]).query('abc'), [])
+
+    def test_random(self):
+        rng = random.Random(1337)
+        for _ in range(300):
+            words = randomWords(rng, rng.randint(1, 30))
+            text = ''.join(rng.choice('abc -') for _ in range(rng.randint(0, 40)))
+            self.assertEqual(sorted(DictAutomaton.build(words).query(text)), bruteQuery(words, text), (words, text))
+
+    def test_load_mmap(self):
+        rng = random.Random(7)
+        words = randomWords(rng, 200, 'abcdeαβ')
+        text = ''.join(rng.choice('abcdeαβ ') for _ in range(500))
+        tmp = tempfile.mkdtemp()
+        try:
+            DictAutomaton.build(words).save(tmp)
+            self.assertEqual(sorted(DictAutomaton.load(tmp).query(text)), bruteQuery(words, text))
+        finally:
+            shutil.rmtree(tmp)
+
+
+def bruteTagTokens(words, tokens):
+    '''
+    从左到右，每次取从当前 token 开始、与 token 边界对齐的最长匹配
+    '''
+    words = set(w.lower() for w in words if w)
+    tokens = [t.lower() for t in tokens]
+    tags = [0] * len(tokens)
+    i = 0
+    while i < len(tokens):
+        ends = [j for j in range(i + 1, len(tokens) + 1) if ' '.join(tokens[i:j]) in words]
+        if ends:
+            j = max(ends)
+            tags[i:j] = [1] + [2] * (j - i - 1)
+            i = j
+        else:
+            i += 1
+    return tags
+
+
+class DictTagTokensTestSuite(unittest.TestCase):
+    """DictAutomaton.tagTokens agrees with brute-force longest matching."""
+
+    def test_examples(self):
+        dic = DictAutomaton.build(['p53', 'tumor protein p53', 'protein', 'MDM2'])
+        tags = dic.tagTokens(['Tumor', 'protein', 'p53', 'binds', 'mdm2', 'proteins'])
+        self.assertEqual(tags.dtype, np.int8)
+        self.assertEqual(tags.tolist(), [1, 2, 2, 0, 1, 0])
+        self.assertEqual(dic.tagTokens([]).tolist(), [])
+
+    def test_random(self):
+        rng = random.Random(1337)
+        for _ in range(300):
+            vocab = randomWords(rng, 6, 'abc')
+            words = [' '.join(rng.choice(vocab) for _ in range(rng.randint(1, 3))) for _ in range(rng.randint(1, 10))]
+            words += randomWords(rng, 3, 'abc')     # 可能只匹配 token 的一部分
+            tokens = [rng.choice(vocab).upper() if rng.random() < 0.2 else rng.choice(vocab)
+                      for _ in range(rng.randint(0, 15))]
+            self.assertEqual(DictAutomaton.build(words).tagTokens(tokens).tolist(), bruteTagTokens(words, tokens),
+                             (words, tokens))
+
+
+if __name__ == '__main__':
+    unittest.main()
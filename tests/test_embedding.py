@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+from .context import sample
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from sample.utils.embedding import loadTxtEmbeddings, _byteRanges
+
+
+def serialRead(path, vocab=None):
+    '''
+    逐行读取文本格式的词向量文件：跳过首行 "词数 维度"，小写后重复的词以最后出现的为准
+    '''
+    index, rows = {}, {}
+    with open(path, encoding='utf-8') as f:
+        for i, line in enumerate(f):
+            parts = line.split()
+            if not parts or (i == 0 and len(parts) == 2):
+                continue
+            word = parts[0].lower()
+            if vocab is not None and word not in vocab:
+                continue
+            index.setdefault(word, len(index))
+            rows[word] = np.array(parts[1:], dtype=np.float32)
+    return index, rows
+
+
+class TxtEmbeddingTestSuite(unittest.TestCase):
+    """The multiprocess byte-range reader matches a serial line-by-line read."""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        rng = random.Random(1337)
+        alphabet = 'abcdeABCDE-αβé'
+        self.words = [''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 12))) for _ in range(300)]
+        self.words += ['ABC', 'abc', 'Abc']     # 小写后重复
+        self.dim = 7
+        self.lines = ['{} {}'.format(word, ' '.join('{:.4f}'.format(rng.uniform(-1, 1)) for _ in range(self.dim)))
+                      for word in self.words]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write(self, name, header=False, newline='\n'):
+        path = os.path.join(self.tmp, name)
+        lines = (['{} {}'.format(len(self.lines), self.dim)] if header else []) + self.lines
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            f.write(newline.join(lines) + newline)
+        return path
+
+    def assertSameAsSerial(self, path, vocab=None, processes=3):
+        index, matrix = loadTxtEmbeddings(path, vocab, processes=processes)
+        expected, rows = serialRead(path, vocab)
+        self.assertEqual(index, expected)
+        self.assertEqual(matrix.shape, (len(expected), self.dim))
+        for word, i in index.items():
+            np.testing.assert_array_equal(matrix[i], rows[word])
+
+    def test_byte_ranges(self):
+        # 边界落在记录中间时对齐到下一行的行首，各段首尾相接、覆盖整个文件
+        path = self.write('emb.txt', header=True)
+        with open(path, 'rb') as f:
+            data = f.read()
+        for num_chunks in [1, 2, 7, 64, len(data)]:
+            ranges = _byteRanges(path, num_chunks)
+            self.assertEqual(ranges[0][1], 0)
+            self.assertEqual(ranges[-1][2], len(data))
+            for (_, a, b), (_, c, _) in zip(ranges, ranges[1:]):
+                self.assertEqual(b, c)
+                self.assertEqual(data[b - 1:b], b'\n')
+
+    def test_split_records(self):
+        # 每个进程 4 段，段数多于行数的一部分：大部分边界都落在记录中间
+        path = self.write('emb.txt')
+        for processes in [1, 2, 5]:
+            self.assertSameAsSerial(path, processes=processes)
+
+    def test_header(self):
+        self.assertSameAsSerial(self.write('emb.vec', header=True))
+
+    def test_crlf(self):
+        self.assertSameAsSerial(self.write('emb_crlf.txt', header=True, newline='\r\n'))
+
+    def test_vocab(self):
+        vocab = set(word.lower() for word in self.words[::3]) | {'abc', 'missing'}
+        self.assertSameAsSerial(self.write('emb.txt', newline='\r\n'), vocab)
+
+
+if __name__ == '__main__':
+    unittest.main()
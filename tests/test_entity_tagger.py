@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+
+from .context import sample
+
+import random
+import unittest
+
+from sample.utils.entity_tagger import resolveNested, tagEntities
+
+B_tag = ['B‐^', 'B‐^^']
+I_tag = ['^‐I', '^^‐I']
+
+
+def oldTagEntities(sentence_byte, spans):
+    '''
+    原来的实现：按 offset 从后往前，每个实体重新解码/拼接/编码一次整个句子
+    '''
+    tmp = sentence_byte
+    for offset, length, k in sorted(spans, key=lambda x: x[0], reverse=True):
+        if isinstance(tmp, str):
+            tmp = tmp.encode('utf-8')
+        left = tmp[:offset].decode('utf-8', errors='ignore')
+        mid = tmp[offset:offset + length].decode('utf-8', errors='ignore')
+        right = tmp[offset + length:].decode('utf-8', errors='ignore')
+        tmp = left + ' ' + B_tag[k] + mid + I_tag[k] + ' ' + right
+        tmp = tmp.replace('   ', ' ').replace('  ', ' ')
+    if isinstance(tmp, bytes):
+        tmp = tmp.decode('utf-8')
+    return ' '.join(tmp.split())
+
+
+def randomText(rng, alphabet, maxlen):
+    '''
+    不含连续空格：原来的实现每次都在整个句子上合并连续空格，会使前面实体的 offset 错位
+    '''
+    text = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, maxlen)))
+    while '  ' in text:
+        text = text.replace('  ', ' ')
+    return text
+
+
+def randomSpans(rng, text, max_spans=5):
+    '''
+    互不交叉、互不嵌套的实体（允许首尾相接），offset 为字符边界处的字节偏移（BioC 的 offset 总是如此）
+    '''
+    bounds = [len(text[:i].encode('utf-8')) for i in range(len(text) + 1)]
+    cuts = sorted(rng.sample(bounds, min(len(bounds), 2 * rng.randint(0, max_spans))))
+    return [(a, b - a, rng.randint(0, 1)) for a, b in zip(cuts[::2], cuts[1::2]) if b > a]
+
+
+def anySpans(rng, text, max_spans=5):
+    '''
+    任意的实体（可交叉、嵌套或完全相同），offset 为字符边界处的字节偏移
+    '''
+    bounds = [len(text[:i].encode('utf-8')) for i in range(len(text) + 1)]
+    spans = []
+    for _ in range(rng.randint(0, max_spans)):
+        a, b = sorted(rng.sample(bounds, 2)) if len(bounds) > 1 else (0, 0)
+        spans.append((a, b - a, rng.randint(0, 1)))
+    if spans and rng.random() < 0.3:
+        spans.extend([rng.choice(spans)] * rng.randint(1, 2))   # 完全相同的实体
+    return spans
+
+
+def markerPositions(tagged):
+    '''
+    去掉标签后的文本，以及每个标签插入处的字符下标 [(下标, 标签), ...]
+    '''
+    markers = sorted([' ' + tag for tag in B_tag] + [tag + ' ' for tag in I_tag], key=len, reverse=True)
+    text, positions = [], []
+    i = 0
+    while i < len(tagged):
+        marker = next((m for m in markers if tagged.startswith(m, i)), None)
+        if marker is None:
+            text.append(tagged[i])
+            i += 1
+        else:
+            positions.append((len(text), marker))
+            i += len(marker)
+    return ''.join(text), positions
+
+
+def xx(entity):
+    return entity.startswith(('NCBI gene:', 'Uniprot:', 'gene:', 'protein:'))
+
+
+def oldResolveNested(records):
+    '''
+    原来的实现：两两比较 start/end 相同的实体，再从按 offset 逆序排列的列表中逐个 pop
+    :return: 保留下来的记录，None 表示某个实体参与了多对冲突（原来的实现在这种情况下出错）
+    '''
+    records = sorted(records, key=lambda x: x[0], reverse=True)
+    pairs = [(i, j) for i in range(len(records)) for j in range(i + 1, len(records))
+             if records[i][0] == records[j][0] or records[i][1] == records[j][1]]
+    if len(set(k for pair in pairs for k in pair)) != 2 * len(pairs):
+        return None
+    remove = []
+    for i, j in pairs:
+        (s1, e1, id1, _), (s2, e2, id2, _) = records[i], records[j]
+        if xx(id1) and not xx(id2):
+            remove.append(j)
+        elif not xx(id1) and xx(id2):
+            remove.append(i)
+        else:
+            remove.append(j if e1 - s1 > e2 - s2 else i)
+    return [r for k, r in enumerate(records) if k not in remove]
+
+
+def bruteContained(records):
+    '''
+    contained=True 的定义：与 rank 更高的实体 start/end 相同，或被其他实体完全包含的丢弃
+    '''
+    def rank(k):
+        start, end, _, _ = records[k]
+        return (end - start, k)
+
+    kept = []
+    for k, (start, end, _, _) in enumerate(records):
+        conflict = any((s == start or e == end) and rank(m) > rank(k)
+                       for m, (s, e, _, _) in enumerate(records) if m != k)
+        inside = any(s <= start and end <= e and (s, e) != (start, end)
+                     for s, e, _, _ in records)
+        if not conflict and not inside:
+            kept.append(records[k])
+    return kept
+
+
+def randomRecords(rng, n, width=30):
+    ids = ['Uniprot:P1', 'NCBI gene:2', 'protein:x', 'gene:y', 'CHEBI:3', 'GO:4']
+    records = []
+    for k in range(n):
+        start = rng.randint(0, width)
+        records.append((start, start + rng.randint(1, 8), rng.choice(ids), 'e{}'.format(k)))
+    return records
+
+
+class ResolveNestedTestSuite(unittest.TestCase):
+    """resolveNested agrees with the old pairwise loop where that loop was well defined."""
+
+    def test_examples(self):
+        records = [(0, 5, 'CHEBI:1', 'a'), (0, 9, 'Uniprot:P1', 'b'), (20, 24, 'GO:1', 'c')]
+        self.assertEqual(resolveNested(records, prefer=xx), records[1:])
+        # 同样长度、同样类型的保留靠后的
+        records = [(3, 7, 'gene:a', 'a'), (3, 7, 'gene:b', 'b')]
+        self.assertEqual(resolveNested(records, prefer=xx), records[1:])
+        # 类型优先于长度
+        records = [(3, 9, 'CHEBI:1', 'a'), (5, 9, 'protein:p', 'b')]
+        self.assertEqual(resolveNested(records, prefer=xx), records[1:])
+        self.assertEqual(resolveNested([], prefer=xx), [])
+
+    def test_random_against_old(self):
+        rng = random.Random(1337)
+        num_checked = 0
+        for _ in range(3000):
+            records = randomRecords(rng, rng.randint(0, 6))
+            expected = oldResolveNested(records)
+            if expected is None:
+                continue
+            num_checked += 1
+            self.assertEqual(sorted(resolveNested(records, prefer=xx)), sorted(expected), records)
+        self.assertGreater(num_checked, 1000)
+
+    def test_conflict_chains(self):
+        # 原来的实现在一个实体参与多对冲突时出错（oldResolveNested 返回 None），新的实现按组各自取舍
+        # 三个完全相同的实体：只保留 rank 最高的一个
+        records = [(3, 7, 'gene:a', 'a'), (3, 7, 'gene:b', 'b'), (3, 7, 'gene:c', 'c')]
+        self.assertIsNone(oldResolveNested(records))
+        self.assertEqual(resolveNested(records, prefer=xx), records[2:])
+        self.assertEqual(resolveNested(records[:1] + [(3, 7, 'GO:1', 'b')] + records[2:], prefer=xx), records[2:])
+        self.assertEqual(resolveNested(records, contained=True), records[2:])
+        # start 相同的一组和 end 相同的一组分别取舍：b 在 start 组中输给 a，但仍在 end 组中淘汰 c
+        records = [(0, 5, 'Uniprot:P1', 'a'), (0, 9, 'CHEBI:1', 'b'), (4, 9, 'GO:1', 'c')]
+        self.assertIsNone(oldResolveNested(records))
+        self.assertEqual(resolveNested(records, prefer=xx), records[:1])
+        records = [(0, 5, 'GO:1', 'a'), (0, 9, 'GO:2', 'b'), (4, 9, 'GO:3', 'c')]
+        self.assertEqual(resolveNested(records, prefer=xx), records[1:2])
+
+    def test_crossing_and_nested(self):
+        # 交叉的实体起止都不同，不冲突，都保留；contained=True 也不丢弃
+        records = [(0, 5, 'GO:1', 'a'), (3, 8, 'GO:1', 'b')]
+        self.assertEqual(resolveNested(records, prefer=xx), records)
+        self.assertEqual(resolveNested(records, contained=True), records)
+        # 严格嵌套（起止都不同）的只在 contained=True 时丢弃内层的
+        records = [(0, 10, 'GO:1', 'a'), (2, 5, 'Uniprot:P1', 'b')]
+        self.assertEqual(resolveNested(records, prefer=xx), records)
+        self.assertEqual(resolveNested(records, contained=True), records[:1])
+
+    def test_random_contained(self):
+        rng = random.Random(7)
+        for _ in range(2000):
+            records = randomRecords(rng, rng.randint(0, 8))
+            self.assertEqual(resolveNested(records, contained=True), bruteContained(records), records)
+
+
+class TagEntitiesTestSuite(unittest.TestCase):
+    """tagEntities agrees with the old per-annotation loop where that loop was well defined."""
+
+    def check(self, text, spans):
+        sentence_byte = text.encode('utf-8')
+        self.assertEqual(' '.join(tagEntities(sentence_byte, spans, B_tag, I_tag).split()),
+                         oldTagEntities(sentence_byte, spans), (text, spans))
+
+    def test_examples(self):
+        self.check('MDM2 binds p53 in vivo .', [(0, 4, 0), (11, 3, 1)])
+        self.check('no entities here', [])
+        self.check('adjacent ABC DEF', [(9, 3, 0), (12, 4, 1)])
+        self.check('α-actinin and β-catenin', [(0, 10, 1), (15, 10, 0)])
+
+    def test_divergent_examples(self):
+        # 以下情况与原来的实现不同（有意为之）：原来的实现每插入一个实体就在整个句子上合并连续空格，
+        # 并在已插入标签的句子上按原来的 offset 切分，结果错位；新的实现保留原文，标签总是插在 offset 处
+        B0, B1, I0, I1 = [' ' + tag for tag in B_tag] + [tag + ' ' for tag in I_tag]
+        cases = [
+            # 连续空格
+            ('x  MDM2 p53', [(3, 4, 0), (8, 3, 1)], 'x  ' + B0 + 'MDM2' + I0 + ' ' + B1 + 'p53' + I1),
+            # 嵌套：长的在外层
+            ('IL-2 receptor', [(0, 13, 0), (0, 4, 1)], B0 + B1 + 'IL-2' + I1 + ' receptor' + I0),
+            # 交叉：各标签仍在各自的 offset 处（标签不成对嵌套）
+            ('abcdefghij', [(0, 6, 0), (3, 6, 1)], B0 + 'abc' + B1 + 'def' + I0 + 'ghi' + I1 + 'j'),
+            # 三个完全相同的实体
+            ('p53 binds', [(0, 3, 0), (0, 3, 0), (0, 3, 1)], B0 + B0 + B1 + 'p53' + I1 + I0 + I0 + ' binds'),
+        ]
+        for text, spans, expected in cases:
+            sentence_byte = text.encode('utf-8')
+            self.assertEqual(tagEntities(sentence_byte, spans, B_tag, I_tag), expected)
+            self.assertNotEqual(' '.join(expected.split()), oldTagEntities(sentence_byte, spans))
+
+    def test_random_any_spans(self):
+        # 任意的实体和含连续空格的句子：去掉标签即为原文，每个标签都插在实体 offset 对应的字符下标处
+        rng = random.Random(2018)
+        for _ in range(1000):
+            text = ''.join(rng.choice('ab  αβ-γ中.') for _ in range(rng.randint(0, 30)))
+            spans = anySpans(rng, text)
+            tagged = tagEntities(text.encode('utf-8'), spans, B_tag, I_tag)
+            plain, positions = markerPositions(tagged)
+            self.assertEqual(plain, text)
+            b2c = {len(text[:i].encode('utf-8')): i for i in range(len(text) + 1)}
+            expected = [(b2c[offset], ' ' + B_tag[k]) for offset, _, k in spans] + \
+                       [(b2c[offset + length], I_tag[k] + ' ') for offset, length, k in spans]
+            self.assertEqual(sorted(positions), sorted(expected), (text, spans))
+            self.assertEqual([p for p, _ in positions], sorted(p for p, _ in positions))
+
+    def test_random_ascii(self):
+        rng = random.Random(1337)
+        for _ in range(500):
+            text = randomText(rng, 'abc XYZ-(),.', 40)
+            self.check(text, randomSpans(rng, text))
+
+    def test_random_multibyte(self):
+        rng = random.Random(42)
+        for _ in range(500):
+            text = randomText(rng, 'ab αβ-γ中文.', 30)
+            self.check(text, randomSpans(rng, text))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+from .context import sample
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from sample.utils.genia_tagger import TaggingStage, STANDIN_COMMAND
+
+
+def expected(sentence):
+    return ''.join('{}\t{}\tNN\tO\tO\n'.format(word, word) for word in sentence.split())
+
+
+class TaggingStageTestSuite(unittest.TestCase):
+    """TaggingStage with the pure Python stand-in tagger."""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.tmp, 'genia.cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def stage(self, cwd=None):
+        return TaggingStage(STANDIN_COMMAND, self.cache_path, processes=2, batch_size=2, cwd=cwd or self.tmp)
+
+    def test_order_across_batches(self):
+        sentences = ['sentence number {} here'.format(i) for i in range(7)]
+        stage = self.stage()
+        try:
+            self.assertEqual(stage.tagSentences(sentences), [expected(s) for s in sentences])
+        finally:
+            stage.close()
+
+    def test_rerun_hits_cache(self):
+        sentences = ['alpha beta', 'gamma', 'delta epsilon zeta']
+        stage = self.stage()
+        first = stage.tagSentences(sentences)
+        stage.close()
+
+        stage = self.stage()
+        try:
+            self.assertEqual(stage.tagSentences(sentences), first)
+            self.assertEqual((stage.num_hit, stage.num_miss), (3, 0))
+            self.assertIsNone(stage.taggers)    # 全部命中时不启动子进程
+        finally:
+            stage.close()
+
+    def test_empty_sentences(self):
+        stage = self.stage()
+        try:
+            self.assertEqual(stage.tagSentences(['', '   ', 'a b']), ['', '', expected('a b')])
+            self.assertEqual(stage.tagSentences(['', '']), ['', ''])
+            self.assertEqual(stage.num_miss, 1)
+        finally:
+            stage.close()
+
+    def test_repeated_sentence_counted_once(self):
+        stage = self.stage()
+        try:
+            results = stage.tagSentences(['same words', 'other', 'same words'])
+            self.assertEqual(results, [expected('same words'), expected('other'), expected('same words')])
+            self.assertEqual(stage.num_miss, 2)
+        finally:
+            stage.close()
+
+    def test_cwd_in_cache_key(self):
+        stage = self.stage()
+        stage.tagSentences(['model dir'])
+        stage.close()
+
+        other = os.path.join(self.tmp, 'other_model')
+        os.makedirs(other)
+        stage = self.stage(cwd=other)
+        try:
+            stage.tagSentences(['model dir'])
+            self.assertEqual((stage.num_hit, stage.num_miss), (0, 1))
+        finally:
+            stage.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+from .context import sample
+
+import json
+import threading
+import unittest
+
+from sample.utils.ner_service import MicroBatcher, parseRequest, handleLine
+
+
+def startBatcher(batcher):
+    thread = threading.Thread(target=batcher.run, daemon=True)
+    thread.start()
+    return thread
+
+
+class MicroBatcherTestSuite(unittest.TestCase):
+    """MicroBatcher 的 batch 合并与 flush"""
+
+    def setUp(self):
+        self.batches = []
+
+    def handler(self, requests):
+        self.batches.append(list(requests))
+        return [request.upper() for request in requests]
+
+    def test_max_batch(self):
+        batcher = MicroBatcher(self.handler, max_batch=2, max_wait=1.0)
+        futures = [batcher.submit(text) for text in ['a', 'b', 'c', 'd', 'e']]
+        batcher.close()
+        batcher.run()
+        self.assertEqual([future.result(timeout=1) for future in futures], ['A', 'B', 'C', 'D', 'E'])
+        self.assertEqual(self.batches, [['a', 'b'], ['c', 'd'], ['e']])
+        self.assertEqual((batcher.num_batch, batcher.num_request), (3, 5))
+
+    def test_max_wait_flush(self):
+        # 凑不满 max_batch 时，等待 max_wait 秒后就处理已收到的请求，不必等 close
+        batcher = MicroBatcher(self.handler, max_batch=32, max_wait=0.01)
+        thread = startBatcher(batcher)
+        future = batcher.submit('a')
+        self.assertEqual(future.result(timeout=5), 'A')
+        self.assertEqual(self.batches, [['a']])
+        batcher.close()
+        thread.join(timeout=5)
+        self.assertFalse(thread.is_alive())
+
+    def test_close_flushes_pending(self):
+        # close 之前提交的请求都会被处理，之后 run 才返回
+        batcher = MicroBatcher(self.handler, max_batch=32, max_wait=10.0)
+        futures = [batcher.submit(text) for text in ['a', 'b', 'c']]
+        batcher.close()
+        thread = startBatcher(batcher)
+        thread.join(timeout=5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual([future.result(timeout=0) for future in futures], ['A', 'B', 'C'])
+        self.assertEqual(self.batches, [['a', 'b', 'c']])
+
+    def test_handler_exception(self):
+        # 出错的 batch 中每个请求都收到异常，之后的 batch 不受影响
+        def handler(requests):
+            if 'bad' in requests:
+                raise RuntimeError('bad request')
+            return requests
+
+        batcher = MicroBatcher(handler, max_batch=2, max_wait=1.0)
+        futures = [batcher.submit(text) for text in ['a', 'bad', 'c']]
+        batcher.close()
+        batcher.run()
+        for future in futures[:2]:
+            self.assertIsInstance(future.exception(timeout=0), RuntimeError)
+        self.assertEqual(futures[2].result(timeout=0), 'c')
+
+
+class ParseRequestTestSuite(unittest.TestCase):
+    """parseRequest 对各种请求行的处理"""
+
+    def test_plain_text(self):
+        self.assertEqual(parseRequest('IL-2 binds IL-2R.\n'), (['IL-2 binds IL-2R.'], False))
+
+    def test_text_object(self):
+        self.assertEqual(parseRequest(json.dumps({'text': 'p53 {a}'}) + '\n'), (['p53 {a}'], False))
+
+    def test_invalid_json(self):
+        # 以 '{' 开头但不是 JSON 的行按纯文本处理
+        line = '{CD4+} T cells express IL-2'
+        self.assertEqual(parseRequest(line), ([line], False))
+
+    def test_other_json(self):
+        # 合法的 JSON，但不是含 "text"/"bioc" 的对象，也按纯文本处理
+        for line in ['{"txt": "a"}', '{"text": 3}', '{"text": null}', '[1, 2]', '"text"', '{}']:
+            self.assertEqual(parseRequest(line), ([line], False), line)
+
+    def test_missing_bioc(self):
+        with self.assertRaises(Exception):
+            parseRequest(json.dumps({'bioc': '/nonexistent/bioc.xml'}))
+
+    def test_handle_line_error(self):
+        # 请求出错时返回 {"error": ...}，不影响服务
+        batcher = MicroBatcher(lambda requests: requests, max_wait=0.01)
+        thread = startBatcher(batcher)
+        response = json.loads(handleLine(batcher, json.dumps({'bioc': '/nonexistent/bioc.xml'})))
+        self.assertIn('error', response)
+        response = json.loads(handleLine(batcher, '{"text": "IL-2"}'))
+        self.assertEqual(response, 'IL-2')
+        batcher.close()
+        thread.join(timeout=5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+from .context import sample
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from sample.utils.dataset import Dataset
+from sample.utils.prediction_cache import PredictionCache, sentenceKeys
+
+
+def makeDataset(path, words, cap, vocabs):
+    offsets = np.array([0, 3, 5, 5, 8], dtype=np.int64)
+    columns = {name: np.zeros(8, dtype=np.int8) for name in ['labels', 'pos', 'chunk', 'dict']}
+    columns['words'] = np.asarray(words, dtype=np.int32)
+    columns['tokens'] = np.asarray(words, dtype=np.int32)
+    columns['cap'] = np.asarray(cap, dtype=np.int8)
+    Dataset.save(path, columns, offsets, ['w{}'.format(i) for i in range(10)], np.zeros((10, 4), dtype=np.int16),
+                 455, vocabs)
+    return Dataset.open(path)
+
+
+class PredictionCacheTestSuite(unittest.TestCase):
+    """PredictionCache LRU eviction and sentenceKeys invalidation."""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.words = [1, 2, 3, 4, 5, 6, 7, 8]
+        self.cap = [0] * 8
+        self.vocabs = {'word_index': {'a': 1}}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def keys(self, name, words=None, cap=None, vocabs=None, model_hash='m1', **kwargs):
+        dataset = makeDataset(os.path.join(self.tmp, name), words or self.words, cap or self.cap,
+                              vocabs or self.vocabs)
+        return sentenceKeys(dataset, model_hash, **kwargs)
+
+    def test_keys_follow_content(self):
+        keys = self.keys('a', maxlen=400)
+        self.assertEqual(len(keys), 4)
+        self.assertEqual(len(set(keys)), 4)
+        self.assertEqual(self.keys('b', maxlen=400), keys)      # 内容相同，键相同
+
+        # 只有被修改的句子的键变化
+        words = list(self.words)
+        words[4] = 9
+        changed = self.keys('c', words=words, maxlen=400)
+        self.assertEqual([k1 == k2 for k1, k2 in zip(keys, changed)], [True, False, True, True])
+
+    def test_keys_invalidated(self):
+        keys = self.keys('a', maxlen=400)
+        # 模型、词典、截断长度、窗口参数变化后所有的键都变化
+        for other in [self.keys('b', model_hash='m2', maxlen=400),
+                      self.keys('c', vocabs={'word_index': {'a': 2}}, maxlen=400),
+                      self.keys('d', maxlen=2),
+                      self.keys('e', window=128, overlap=32)]:
+            self.assertEqual(set(keys) & set(other), set())
+        # 特征列变化后非空句子的键变化
+        other = self.keys('f', cap=[1] * 8, maxlen=400)
+        self.assertEqual([k1 == k2 for k1, k2 in zip(keys, other)], [False, False, True, False])
+
+    def test_get_put(self):
+        cache = PredictionCache(os.path.join(self.tmp, 'predictions.db'))
+        try:
+            self.assertEqual(cache.get(['a', 'b']), [None, None])
+            cache.put({'a': np.array([1, 2, 0]), 'b': np.array([], dtype=np.int64)})
+            a, b, c = cache.get(['a', 'b', 'c'])
+            self.assertEqual((a.tolist(), b.tolist(), c), ([1, 2, 0], [], None))
+            self.assertEqual((cache.num_hit, cache.num_miss), (2, 3))
+        finally:
+            cache.close()
+
+    def test_lru_eviction(self):
+        path = os.path.join(self.tmp, 'predictions.db')
+        cache = PredictionCache(path, max_bytes=100)
+        try:
+            cache.put({'k{}'.format(i): np.zeros(10) for i in range(10)})     # 共 100 字节，不淘汰
+            self.assertEqual(cache.num_evict, 0)
+            # 保证 atime 不同
+            cache.db.execute('UPDATE predictions SET atime = CAST(SUBSTR(key, 2) AS REAL)')
+            cache.db.execute("UPDATE predictions SET atime = 100 WHERE key = 'k0'")    # 最近使用过
+            cache.db.commit()
+            cache.put({'new': np.zeros(10)})     # 110 字节：淘汰最久未使用的，直到不超过 90 字节
+            self.assertEqual(cache.num_evict, 2)
+            results = dict(zip(['k0', 'k1', 'k2', 'k3', 'new'], cache.get(['k0', 'k1', 'k2', 'k3', 'new'])))
+            self.assertIsNone(results['k1'])
+            self.assertIsNone(results['k2'])
+            for key in ['k0', 'k3', 'new']:
+                self.assertIsNotNone(results[key])
+        finally:
+            cache.close()
+
+        cache = PredictionCache(path, max_bytes=100)     # 重新打开后仍在
+        try:
+            self.assertIsNotNone(cache.get(['k0'])[0])
+        finally:
+            cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
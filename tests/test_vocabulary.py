@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+from .context import sample
+
+import json
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from collections import OrderedDict
+
+import numpy as np
+
+from sample.utils.vocabulary import Vocabulary
+
+
+def tokenizerWordIndex(sentences):
+    '''
+    keras 2.x Tokenizer.fit_on_texts 的编号规则：按词频降序（稳定排序），从 1 开始
+    '''
+    word_counts = OrderedDict()
+    for tokens in sentences:
+        for word in tokens:
+            word_counts[word] = word_counts.get(word, 0) + 1
+    wcounts = list(word_counts.items())
+    wcounts.sort(key=lambda x: x[1], reverse=True)
+    return {word: i + 1 for i, (word, _) in enumerate(wcounts)}
+
+
+def randomSentences(rng, num=200):
+    words = ['w{}'.format(i) for i in range(60)]
+    return [[rng.choice(words[:rng.randint(1, 60)]) for _ in range(rng.randint(0, 20))] for _ in range(num)]
+
+
+class VocabularyTestSuite(unittest.TestCase):
+    """Vocabulary ids match the Keras Tokenizer; OOV policies."""
+
+    def test_build_matches_tokenizer(self):
+        rng = random.Random(1337)
+        for _ in range(20):
+            sentences = randomSentences(rng)
+            self.assertEqual(Vocabulary.build(sentences).word_index, tokenizerWordIndex(sentences))
+
+    def test_from_ids_matches_tokenizer(self):
+        rng = random.Random(42)
+        for _ in range(20):
+            sentences = randomSentences(rng)
+            words = sorted(set(w for tokens in sentences for w in tokens), key=lambda w: rng.random())
+            word2id = {w: i for i, w in enumerate(words)}
+            ids = np.array([word2id[w] for tokens in sentences for w in tokens], dtype=np.int32)
+            self.assertEqual(Vocabulary.fromIds(ids, words).word_index, tokenizerWordIndex(sentences))
+
+    def test_oov_zero(self):
+        vocab = Vocabulary.build([['a', 'b', 'a']])
+        self.assertEqual(vocab.encode(['a', 'b', 'zzz']).tolist(), [1, 2, 0])
+        self.assertEqual(vocab.encode([]).dtype, np.int32)
+        self.assertEqual(vocab.num_ids, 3)
+
+    def test_oov_unk(self):
+        vocab = Vocabulary.build([['a', 'b', 'a', 'c']], min_count=2, oov='unk')
+        self.assertEqual(vocab.words, ['a'])
+        self.assertEqual(vocab.encode(['a', 'b', 'zzz']).tolist(), [1, 2, 2])
+        self.assertEqual(vocab.num_ids, 3)
+        with self.assertRaises(ValueError):
+            Vocabulary(['a'], [1], oov='other')
+
+    def test_save_load(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, 'word_vocab.json')
+            vocab = Vocabulary.build([['α', 'b', 'b']], oov='unk')
+            vocab.save(path)
+            loaded = Vocabulary.load(path)
+            self.assertEqual((loaded.words, loaded.counts, loaded.oov), (vocab.words, vocab.counts, vocab.oov))
+
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            data['schema_version'] = 0
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            with self.assertRaises(ValueError):
+                Vocabulary.load(path)
+        finally:
+            shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    unittest.main()